@@ -5,12 +5,15 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
-from django.db.models import Max, Q, Count, Value, CharField
+from django.db.models import Value, CharField
 from django.db.models.functions import Coalesce
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from core.models import Region, Prefecture, StructureLocale, Conversation, Message, Declaration
 from django.core.cache import cache
+from core import geo
+from core.pagination import encoder_curseur, decoder_curseur
+from core.messagerie import HISTORIQUE_PAR_PAGE, evenement_groupe, fenetre_historique, marquer_lus
 
 @api_view(['GET'])
 def api_regions(request):
@@ -31,6 +34,60 @@ def api_structures(request, prefecture_id):
     return Response(data)
 
 
+@api_view(['GET'])
+def api_signalements_proximite(request):
+    """
+    Signalements publics à moins de ``radius`` km d'un point, du plus proche au plus lointain
+
+    Paramètres: lat, lon, radius (km), type, date_perte, cursor, limit
+    """
+    try:
+        lat = float(request.GET['lat'])
+        lon = float(request.GET['lon'])
+        rayon = float(request.GET.get('radius', 5))
+        limite = min(max(int(request.GET.get('limit', 20)), 1), 100)
+        curseur = decoder_curseur(request.GET.get('cursor'))
+        if curseur is not None:
+            curseur = {'d': float(curseur['d']), 'id': int(curseur['id'])}
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': 'Paramètres lat, lon, radius, limit ou cursor invalides'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < rayon <= geo.PROXIMITE_RAYON_MAX_KM):
+        return Response({'error': f'Position invalide ou rayon hors de ]0, {geo.PROXIMITE_RAYON_MAX_KM}] km'}, status=400)
+
+    signalements = Declaration.objects.filter(
+        visible_publiquement=True,
+        statut__in=['publie', 'valide']
+    )
+    type_filter = request.GET.get('type')
+    if type_filter in ['perdu', 'trouve']:
+        signalements = signalements.filter(type_declaration=type_filter)
+    date_perte = request.GET.get('date_perte')
+    if date_perte:
+        signalements = signalements.filter(date_incident=date_perte)
+
+    page, suivant = geo.recherche_proximite(
+        signalements.select_related('categorie', 'prefecture'), lat, lon, rayon, curseur, limite
+    )
+    data = [{
+        'id': s.id,
+        'numero_declaration': s.numero_declaration,
+        'nom_objet': s.nom_objet,
+        'type_declaration': s.type_declaration,
+        'categorie': s.categorie.nom if s.categorie else None,
+        'date_incident': s.date_incident.isoformat(),
+        'lieu_precis': s.lieu_precis,
+        'prefecture': s.prefecture.nom if s.prefecture else None,
+        'latitude': float(s.latitude),
+        'longitude': float(s.longitude),
+        'distance_km': distance,
+        'photo_url': s.photo_principale.url if s.photo_principale else None,
+    } for s, distance in page]
+    return Response({
+        'results': data,
+        'next_cursor': encoder_curseur(suivant) if suivant else None,
+    })
+
+
 @login_required
 @api_view(['GET'])
 def api_conversations(request):
@@ -48,41 +105,20 @@ def api_conversations(request):
     print(f"⚡ Génération optimisée pour utilisateur {user.id}")
     
     try:
-        # Requête ultra-optimisée avec une seule requête SQL
+        # Une seule requête : compteurs et dernier message sont stockés sur la conversation
         if user.role in ['agent', 'admin']:
-            conversations = Conversation.objects.filter(
-                agent=user
-            ).select_related(
-                'signalement', 'declarant'
-            ).prefetch_related(
-                'messages'
-            ).annotate(
-                # Calculer directement en SQL
-                total_messages_count=Count('messages'),
-                unread_messages_count=Count('messages', filter=Q(messages__receiver=user, messages__is_read=False)),
-                last_message_date=Max('messages__created_at')
-            ).order_by('-updated_at')[:20]  # Limiter à 20 conversations max
+            conversations = Conversation.objects.filter(agent=user)
         else:
-            conversations = Conversation.objects.filter(
-                declarant=user
-            ).select_related(
-                'signalement', 'agent'
-            ).prefetch_related(
-                'messages'
-            ).annotate(
-                total_messages_count=Count('messages'),
-                unread_messages_count=Count('messages', filter=Q(messages__receiver=user, messages__is_read=False)),
-                last_message_date=Max('messages__created_at')
-            ).order_by('-updated_at')[:20]
+            conversations = Conversation.objects.filter(declarant=user)
+        conversations = conversations.select_related(
+            'signalement__declarant', 'declarant', 'agent', 'last_message_sender'
+        ).order_by('-updated_at')[:20]  # Limiter à 20 conversations max
         
         # Construire la réponse rapidement
         data = []
         for conv in conversations:
             other_participant = conv.declarant if user == conv.agent else conv.agent
             
-            # Récupérer le dernier message de manière efficace
-            last_message = conv.messages.order_by('-created_at').first() if conv.messages.exists() else None
-            
             # Déterminer le nom du déclarant de manière robuste
             declarant_nom = "Déclarant inconnu"
             if conv.declarant:
@@ -104,25 +140,25 @@ def api_conversations(request):
                     
             data.append({
                 'id': conv.id,
-                'signalement_numero': conv.signalement.numero_declaration,
-                'signalement_id': conv.signalement.id,
-                'objet_signalement': conv.signalement.nom_objet if hasattr(conv.signalement, 'nom_objet') else 'Objet non spécifié',
+                'signalement_numero': conv.signalement.numero_declaration if conv.signalement else None,
+                'signalement_id': conv.signalement_id,
+                'objet_signalement': conv.signalement.nom_objet if conv.signalement else 'Objet non spécifié',
                 'citoyen_nom': declarant_nom,
                 'declarant_nom': declarant_nom,
                 'derniere_activite': conv.updated_at.isoformat(),
-                'unread_count': conv.unread_messages_count,
-                'total_messages': conv.total_messages_count,
+                'unread_count': conv.non_lus_agent if user == conv.agent else conv.non_lus_declarant,
+                'total_messages': conv.message_count,
                 'other_participant': {
                     'id': other_participant.id,
                     'nom': other_participant.get_full_name(),
                     'role': other_participant.role,
                 },
                 'last_message': {
-                    'contenu': last_message.contenu[:50] + ('...' if len(last_message.contenu) > 50 else ''),
-                    'created_at': last_message.created_at.isoformat(),
-                    'sender_name': last_message.sender.get_full_name(),
-                    'type_message': last_message.type_message
-                } if last_message else None
+                    'contenu': conv.last_message_preview[:50] + ('...' if len(conv.last_message_preview) > 50 else ''),
+                    'created_at': conv.last_message_at.isoformat(),
+                    'sender_name': conv.last_message_sender.get_full_name() if conv.last_message_sender else '',
+                    'type_message': conv.last_message_type,
+                } if conv.last_message_at else None
             })
         
         # Cache plus long pour améliorer les performances
@@ -152,20 +188,14 @@ def api_conversations_counters(request):
     try:
         if user.role in ['agent', 'admin']:
             conversations = Conversation.objects.filter(agent=user)
+            champ = 'non_lus_agent'
         else:
             conversations = Conversation.objects.filter(declarant=user)
+            champ = 'non_lus_declarant'
         
-        counters = {}
-        total_unread = 0
-        
-        for conv in conversations:
-            if user.role in ['agent', 'admin']:
-                unread = conv.unread_count_for_agent
-            else:
-                unread = conv.unread_count_for_declarant
-            
-            counters[conv.id] = unread
-            total_unread += unread
+        # Compteurs stockés sur chaque conversation : une seule requête
+        counters = dict(conversations.values_list('id', champ))
+        total_unread = sum(counters.values())
         
         result = {
             'total_unread': total_unread,
@@ -192,16 +222,14 @@ def api_mark_conversation_read(request, conversation_id):
     if not (conversation.agent == user or conversation.declarant == user):
         return JsonResponse({'error': 'Accès non autorisé'}, status=403)
     
-    # Marquer tous les messages reçus comme lus
-    updated_count = Message.objects.filter(
-        conversation=conversation,
-        receiver=user,
-        is_read=False
-    ).update(is_read=True)
+    # Marquer tous les messages reçus comme lus (jusqu'à message_id si fourni)
+    jusqua = request.POST.get('message_id')
+    updated_count = marquer_lus(conversation, user, int(jusqua) if jusqua and jusqua.isdigit() else None)
     
     return JsonResponse({
         'success': True,
-        'marked_count': updated_count
+        'marked_count': updated_count,
+        'last_read_message_id': conversation.lu_jusqua(user),
     })
 
 
@@ -269,10 +297,7 @@ def api_upload_file(request):
             # Envoyer le message à tous les participants
             async_to_sync(channel_layer.group_send)(
                 conversation_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message_data
-                }
+                evenement_groupe('chat_message', conversation.id, 'message', message_data, user.id)
             )
         
         return JsonResponse({
@@ -414,19 +439,13 @@ def api_conversation_messages(request, conversation_id):
         return Response({'error': 'Accès non autorisé'}, status=403)
     
     if request.method == 'GET':
-        # Logique existante pour récupérer les messages
-        page = int(request.GET.get('page', 1))
-        per_page = min(int(request.GET.get('per_page', 30)), 50)
-        offset = (page - 1) * per_page
-        
-        cache_key = f"messages_{conversation_id}_p{page}_{per_page}"
-        cached_messages = cache.get(cache_key)
-        
-        if cached_messages:
-            return Response(cached_messages)
-        
-        total_messages = conversation.messages.count()
-        messages = conversation.messages.select_related('sender', 'receiver').order_by('created_at')[offset:offset+per_page]
+        # Fenêtre la plus récente, ou plus ancienne que le curseur ``before``
+        # (en-tête X-Older-Cursor pour la fenêtre suivante)
+        try:
+            per_page = min(max(int(request.GET.get('per_page', HISTORIQUE_PAR_PAGE)), 1), 50)
+        except ValueError:
+            per_page = HISTORIQUE_PAR_PAGE
+        messages, plus_anciens = fenetre_historique(conversation, request.GET.get('before'), per_page)
         
         data = []
         for message in messages:
@@ -443,7 +462,10 @@ def api_conversation_messages(request, conversation_id):
                 'type_message': getattr(message, 'type_message', 'text'),
             })
         
-        return Response(data)
+        response = Response(data)
+        if plus_anciens:
+            response['X-Older-Cursor'] = plus_anciens
+        return response
     
     elif request.method == 'POST':
         # Créer un nouveau message
@@ -468,11 +490,6 @@ def api_conversation_messages(request, conversation_id):
                 fichier=fichier
             )
             
-            # Mettre à jour la conversation
-            conversation.derniere_activite = message.created_at
-            conversation.dernier_message = contenu or "Fichier joint"
-            conversation.save()
-            
             # Réponse avec les détails du message créé
             return Response({
                 'id': message.id,
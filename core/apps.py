@@ -6,6 +6,9 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        # Enregistrer les signaux (index de recherche, compteurs, ...)
+        from . import signals  # noqa: F401
+
         # Crée un compte administrateur initial si la table des utilisateurs est vide.
         # Ceci évite de bloquer l'accès en cas de base fraîche.
         try:
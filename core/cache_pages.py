@@ -0,0 +1,196 @@
+"""
+Cache des pages publiques pour les visiteurs anonymes.
+
+Les réponses GET des visiteurs non connectés sont mises en cache, indexées par
+la vue, le chemin et les paramètres de requête normalisés (triés, sans valeurs
+vides ni paramètres de suivi ajoutés par les réseaux sociaux). Chaque entrée
+porte des clés de substitution (``accueil``, ``signalements``,
+``declaration:<id>``, ``region:<id>``) : purger une clé change sa version et
+périme toutes les entrées qui la portent, sans parcourir le cache.
+
+Les pages sont gardées dans le cache de chaque processus, mais les versions
+vivent dans le cache ``partage`` (fichiers, commun à tous les processus de la
+machine) : une écriture faite par un autre processus web ou par un travailleur
+de la file périme aussi les pages de ce processus.
+
+Le jeton CSRF des formulaires est remplacé par un marqueur à l'enregistrement
+puis régénéré pour chaque visiteur à la lecture.
+"""
+
+import functools
+import hashlib
+import re
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+# Durée de vie d'une page en cache (secondes)
+PAGES_CACHE_TIMEOUT = getattr(settings, 'PAGES_CACHE_TIMEOUT', 300)
+
+# Paramètres de suivi sans effet sur le contenu de la page
+PARAMETRES_SUIVI = {'fbclid', 'gclid', 'igshid', 'ref'}
+
+MARQUEUR_CSRF = b'__jeton_csrf__'
+_JETON_CSRF = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+EVENEMENTS = ['hit', 'miss', 'bypass']
+
+# Vues décorées (pour les compteurs de supervision)
+VUES_CACHEES = set()
+
+
+def parametres_normalises(querydict):
+    """Chaîne de requête canonique : paramètres triés, sans valeurs vides ni suivi"""
+    paires = sorted(
+        (cle, valeur.strip())
+        for cle, valeurs in querydict.lists()
+        if cle not in PARAMETRES_SUIVI and not cle.startswith('utm_')
+        for valeur in valeurs if valeur.strip()
+    )
+    return urlencode(paires)
+
+
+def _cle_page(nom, request):
+    empreinte = hashlib.md5(f"{request.path}?{parametres_normalises(request.GET)}".encode()).hexdigest()
+    return f"pages_cache:{nom}:{empreinte}"
+
+
+def cache_partage():
+    """Cache commun à tous les processus (cache par défaut s'il n'est pas configuré)"""
+    return caches['partage' if 'partage' in settings.CACHES else 'default']
+
+
+def nouvelle_version():
+    """Version jamais utilisée : pas d'incrément, non atomique entre processus"""
+    return time.time_ns()
+
+
+def _cle_version(tag):
+    return f"pages_cache_tag:{tag}"
+
+
+def _versions(tags):
+    """Version courante de chaque clé de substitution (initialisée au besoin)"""
+    cles = {_cle_version(tag): tag for tag in tags}
+    versions = cache_partage().get_many(cles)
+    # Une version évincée repart d'une valeur jamais utilisée
+    manquantes = {cle: nouvelle_version() for cle in cles if cle not in versions}
+    if manquantes:
+        cache_partage().set_many(manquantes, None)
+        versions.update(manquantes)
+    return {cles[cle]: version for cle, version in versions.items()}
+
+
+def purger(*tags):
+    """Périmer toutes les pages portant l'une des clés de substitution"""
+    cache_partage().set_many({_cle_version(tag): nouvelle_version() for tag in tags}, None)
+
+
+def purger_declaration(declaration):
+    """Pages affectées par l'écriture d'une déclaration"""
+    purger('accueil', 'signalements', f'declaration:{declaration.pk}')
+
+
+def _compter(nom, evenement):
+    cle = f"pages_cache_stats:{nom}:{evenement}"
+    if not cache.add(cle, 1, None):
+        try:
+            cache.incr(cle)
+        except ValueError:
+            cache.set(cle, 1, None)
+
+
+def statistiques_cache():
+    """Compteurs hit/miss/bypass par vue, avec le taux de succès"""
+    cles = {f"pages_cache_stats:{nom}:{evenement}": (nom, evenement)
+            for nom in VUES_CACHEES for evenement in EVENEMENTS}
+    valeurs = cache.get_many(cles)
+    resultat = {nom: dict.fromkeys(EVENEMENTS, 0) for nom in sorted(VUES_CACHEES)}
+    for cle, (nom, evenement) in cles.items():
+        resultat[nom][evenement] = valeurs.get(cle, 0)
+    for compteurs in resultat.values():
+        servies = compteurs['hit'] + compteurs['miss']
+        compteurs['taux_succes'] = round(compteurs['hit'] / servies * 100, 1) if servies else 0.0
+    return resultat
+
+
+def _cachable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if 'messages' in request.COOKIES:
+        return False
+    return not request.user.is_authenticated
+
+
+def _stockable(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # Messages flash affichés ou ajoutés pendant le rendu
+    messages = getattr(request, '_messages', None)
+    return messages is None or len(messages) == 0
+
+
+def _entree(response, versions):
+    contenu = response.content
+    jeton = _JETON_CSRF.search(contenu)
+    if jeton:
+        contenu = contenu.replace(jeton.group(1), MARQUEUR_CSRF)
+    return {
+        'contenu': contenu,
+        'content_type': response.get('Content-Type'),
+        'csrf': bool(jeton),
+        'tags': versions,
+    }
+
+
+def _reponse(request, entree):
+    contenu = entree['contenu']
+    if entree['csrf']:
+        contenu = contenu.replace(MARQUEUR_CSRF, get_token(request).encode())
+    response = HttpResponse(contenu, content_type=entree['content_type'])
+    response['X-Cache-Pages'] = 'HIT'
+    return response
+
+
+def cache_anonyme(nom, tags, lors_du_cache=None):
+    """
+    Mettre en cache une vue publique pour les visiteurs anonymes.
+
+    Args:
+        nom: Nom de la vue (clés de cache et compteurs)
+        tags: Fonction (request, *args, **kwargs) -> clés de substitution de la page
+        lors_du_cache: Fonction (request, *args, **kwargs) appelée quand la page
+            est servie depuis le cache (ex: compteur de vues)
+    """
+    def decorateur(vue):
+        VUES_CACHEES.add(nom)
+
+        @functools.wraps(vue)
+        def enveloppe(request, *args, **kwargs):
+            if not _cachable(request):
+                _compter(nom, 'bypass')
+                return vue(request, *args, **kwargs)
+
+            cle = _cle_page(nom, request)
+            entree = cache.get(cle)
+            if entree and _versions(entree['tags']) == entree['tags']:
+                _compter(nom, 'hit')
+                if lors_du_cache:
+                    lors_du_cache(request, *args, **kwargs)
+                return _reponse(request, entree)
+
+            _compter(nom, 'miss')
+            # Versions lues avant le rendu : une purge pendant le rendu périme l'entrée
+            versions = _versions(tags(request, *args, **kwargs))
+            response = vue(request, *args, **kwargs)
+            if _stockable(request, response):
+                cache.set(cle, _entree(response, versions), PAGES_CACHE_TIMEOUT)
+                response['X-Cache-Pages'] = 'MISS'
+            return response
+
+        return enveloppe
+    return decorateur
@@ -0,0 +1,181 @@
+"""
+Compteur de vues des déclarations, tamponné hors de la base.
+
+Afficher une déclaration ne doit pas écrire en base : sous SQLite, chaque
+écriture prend le verrou global et les visiteurs d'une déclaration populaire
+se retrouvaient en file d'attente. Chaque vue est ajoutée (une ligne,
+``O_APPEND``) au fichier tampon ``VUES_TAMPON``, partagé par tous les
+processus de la machine (gunicorn, travailleurs de la file). Le tampon est
+écrit en base en quelques ``UPDATE ... SET nombre_vues = nombre_vues + n``
+groupés (une requête par valeur d'incrément) :
+
+- périodiquement par la tâche ``vider_compteurs_vues`` ou la commande
+  ``manage.py vider_compteurs_vues`` (cron) ;
+- au plus toutes les ``VUES_FLUSH_INTERVAL`` secondes par la requête qui
+  dépasse l'échéance.
+
+Un vidage renomme d'abord le tampon en lot : les vues suivantes partent dans
+un nouveau fichier, et un lot abandonné par un vidage interrompu est repris
+au vidage suivant. Le nombre de vues affiché est cohérent à terme, et l'arrêt
+brutal d'un processus ne perd aucune vue déjà comptée.
+"""
+
+import glob
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Declaration
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal (secondes) entre deux écritures du tampon par les requêtes
+VUES_FLUSH_INTERVAL = getattr(settings, 'VUES_FLUSH_INTERVAL', 30)
+
+# Fichier tampon partagé par les processus (une ligne par vue)
+VUES_TAMPON = getattr(settings, 'VUES_TAMPON', os.path.join(settings.BASE_DIR, 'var', 'vues_en_attente.log'))
+
+# Âge (secondes) à partir duquel un lot est considéré abandonné par son vidage
+VUES_LOT_ABANDONNE = 600
+
+# Nombre maximal d'identifiants par UPDATE
+VUES_TAILLE_LOT = 500
+
+_verrou_vidage = threading.Lock()
+_dernier_vidage = time.monotonic()
+
+
+def _ajouter(lignes):
+    """Ajouter des lignes au tampon (écriture atomique en O_APPEND)"""
+    donnees = ''.join(lignes).encode()
+    try:
+        fd = os.open(VUES_TAMPON, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(VUES_TAMPON), exist_ok=True)
+        fd = os.open(VUES_TAMPON, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, donnees)
+    finally:
+        os.close(fd)
+
+
+def _lire(donnees):
+    """Lignes ``id`` (une vue) ou ``id nombre`` → Counter {declaration_id: vues}"""
+    vues = Counter()
+    for ligne in donnees.decode().splitlines():
+        champs = ligne.split()
+        if champs:
+            vues[int(champs[0])] += int(champs[1]) if len(champs) > 1 else 1
+    return vues
+
+
+def enregistrer_vue(declaration_id):
+    """Compter une vue ; le tampon est écrit si l'échéance est dépassée"""
+    try:
+        _ajouter([f"{declaration_id}\n"])
+    except OSError:
+        # Une vue perdue ne doit pas faire échouer l'affichage
+        logger.exception("Tampon des compteurs de vues inaccessible")
+        return
+    if time.monotonic() - _dernier_vidage >= VUES_FLUSH_INTERVAL:
+        # Une seule requête du processus écrit : les autres ne l'attendent pas
+        vider(bloquant=False)
+
+
+def en_attente(declaration_id=None):
+    """Vues pas encore écrites (pour une déclaration, ou au total)"""
+    try:
+        with open(VUES_TAMPON, 'rb') as fichier:
+            vues = _lire(fichier.read())
+    except FileNotFoundError:
+        return 0
+    if declaration_id is None:
+        return sum(vues.values())
+    return vues.get(declaration_id, 0)
+
+
+def ecrire(vues):
+    """
+    Ajouter les vues en base en UPDATE groupés.
+
+    Args:
+        vues: dict {declaration_id: nombre de vues à ajouter}
+    """
+    par_increment = defaultdict(list)
+    for declaration_id, nombre in vues.items():
+        par_increment[nombre].append(declaration_id)
+
+    with transaction.atomic():
+        for nombre, ids in par_increment.items():
+            for i in range(0, len(ids), VUES_TAILLE_LOT):
+                Declaration.objects.filter(pk__in=ids[i:i + VUES_TAILLE_LOT]).update(
+                    nombre_vues=F('nombre_vues') + nombre
+                )
+
+
+def _reserver(chemin):
+    """Renommer un fichier en lot propre à ce vidage (None s'il a déjà été pris)"""
+    lot = f"{VUES_TAMPON}.{os.getpid()}.{uuid.uuid4().hex}.lot"
+    try:
+        os.replace(chemin, lot)
+    except FileNotFoundError:
+        return None
+    # Date de réservation : un lot n'est repris qu'après VUES_LOT_ABANDONNE secondes
+    os.utime(lot)
+    return lot
+
+
+def _lots():
+    """Lots à écrire : les lots abandonnés, puis le tampon courant"""
+    abandonnes = [lot for lot in glob.glob(f"{glob.escape(VUES_TAMPON)}.*.lot")
+                  if time.time() - os.path.getmtime(lot) >= VUES_LOT_ABANDONNE]
+    lots = [_reserver(chemin) for chemin in abandonnes + [VUES_TAMPON]]
+    return [lot for lot in lots if lot]
+
+
+def vider(bloquant=True):
+    """
+    Écrire le tampon en base.
+
+    Args:
+        bloquant: Attendre un vidage déjà en cours dans le processus au lieu d'abandonner
+
+    Returns:
+        int: Nombre de vues écrites
+    """
+    global _dernier_vidage
+    if not _verrou_vidage.acquire(blocking=bloquant):
+        return 0
+    try:
+        _dernier_vidage = time.monotonic()
+        ecrites = 0
+        for lot in _lots():
+            with open(lot, 'rb') as fichier:
+                donnees = fichier.read()
+            vues = _lire(donnees)
+            try:
+                ecrire(vues)
+                ecrites += sum(vues.values())
+            except Exception:
+                logger.exception("Écriture des compteurs de vues impossible, nouvel essai au prochain vidage")
+                _ajouter(f"{pk} {nombre}\n" for pk, nombre in vues.items())
+            # Vues ajoutées au lot par un processus qui l'avait ouvert avant le renommage
+            with open(lot, 'rb') as fichier:
+                fichier.seek(len(donnees))
+                retardataires = fichier.read()
+            if retardataires:
+                _ajouter([retardataires.decode()])
+            os.remove(lot)
+        return ecrites
+    except OSError:
+        logger.exception("Tampon des compteurs de vues inaccessible")
+        return 0
+    finally:
+        _verrou_vidage.release()
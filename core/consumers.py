@@ -1,5 +1,22 @@
 """
 WebSocket Consumers pour la messagerie en temps réel
+
+``MessagerieConsumer`` ouvre une seule connexion par utilisateur : elle rejoint
+à la connexion les groupes de toutes ses conversations et son groupe de
+notifications, et le client s'abonne ou se désabonne ensuite par trames
+``subscribe`` / ``unsubscribe``. Les trames entrantes et sortantes portent le
+``conversation_id`` concerné.
+
+Chaque conversation suivie est chargée une fois, avec ses deux participants,
+lors de l'abonnement : l'envoi d'un message ne coûte ensuite qu'un INSERT et
+un UPDATE de la conversation, et la diffusion est construite sans requête.
+
+Les évènements de groupe portent leur trame déjà sérialisée
+(``messagerie.evenement_groupe``) : les handlers la transmettent telle quelle.
+
+``ChatConsumer`` (une conversation) et ``NotificationConsumer``
+(notifications seules) restent servis sur leurs anciennes routes : ce sont des
+cas particuliers du consumer multiplexé.
 """
 
 import json
@@ -8,8 +25,10 @@ from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q, Sum
 import logging
 
+from .messagerie import evenement_groupe, evenement_lecture
 from .models import Conversation, Message, Utilisateur
 
 logger = logging.getLogger(__name__)
@@ -17,79 +36,75 @@ logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class MessagerieConsumer(AsyncWebsocketConsumer):
     """
-    Consumer WebSocket pour les conversations de chat en temps réel
+    Consumer WebSocket multiplexé : toutes les conversations d'un utilisateur
+    et ses notifications sur une seule connexion
     """
     
+    # Rejoindre le groupe de notifications de l'utilisateur
+    notifications = True
+    
     async def connect(self):
-        """Connexion WebSocket"""
-        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
-        self.conversation_group_name = f'chat_{self.conversation_id}'
+        """Connexion WebSocket : authentification et abonnements initiaux"""
         self.user = self.scope["user"]
+        # Conversations suivies {id: Conversation avec agent et déclarant chargés}
+        self.conversations = {}
         
         # Vérifier que l'utilisateur est authentifié
         if not self.user.is_authenticated:
             await self.close(code=4001)
             return
         
-        # Vérifier les permissions pour accéder à cette conversation
-        can_access = await self.can_access_conversation()
-        if not can_access:
+        # Conversations rejointes d'office (chargées et vérifiées en une requête)
+        conversations = await self.conversations_initiales()
+        if conversations is None:
             await self.close(code=4003)
             return
         
-        # Rejoindre le groupe de conversation
-        await self.channel_layer.group_add(
-            self.conversation_group_name,
-            self.channel_name
-        )
-        
         await self.accept()
         
-        # Notifier la connexion aux autres participants
-        await self.channel_layer.group_send(
-            self.conversation_group_name,
-            {
-                'type': 'user_status',
-                'user_id': self.user.id,
-                'username': self.user.get_full_name(),
-                'status': 'online'
-            }
-        )
+        for conversation in conversations:
+            await self.rejoindre(conversation)
+        
+        if self.notifications:
+            self.notification_group_name = f'notifications_{self.user.id}'
+            await self.channel_layer.group_add(self.notification_group_name, self.channel_name)
     
     async def disconnect(self, close_code):
-        """Déconnexion WebSocket"""
-        # Notifier la déconnexion aux autres participants
-        if hasattr(self, 'conversation_group_name'):
-            await self.channel_layer.group_send(
-                self.conversation_group_name,
-                {
-                    'type': 'user_status',
-                    'user_id': self.user.id,
-                    'username': self.user.get_full_name(),
-                    'status': 'offline'
-                }
-            )
-            
-            # Quitter le groupe de conversation
-            await self.channel_layer.group_discard(
-                self.conversation_group_name,
-                self.channel_name
-            )
+        """Déconnexion WebSocket : quitter tous les groupes"""
+        for conversation_id in list(getattr(self, 'conversations', {})):
+            await self.quitter(conversation_id)
+        
+        if hasattr(self, 'notification_group_name'):
+            await self.channel_layer.group_discard(self.notification_group_name, self.channel_name)
     
     async def receive(self, text_data):
-        """Réception d'un message du client"""
+        """Réception d'une trame du client"""
         try:
             data = json.loads(text_data)
             action = data.get('action', '')
             
-            if action == 'send_message':
-                await self.handle_send_message(data)
+            if action == 'get_unread_count':
+                await self.send_unread_count()
+                return
+            
+            conversation_id = self.conversation_demandee(data)
+            if conversation_id is None:
+                logger.warning(f"Trame sans conversation valide: {action}")
+            elif action == 'subscribe':
+                await self.handle_subscribe(conversation_id)
+            elif conversation_id not in self.conversations:
+                await self.envoyer('error', {'message': 'Conversation non suivie'}, conversation_id)
+            elif action == 'unsubscribe':
+                await self.quitter(conversation_id)
+                await self.envoyer('unsubscribed', {}, conversation_id)
+            elif action == 'send_message':
+                await self.handle_send_message(conversation_id, data)
             elif action == 'mark_as_read':
-                await self.handle_mark_as_read(data)
+                await self.handle_mark_as_read(conversation_id, data)
             elif action == 'typing':
-                await self.handle_typing(data)
+                await self.handle_typing(conversation_id, data)
             else:
                 logger.warning(f"Action non reconnue: {action}")
                 
@@ -98,148 +113,200 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Erreur dans receive: {e}")
     
-    async def handle_send_message(self, data):
+    def conversation_demandee(self, data):
+        """Identifiant de conversation d'une trame (None si absent ou invalide)"""
+        try:
+            return int(data['conversation_id'])
+        except (KeyError, TypeError, ValueError):
+            return None
+    
+    async def envoyer(self, type_trame, donnees, conversation_id=None):
+        """Envoyer une trame ``{type, conversation_id, data}`` au client"""
+        trame = {'type': type_trame, 'data': donnees}
+        if conversation_id is not None:
+            trame['conversation_id'] = conversation_id
+        await self.send(text_data=json.dumps(trame))
+    
+    async def rejoindre(self, conversation):
+        """Rejoindre le groupe d'une conversation et annoncer la présence"""
+        conversation_id = conversation.id
+        self.conversations[conversation_id] = conversation
+        group_name = f'chat_{conversation_id}'
+        await self.channel_layer.group_add(group_name, self.channel_name)
+        
+        # Notifier la connexion aux autres participants
+        await self.channel_layer.group_send(group_name, self.evenement_statut(conversation_id, 'online'))
+    
+    async def quitter(self, conversation_id):
+        """Quitter le groupe d'une conversation"""
+        self.conversations.pop(conversation_id, None)
+        group_name = f'chat_{conversation_id}'
+        
+        # Notifier la déconnexion aux autres participants
+        await self.channel_layer.group_send(group_name, self.evenement_statut(conversation_id, 'offline'))
+        await self.channel_layer.group_discard(group_name, self.channel_name)
+    
+    def evenement_statut(self, conversation_id, status):
+        return evenement_groupe('user_status', conversation_id, 'user_status', {
+            'user_id': self.user.id,
+            'username': self.user.get_full_name(),
+            'status': status
+        }, self.user.id)
+    
+    async def handle_subscribe(self, conversation_id):
+        """S'abonner à une conversation (après vérification de l'accès)"""
+        if conversation_id not in self.conversations:
+            conversation = await self.charger_conversation(conversation_id)
+            if conversation is None:
+                await self.envoyer('error', {'message': 'Accès non autorisé'}, conversation_id)
+                return
+            await self.rejoindre(conversation)
+        await self.envoyer('subscribed', {}, conversation_id)
+    
+    async def handle_send_message(self, conversation_id, data):
         """Traiter l'envoi d'un message"""
         contenu = data.get('message', '').strip()
         
         if not contenu:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Le message ne peut pas être vide'
-            }))
+            await self.envoyer('error', {'message': 'Le message ne peut pas être vide'}, conversation_id)
             return
         
         # Créer le message en base de données
-        message = await self.create_message(contenu)
+        message = await self.create_message(self.conversations[conversation_id], contenu)
         if not message:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Erreur lors de la création du message'
-            }))
+            await self.envoyer('error', {'message': 'Erreur lors de la création du message'}, conversation_id)
             return
         
-        # Diffuser le message à tous les participants
+        # Diffuser le message à tous les participants (expéditeur et
+        # destinataire déjà en mémoire : aucune requête)
         await self.channel_layer.group_send(
-            self.conversation_group_name,
-            {
-                'type': 'chat_message',
-                'message': {
-                    'id': message.id,
-                    'contenu': message.contenu,
-                    'sender_id': message.sender.id,
-                    'sender_name': message.sender.get_full_name(),
-                    'sender_role': message.sender.role,
-                    'receiver_id': message.receiver.id,
-                    'receiver_name': message.receiver.get_full_name(),
-                    'type_message': message.type_message,
-                    'is_read': message.is_read,
-                    'created_at': message.created_at.isoformat(),
-                    'fichier_url': message.fichier.url if message.fichier else None,
-                    'file_name': message.file_name,
-                    'is_image': message.is_image,
-                }
-            }
+            f'chat_{conversation_id}',
+            evenement_groupe('chat_message', conversation_id, 'message', {
+                'id': message.id,
+                'contenu': message.contenu,
+                'sender_id': self.user.id,
+                'sender_name': self.user.get_full_name(),
+                'sender_role': self.user.role,
+                'receiver_id': message.receiver.id,
+                'receiver_name': message.receiver.get_full_name(),
+                'type_message': message.type_message,
+                'is_read': message.is_read,
+                'created_at': message.created_at.isoformat(),
+                'fichier_url': message.fichier.url if message.fichier else None,
+                'file_name': message.file_name,
+                'is_image': message.is_image,
+            }, self.user.id)
         )
     
-    async def handle_mark_as_read(self, data):
-        """Marquer les messages comme lus"""
-        await self.mark_messages_as_read()
+    async def handle_mark_as_read(self, conversation_id, data):
+        """Marquer les messages comme lus (jusqu'à ``message_id`` si fourni)"""
+        jusqua = data.get('message_id')
+        evenement = await self.mark_messages_as_read(self.conversations[conversation_id], int(jusqua) if jusqua else None)
         
-        # Notifier les autres participants
-        await self.channel_layer.group_send(
-            self.conversation_group_name,
-            {
-                'type': 'messages_read',
-                'user_id': self.user.id,
-                'username': self.user.get_full_name()
-            }
-        )
+        # Notifier les autres participants avec le filigrane de lecture
+        if evenement:
+            await self.channel_layer.group_send(f'chat_{conversation_id}', evenement)
     
-    async def handle_typing(self, data):
+    async def handle_typing(self, conversation_id, data):
         """Gérer l'indicateur de frappe"""
         is_typing = data.get('is_typing', False)
         
         await self.channel_layer.group_send(
-            self.conversation_group_name,
-            {
-                'type': 'typing_indicator',
+            f'chat_{conversation_id}',
+            evenement_groupe('typing_indicator', conversation_id, 'typing', {
                 'user_id': self.user.id,
                 'username': self.user.get_full_name(),
                 'is_typing': is_typing
-            }
+            }, self.user.id)
         )
     
-    # Handlers pour les messages reçus du group
+    # Handlers pour les messages reçus des groupes : la trame arrive sérialisée
+    # et est transmise telle quelle ; seul l'en-tête ``user_id`` est inspecté
     
     async def chat_message(self, event):
         """Envoyer un message de chat au WebSocket"""
-        await self.send(text_data=json.dumps({
-            'type': 'message',
-            'data': event['message']
-        }))
+        await self.send(text_data=event['frame'])
     
     async def user_status(self, event):
         """Envoyer le statut d'un utilisateur au WebSocket"""
         # Ne pas envoyer son propre statut
         if event['user_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
-                'type': 'user_status',
-                'data': {
-                    'user_id': event['user_id'],
-                    'username': event['username'],
-                    'status': event['status']
-                }
-            }))
+            await self.send(text_data=event['frame'])
     
     async def messages_read(self, event):
         """Notifier que des messages ont été lus"""
         if event['user_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
-                'type': 'messages_read',
-                'data': {
-                    'user_id': event['user_id'],
-                    'username': event['username']
-                }
-            }))
+            await self.send(text_data=event['frame'])
     
     async def typing_indicator(self, event):
         """Envoyer l'indicateur de frappe au WebSocket"""
         if event['user_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
-                'type': 'typing',
-                'data': {
-                    'user_id': event['user_id'],
-                    'username': event['username'],
-                    'is_typing': event['is_typing']
+            await self.send(text_data=event['frame'])
+    
+    async def notification(self, event):
+        """Envoyer une notification au WebSocket"""
+        await self.envoyer('notification', event['data'])
+    
+    async def notification_count(self, event):
+        """Envoyer le nombre de notifications non lues"""
+        await self.envoyer('notification_count', event['data'])
+    
+    async def unread_count_update(self, event):
+        """Envoyer la mise à jour du nombre de messages non lus"""
+        await self.envoyer('unread_count', event['data'])
+    
+    async def send_unread_count(self):
+        """Envoyer le nombre de messages non lus"""
+        if not hasattr(self, 'notification_group_name'):
+            return
+        try:
+            unread_count = await self.count_unread()
+            
+            await self.channel_layer.group_send(
+                self.notification_group_name,
+                {
+                    'type': 'unread_count_update',
+                    'data': {'unread_count': unread_count}
                 }
-            }))
+            )
+            
+        except Exception as e:
+            logger.error(f"Erreur lors du calcul des messages non lus: {e}")
     
     # Méthodes utilitaires
     
     @database_sync_to_async
-    def can_access_conversation(self):
-        """Vérifier si l'utilisateur peut accéder à cette conversation"""
+    def conversations_initiales(self):
+        """Toutes les conversations de l'utilisateur et leurs participants (une requête)"""
+        return list(
+            Conversation.objects.filter(Q(agent=self.user) | Q(declarant=self.user)).select_related('agent', 'declarant')
+        )
+    
+    @database_sync_to_async
+    def charger_conversation(self, conversation_id):
+        """Conversation et participants si l'utilisateur y a accès, sinon None"""
         try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            return (conversation.agent == self.user or 
-                   conversation.declarant == self.user or
-                   self.user.role == 'admin')
+            conversation = Conversation.objects.select_related('agent', 'declarant').get(id=conversation_id)
         except ObjectDoesNotExist:
-            return False
+            return None
+        if self.user.id in (conversation.agent_id, conversation.declarant_id) or self.user.role == 'admin':
+            return conversation
+        return None
     
     @database_sync_to_async
-    def create_message(self, contenu):
-        """Créer un message en base de données"""
+    def create_message(self, conversation, contenu):
+        """
+        Créer un message en base de données : un INSERT, puis un UPDATE de la
+        conversation (résumé, compteurs et ``updated_at``, cf. ``Message.save``)
+        """
         try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            
             # Déterminer le destinataire
-            if self.user == conversation.agent:
+            if self.user.id == conversation.agent_id:
                 receiver = conversation.declarant
             else:
                 receiver = conversation.agent
             
-            message = Message.objects.create(
+            return Message.objects.create(
                 conversation=conversation,
                 sender=self.user,
                 receiver=receiver,
@@ -247,111 +314,65 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 type_message='texte'
             )
             
-            # Mettre à jour la date de dernière modification de la conversation
-            conversation.save()
-            
-            return message
-            
         except Exception as e:
             logger.error(f"Erreur lors de la création du message: {e}")
             return None
     
     @database_sync_to_async
-    def mark_messages_as_read(self):
-        """Marquer tous les messages non lus de cette conversation comme lus"""
+    def mark_messages_as_read(self, conversation, jusqua=None):
+        """
+        Marquer les messages non lus de cette conversation comme lus (un seul
+        UPDATE) ; renvoie l'évènement à diffuser, ou None si rien n'a changé
+        """
         try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            messages_to_read = Message.objects.filter(
-                conversation=conversation,
-                receiver=self.user,
-                is_read=False
-            )
-            
-            for message in messages_to_read:
-                message.mark_as_read()
+            nombre = conversation.marquer_comme_lus(self.user, jusqua)
+            return evenement_lecture(conversation, self.user, nombre) if nombre else None
                 
         except Exception as e:
             logger.error(f"Erreur lors du marquage des messages comme lus: {e}")
+            return None
+    
+    @database_sync_to_async
+    def count_unread(self):
+        """Total des compteurs de non lus de l'utilisateur (une requête)"""
+        if self.user.role in ['agent', 'admin']:
+            conversations = Conversation.objects.filter(agent=self.user)
+            champ = 'non_lus_agent'
+        else:
+            conversations = Conversation.objects.filter(declarant=self.user)
+            champ = 'non_lus_declarant'
+        return conversations.aggregate(total=Sum(champ))['total'] or 0
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(MessagerieConsumer):
     """
-    Consumer WebSocket pour les notifications globales d'un utilisateur
+    Compatibilité ``ws/chat/<id>/`` : une seule conversation, celle de l'URL,
+    implicite dans les trames du client
     """
     
-    async def connect(self):
-        """Connexion WebSocket pour les notifications"""
-        self.user = self.scope["user"]
-        
-        # Vérifier que l'utilisateur est authentifié
-        if not self.user.is_authenticated:
-            await self.close(code=4001)
-            return
-        
-        # Groupe pour les notifications de cet utilisateur
-        self.notification_group_name = f'notifications_{self.user.id}'
-        
-        # Rejoindre le groupe de notifications
-        await self.channel_layer.group_add(
-            self.notification_group_name,
-            self.channel_name
-        )
-        
-        await self.accept()
+    notifications = False
     
-    async def disconnect(self, close_code):
-        """Déconnexion WebSocket"""
-        if hasattr(self, 'notification_group_name'):
-            await self.channel_layer.group_discard(
-                self.notification_group_name,
-                self.channel_name
-            )
+    async def connect(self):
+        self.conversation_id = int(self.scope['url_route']['kwargs']['conversation_id'])
+        await super().connect()
     
-    async def receive(self, text_data):
-        """Réception d'un message du client pour les notifications"""
-        try:
-            data = json.loads(text_data)
-            action = data.get('action', '')
-            
-            if action == 'get_unread_count':
-                await self.send_unread_count()
-                
-        except json.JSONDecodeError:
-            logger.error("Erreur de décodage JSON dans NotificationConsumer")
+    def conversation_demandee(self, data):
+        return self.conversation_id
     
-    async def notification(self, event):
-        """Envoyer une notification au WebSocket"""
-        await self.send(text_data=json.dumps({
-            'type': 'notification',
-            'data': event['data']
-        }))
+    async def conversations_initiales(self):
+        conversation = await self.charger_conversation(self.conversation_id)
+        return [conversation] if conversation else None
     
-    async def unread_count_update(self, event):
-        """Envoyer la mise à jour du nombre de messages non lus"""
-        await self.send(text_data=json.dumps({
-            'type': 'unread_count',
-            'data': event['data']
-        }))
+    async def envoyer(self, type_trame, donnees, conversation_id=None):
+        # Les pages de l'ancienne route lisent les erreurs au premier niveau : {type, message}
+        if type_trame == 'error':
+            await self.send(text_data=json.dumps({'type': 'error', 'message': donnees['message']}))
+            return
+        await super().envoyer(type_trame, donnees, conversation_id)
+
+
+class NotificationConsumer(MessagerieConsumer):
+    """Compatibilité ``ws/notifications/`` : notifications seules"""
     
-    @database_sync_to_async
-    def send_unread_count(self):
-        """Envoyer le nombre de messages non lus"""
-        try:
-            # Compter les conversations avec des messages non lus
-            if self.user.role in ['agent', 'admin']:
-                conversations = Conversation.objects.filter(agent=self.user)
-                unread_count = sum(conv.unread_count_for_agent for conv in conversations)
-            else:
-                conversations = Conversation.objects.filter(declarant=self.user)
-                unread_count = sum(conv.unread_count_for_declarant for conv in conversations)
-            
-            self.channel_layer.group_send(
-                self.notification_group_name,
-                {
-                    'type': 'unread_count_update',
-                    'data': {'unread_count': unread_count}
-                }
-            )
-            
-        except Exception as e:
-            logger.error(f"Erreur lors du calcul des messages non lus: {e}")
\ No newline at end of file
+    async def conversations_initiales(self):
+        return []
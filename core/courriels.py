@@ -0,0 +1,177 @@
+"""
+Envoi groupé des emails (notifications, digests).
+
+``send_mail`` ouvrait et fermait une connexion SMTP par message et relisait
+les deux gabarits à chaque appel. Ici, les gabarits sont chargés une fois par
+type d'email puis rendus avec le contexte de chaque destinataire, et tous les
+messages partent sur une seule connexion réutilisée (``send_messages``).
+
+Chaque message est envoyé séparément sur cette connexion : un refus est
+attribué au bon message, qui est réessayé (``COURRIELS_TENTATIVES``) sans
+renvoyer les autres. Le débit est limité à ``COURRIELS_DEBIT_MAX`` emails par
+seconde pour respecter les quotas du relais SMTP.
+"""
+
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Débit maximal (emails par seconde, 0 : sans limite)
+COURRIELS_DEBIT_MAX = getattr(settings, 'COURRIELS_DEBIT_MAX', 0)
+
+# Essais par message et pause entre deux essais (secondes, multipliée par l'essai)
+COURRIELS_TENTATIVES = getattr(settings, 'COURRIELS_TENTATIVES', 3)
+COURRIELS_DELAI_ESSAI = getattr(settings, 'COURRIELS_DELAI_ESSAI', 1.0)
+
+
+def contexte_site():
+    """Variables communes à tous les gabarits d'email"""
+    return {
+        'site_name': 'TogoRetrouve',
+        'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
+    }
+
+
+class Composeur:
+    """Construit les messages ; chaque gabarit n'est chargé qu'une fois par composeur"""
+
+    def __init__(self):
+        self._gabarits = {}
+
+    def gabarits(self, nom):
+        if nom not in self._gabarits:
+            self._gabarits[nom] = (get_template(f"{nom}.txt"), get_template(f"{nom}.html"))
+        return self._gabarits[nom]
+
+    def composer(self, nom, contexte, sujet, destinataire):
+        """
+        Args:
+            nom: Gabarits sans extension (ex: 'emails/notification' pour .txt et .html)
+            contexte: Contexte propre au destinataire (complété par contexte_site)
+        """
+        texte, html = self.gabarits(nom)
+        contexte = {**contexte_site(), **contexte}
+        message = EmailMultiAlternatives(
+            subject=sujet,
+            body=texte.render(contexte),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[destinataire],
+        )
+        message.attach_alternative(html.render(contexte), 'text/html')
+        return message
+
+
+def envoyer(messages, debit=None, tentatives=None, connexion=None):
+    """
+    Envoyer des messages sur une seule connexion.
+
+    Args:
+        messages: Liste d'EmailMessage
+        debit: Emails par seconde au plus (défaut COURRIELS_DEBIT_MAX)
+        tentatives: Essais par message (défaut COURRIELS_TENTATIVES)
+        connexion: Backend d'email (défaut : get_connection())
+
+    Returns:
+        dict: {'envoyes': [indices], 'echecs': [indices], 'duree', 'par_seconde'}
+    """
+    debit = COURRIELS_DEBIT_MAX if debit is None else debit
+    tentatives = tentatives or COURRIELS_TENTATIVES
+    intervalle = 1 / debit if debit else 0
+    connexion = connexion or get_connection()
+
+    envoyes, echecs = [], []
+    debut = prochain = time.perf_counter()
+    if messages:
+        try:
+            connexion.open()
+        except (smtplib.SMTPException, OSError) as e:
+            # Serveur injoignable : tout le lot est compté en échec, sans lever
+            logger.error(f"Connexion SMTP impossible, {len(messages)} email(s) non envoyé(s) : {e}")
+            messages, echecs = [], list(range(len(messages)))
+    try:
+        for indice, message in enumerate(messages):
+            for essai in range(1, tentatives + 1):
+                attente = prochain - time.perf_counter()
+                if attente > 0:
+                    time.sleep(attente)
+                prochain = max(prochain, time.perf_counter()) + intervalle
+                try:
+                    if connexion.send_messages([message]):
+                        envoyes.append(indice)
+                        break
+                    erreur = "message non accepté"
+                except (smtplib.SMTPException, OSError) as e:
+                    erreur = e
+                    # SMTPException hérite d'OSError : seules les erreurs réseau coupent la connexion
+                    if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                        # Connexion perdue : la rouvrir pour la suite
+                        connexion.close()
+                        try:
+                            connexion.open()
+                        except (smtplib.SMTPException, OSError):
+                            # L'essai suivant retentera l'ouverture
+                            pass
+                if essai == tentatives:
+                    logger.error(f"Email à {', '.join(message.to)} abandonné après {tentatives} essai(s) : {erreur}")
+                    echecs.append(indice)
+                else:
+                    logger.warning(f"Email à {', '.join(message.to)} refusé (essai {essai}/{tentatives}) : {erreur}")
+                    time.sleep(COURRIELS_DELAI_ESSAI * essai)
+    finally:
+        connexion.close()
+
+    duree = time.perf_counter() - debut
+    return {
+        'envoyes': envoyes,
+        'echecs': echecs,
+        'duree': duree,
+        'par_seconde': len(envoyes) / duree if duree else 0.0,
+    }
+
+
+def envoyer_notifications(notifications, **options):
+    """
+    Envoyer l'email de chaque notification et marquer celles envoyées.
+
+    Args:
+        notifications: Notifications (avec destinataire chargé)
+        **options: Transmis à envoyer (debit, tentatives, connexion)
+
+    Returns:
+        dict: résultat d'envoyer, avec les identifiants dans 'envoyes' et 'echecs'
+    """
+    composeur = Composeur()
+    a_envoyer = [n for n in notifications if n.destinataire.email]
+    messages = [
+        composeur.composer(
+            'emails/notification',
+            {'notification': notification, 'user': notification.destinataire},
+            f"[TogoRetrouve] {notification.titre}",
+            notification.destinataire.email,
+        )
+        for notification in a_envoyer
+    ]
+    resultat = envoyer(messages, **options)
+
+    envoyees = [a_envoyer[i] for i in resultat['envoyes']]
+    if envoyees:
+        maintenant = timezone.now()
+        Notification.objects.filter(pk__in=[n.pk for n in envoyees]).update(
+            envoyee_par_email=True, date_envoi_email=maintenant
+        )
+        for notification in envoyees:
+            notification.envoyee_par_email = True
+            notification.date_envoi_email = maintenant
+
+    resultat['envoyes'] = [n.pk for n in envoyees]
+    resultat['echecs'] = [a_envoyer[i].pk for i in resultat['echecs']]
+    return resultat
@@ -0,0 +1,156 @@
+"""
+Digest hebdomadaire des agents, calculé en bloc.
+
+Les statistiques de tous les agents viennent de quatre requêtes agrégées
+(déclarations et réclamations de la période par région × préfecture,
+validations et traitements par agent), combinées en mémoire selon le
+périmètre de chaque agent : sa région, sinon sa préfecture, sinon tout le
+pays. Le nombre de requêtes ne dépend plus du nombre d'agents.
+
+Les emails sont composés et envoyés par lots de ``DIGEST_TAILLE_LOT``
+(une connexion SMTP par lot, voir core/courriels.py).
+"""
+
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from . import courriels
+from .models import Declaration, Reclamation, Utilisateur
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'emails composés puis envoyés ensemble
+DIGEST_TAILLE_LOT = getattr(settings, 'DIGEST_TAILLE_LOT', 200)
+
+STATISTIQUES = ['nouvelles_declarations', 'declarations_validees', 'nouvelles_reclamations', 'reclamations_traitees']
+
+
+def destinataires():
+    """Agents et administrateurs actifs ayant un email"""
+    return Utilisateur.objects.filter(
+        role__in=['agent', 'admin'], actif=True, email__isnull=False
+    ).exclude(email='').select_related('region').order_by('pk')
+
+
+def _par_zone(lignes):
+    """{(region_id, prefecture_id): n} -> comptes par région, par préfecture et total"""
+    par_region, par_prefecture = Counter(), Counter()
+    for (region_id, prefecture_id), nombre in lignes.items():
+        par_region[region_id] += nombre
+        par_prefecture[prefecture_id] += nombre
+    return par_region, par_prefecture, sum(lignes.values())
+
+
+def _dans_perimetre(agent, region_id, prefecture_id):
+    if agent.region_id:
+        return region_id == agent.region_id
+    if agent.prefecture_id:
+        return prefecture_id == agent.prefecture_id
+    return True
+
+
+def statistiques_agents(agents, debut, fin):
+    """
+    Statistiques de la période pour chaque agent, en quatre requêtes.
+
+    Returns:
+        dict: {agent_id: {statistique: nombre}}
+    """
+    declarations = _par_zone({
+        (ligne['region'], ligne['prefecture']): ligne['n']
+        for ligne in Declaration.objects.filter(date_declaration__range=[debut, fin])
+        .values('region', 'prefecture').annotate(n=Count('id')).order_by()
+    })
+    reclamations = _par_zone({
+        (ligne['declaration__region'], ligne['declaration__prefecture']): ligne['n']
+        for ligne in Reclamation.objects.filter(date_reclamation__range=[debut, fin])
+        .values('declaration__region', 'declaration__prefecture').annotate(n=Count('id')).order_by()
+    })
+
+    validations = defaultdict(list)
+    for ligne in (Declaration.objects.filter(agent_validateur__isnull=False, date_publication__range=[debut, fin])
+                  .values('agent_validateur', 'region', 'prefecture').annotate(n=Count('id')).order_by()):
+        validations[ligne['agent_validateur']].append((ligne['region'], ligne['prefecture'], ligne['n']))
+
+    traitements = dict(
+        Reclamation.objects.filter(agent_traitant__isnull=False, date_traitement__range=[debut, fin])
+        .values_list('agent_traitant').annotate(n=Count('id')).order_by()
+    )
+
+    def dans_zone(comptes, agent):
+        par_region, par_prefecture, total = comptes
+        if agent.region_id:
+            return par_region[agent.region_id]
+        if agent.prefecture_id:
+            return par_prefecture[agent.prefecture_id]
+        return total
+
+    return {
+        agent.pk: {
+            'nouvelles_declarations': dans_zone(declarations, agent),
+            'declarations_validees': sum(
+                n for region_id, prefecture_id, n in validations.get(agent.pk, [])
+                if _dans_perimetre(agent, region_id, prefecture_id)
+            ),
+            'nouvelles_reclamations': dans_zone(reclamations, agent),
+            'reclamations_traitees': traitements.get(agent.pk, 0),
+        }
+        for agent in agents
+    }
+
+
+def envoyer_digest_hebdomadaire(fin=None, taille_lot=None, envoyer=True):
+    """
+    Calculer et envoyer le digest de la semaine écoulée.
+
+    Args:
+        fin: Fin de la période (défaut : maintenant)
+        taille_lot: Emails par lot (défaut DIGEST_TAILLE_LOT)
+        envoyer: False pour seulement calculer (simulation)
+
+    Returns:
+        dict: {'agents', 'avec_activite', 'envoyes', 'echecs', 'duree'}
+    """
+    debut_chrono = time.perf_counter()
+    taille_lot = taille_lot or DIGEST_TAILLE_LOT
+    fin = fin or timezone.now()
+    debut = fin - timedelta(days=7)
+    periode = f"{debut.strftime('%d/%m/%Y')} - {fin.strftime('%d/%m/%Y')}"
+
+    agents = list(destinataires())
+    statistiques = statistiques_agents(agents, debut, fin)
+    actifs = [agent for agent in agents if any(statistiques[agent.pk].values())]
+
+    envoyes = echecs = 0
+    if envoyer:
+        composeur = courriels.Composeur()
+        for i in range(0, len(actifs), taille_lot):
+            messages = [
+                composeur.composer(
+                    'emails/weekly_digest',
+                    {'agent': agent, 'stats': statistiques[agent.pk], 'periode': periode},
+                    f"[TogoRetrouve] Rapport hebdomadaire - {agent.region.nom if agent.region else 'Global'}",
+                    agent.email,
+                )
+                for agent in actifs[i:i + taille_lot]
+            ]
+            resultat = courriels.envoyer(messages)
+            envoyes += len(resultat['envoyes'])
+            echecs += len(resultat['echecs'])
+
+    rapport = {
+        'agents': len(agents),
+        'avec_activite': len(actifs),
+        'envoyes': envoyes,
+        'echecs': echecs,
+        'duree': time.perf_counter() - debut_chrono,
+    }
+    logger.info(f"Digest hebdomadaire : {envoyes}/{len(actifs)} email(s) envoyé(s), "
+                f"{echecs} échec(s), {rapport['duree']:.2f}s")
+    return rapport
@@ -0,0 +1,98 @@
+"""
+Exports de rapports générés en arrière-plan.
+
+La vue d'export met une tâche en file (voir core/taches.py) ; la tâche écrit
+le fichier dans le stockage des médias, sous ``exports/``, et le demandeur le
+télécharge depuis le lien de sa notification.
+"""
+
+import csv
+import io
+import re
+import uuid
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Signalement, Utilisateur
+
+EXPORTS_DOSSIER = 'exports'
+
+_NOM_EXPORT = re.compile(r'^rapport_togoretrouve_[\w-]+\.csv$')
+
+
+def ecrire_rapport_csv(fichier, jours):
+    """Écrire le rapport des ``jours`` derniers jours dans un fichier texte"""
+    date_debut = timezone.now() - timedelta(days=jours)
+    writer = csv.writer(fichier)
+
+    # En-tête du rapport
+    writer.writerow(['RAPPORT TOGORETROUVE'])
+    writer.writerow(['Période', f'{jours} derniers jours'])
+    writer.writerow(['Date de génération', timezone.now().strftime('%d/%m/%Y %H:%M')])
+    writer.writerow([])
+
+    # Statistiques globales
+    writer.writerow(['=== STATISTIQUES GLOBALES ==='])
+    writer.writerow(['Métrique', 'Valeur'])
+    writer.writerow(['Total signalements', Signalement.objects.count()])
+    writer.writerow(['Signalements période', Signalement.objects.filter(date_signalement__gte=date_debut).count()])
+    writer.writerow(['En attente', Signalement.objects.filter(statut='en_attente').count()])
+    writer.writerow(['Validés', Signalement.objects.filter(statut__in=['valide', 'publie']).count()])
+    writer.writerow(['Restitués', Signalement.objects.filter(statut='restitue').count()])
+    writer.writerow(['Total utilisateurs', Utilisateur.objects.count()])
+    writer.writerow(['Utilisateurs actifs', Utilisateur.objects.filter(last_login__gte=date_debut).count()])
+    writer.writerow(['Nouveaux utilisateurs', Utilisateur.objects.filter(date_joined__gte=date_debut).count()])
+    writer.writerow(['Total agents', Utilisateur.objects.filter(role='agent').count()])
+    writer.writerow(['Agents actifs', Utilisateur.objects.filter(role='agent', actif=True).count()])
+    writer.writerow([])
+
+    # Répartition par statut
+    writer.writerow(['=== RÉPARTITION PAR STATUT ==='])
+    writer.writerow(['Statut', 'Nombre'])
+    for item in Signalement.objects.values('statut').annotate(count=Count('id')):
+        writer.writerow([item['statut'], item['count']])
+    writer.writerow([])
+
+    # Signalements détaillés de la période
+    writer.writerow(['=== SIGNALEMENTS DE LA PÉRIODE ==='])
+    writer.writerow(['Date', 'Utilisateur', 'Titre', 'Statut', 'Région'])
+
+    for signalement in Signalement.objects.filter(
+        date_signalement__gte=date_debut
+    ).select_related('utilisateur', 'region').order_by('-date_signalement').iterator(chunk_size=2000):
+        writer.writerow([
+            signalement.date_signalement.strftime('%d/%m/%Y %H:%M'),
+            signalement.utilisateur.username if signalement.utilisateur else 'N/A',
+            getattr(signalement, 'titre', 'N/A')[:50],
+            signalement.statut,
+            signalement.region.nom if signalement.region else 'N/A'
+        ])
+
+
+def rapport_csv(jours):
+    """
+    Générer le rapport CSV dans le stockage des médias.
+
+    Returns:
+        str: Nom du fichier (sans dossier), à passer à ``ouvrir``
+    """
+    contenu = io.StringIO()
+    # BOM pour Excel
+    contenu.write('\ufeff')
+    ecrire_rapport_csv(contenu, jours)
+
+    nom = f"rapport_togoretrouve_{timezone.now().strftime('%Y%m%d_%H%M')}_{uuid.uuid4().hex[:8]}.csv"
+    chemin = default_storage.save(f"{EXPORTS_DOSSIER}/{nom}", ContentFile(contenu.getvalue().encode('utf-8')))
+    return chemin.rsplit('/', 1)[-1]
+
+
+def ouvrir(nom):
+    """Ouvrir un export généré (FileNotFoundError si le nom est invalide ou absent)"""
+    chemin = f"{EXPORTS_DOSSIER}/{nom}"
+    if not _NOM_EXPORT.match(nom) or not default_storage.exists(chemin):
+        raise FileNotFoundError(nom)
+    return default_storage.open(chemin, 'rb')
@@ -0,0 +1,328 @@
+"""
+Outils géographiques : geohash des déclarations, données de la carte et
+recherche de proximité.
+
+Chaque déclaration géolocalisée porte un ``geohash`` (maintenu dans
+``Declaration.save``). La carte découpe la zone visible (``bbox``) en cellules
+geohash ; chaque cellule est agrégée en groupes (zoom faible) ou listée point
+par point (zoom fort), puis mise en cache par (cellule, filtres). Les réponses
+sont encodées par colonnes pour ne pas répéter les clés JSON à chaque marqueur.
+"""
+
+import hashlib
+import math
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Min, Q
+from django.db.models.functions import Substr
+
+from .cache_pages import cache_partage, nouvelle_version
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Précision du geohash stocké (9 caractères ≈ 5 m)
+GEOHASH_PRECISION = 9
+
+# Zoom à partir duquel les marqueurs sont envoyés individuellement
+CARTE_ZOOM_POINTS = getattr(settings, 'CARTE_ZOOM_POINTS', 15)
+# Nombre maximum de cellules interrogées pour une requête
+CARTE_MAX_CELLULES = getattr(settings, 'CARTE_MAX_CELLULES', 32)
+# Nombre maximum de points renvoyés
+CARTE_MAX_POINTS = getattr(settings, 'CARTE_MAX_POINTS', 2000)
+CARTE_CACHE_TIMEOUT = getattr(settings, 'CARTE_CACHE_TIMEOUT', 300)
+
+_GENERATION_KEY = 'carte_generation'
+
+# Précision des groupes selon le zoom Leaflet
+_PRECISION_GROUPES = [(4, 2), (7, 3), (10, 4), (12, 5), (14, 6)]
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash d'une position. Retourne '' si la position est inconnue."""
+    if latitude is None or longitude is None:
+        return ''
+    latitude, longitude = float(latitude), float(longitude)
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    geohash = []
+    bits, valeur, pair = 0, 0, True
+    while len(geohash) < precision:
+        if pair:
+            milieu = (lon_min + lon_max) / 2
+            if longitude >= milieu:
+                valeur = (valeur << 1) | 1
+                lon_min = milieu
+            else:
+                valeur <<= 1
+                lon_max = milieu
+        else:
+            milieu = (lat_min + lat_max) / 2
+            if latitude >= milieu:
+                valeur = (valeur << 1) | 1
+                lat_min = milieu
+            else:
+                valeur <<= 1
+                lat_max = milieu
+        pair = not pair
+        bits += 1
+        if bits == 5:
+            geohash.append(_BASE32[valeur])
+            bits, valeur = 0, 0
+    return ''.join(geohash)
+
+
+def taille_cellule(precision):
+    """(hauteur en degrés de latitude, largeur en degrés de longitude) d'une cellule"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def cellules_couvrantes(bbox, precision):
+    """
+    Cellules geohash couvrant une zone.
+
+    Args:
+        bbox: (ouest, sud, est, nord) en degrés
+        precision: longueur des geohash
+    """
+    ouest, sud, est, nord = bbox
+    hauteur, largeur = taille_cellule(precision)
+    cellules = set()
+    lat = sud
+    while True:
+        lon = ouest
+        while True:
+            cellules.add(encode_geohash(min(lat, nord), min(lon, est), precision))
+            if lon >= est:
+                break
+            lon += largeur
+        if lat >= nord:
+            break
+        lat += hauteur
+    return sorted(cellules)
+
+
+def _nombre_cellules(bbox, precision):
+    ouest, sud, est, nord = bbox
+    hauteur, largeur = taille_cellule(precision)
+    return (int((nord - sud) / hauteur) + 2) * (int((est - ouest) / largeur) + 2)
+
+
+def parse_bbox(valeur):
+    """Lire un paramètre ``bbox=ouest,sud,est,nord``. Lève ValueError si invalide."""
+    ouest, sud, est, nord = (float(v) for v in valeur.split(','))
+    ouest, est = max(ouest, -180.0), min(est, 180.0)
+    sud, nord = max(sud, -90.0), min(nord, 90.0)
+    if ouest > est or sud > nord:
+        raise ValueError("bbox invalide")
+    return ouest, sud, est, nord
+
+
+def precision_groupes(zoom):
+    """Précision des groupes pour un zoom, ou None au-delà de CARTE_ZOOM_POINTS"""
+    if zoom >= CARTE_ZOOM_POINTS:
+        return None
+    for zoom_max, precision in _PRECISION_GROUPES:
+        if zoom <= zoom_max:
+            return precision
+    return _PRECISION_GROUPES[-1][1]
+
+
+def _generation():
+    # Génération commune à tous les processus, cellules dans le cache du processus
+    return cache_partage().get_or_set(_GENERATION_KEY, nouvelle_version, None)
+
+
+def invalider_carte():
+    """Invalider toutes les cellules en cache (après une écriture sur une déclaration)"""
+    cache_partage().set(_GENERATION_KEY, nouvelle_version(), None)
+
+
+def _dans_cellule(cellule):
+    # '~' est après tous les caractères base32 : intervalle indexé plutôt que LIKE
+    return Q(geohash__gte=cellule, geohash__lt=cellule + '~')
+
+
+def _groupes_cellule(queryset, cellule, precision):
+    lignes = (
+        queryset.filter(_dans_cellule(cellule))
+        .annotate(groupe=Substr('geohash', 1, precision))
+        .values('groupe')
+        .annotate(
+            nombre=Count('id'),
+            perdus=Count('id', filter=Q(type_declaration='perdu')),
+            lat=Avg('latitude'),
+            lon=Avg('longitude'),
+            premier=Min('id'),
+        )
+        .order_by('groupe')
+    )
+    colonnes = {'cell': [], 'lat': [], 'lon': [], 'count': [], 'perdu': [], 'id': []}
+    for ligne in lignes:
+        colonnes['cell'].append(ligne['groupe'])
+        colonnes['lat'].append(round(float(ligne['lat']), 6))
+        colonnes['lon'].append(round(float(ligne['lon']), 6))
+        colonnes['count'].append(ligne['nombre'])
+        colonnes['perdu'].append(ligne['perdus'])
+        # Identifiant utile seulement pour un groupe d'un seul signalement
+        colonnes['id'].append(ligne['premier'] if ligne['nombre'] == 1 else None)
+    return colonnes
+
+
+def _points_cellule(queryset, cellule):
+    from .models import Declaration
+
+    stockage = Declaration._meta.get_field('photo_principale').storage
+    lignes = queryset.filter(_dans_cellule(cellule)).order_by('id').values_list(
+        'id', 'latitude', 'longitude', 'type_declaration', 'nom_objet',
+        'date_incident', 'lieu_precis', 'numero_declaration', 'photo_principale',
+    )[:CARTE_MAX_POINTS]
+    colonnes = {k: [] for k in ('id', 'lat', 'lon', 'type', 'nom', 'date', 'lieu', 'numero', 'photo')}
+    for id_, lat, lon, type_, nom, date_incident, lieu, numero, photo in lignes:
+        colonnes['id'].append(id_)
+        colonnes['lat'].append(float(lat))
+        colonnes['lon'].append(float(lon))
+        colonnes['type'].append(type_)
+        colonnes['nom'].append(nom)
+        colonnes['date'].append(date_incident.isoformat())
+        colonnes['lieu'].append(lieu)
+        colonnes['numero'].append(numero)
+        colonnes['photo'].append(stockage.url(photo) if photo else None)
+    return colonnes
+
+
+def cle_filtres(**filtres):
+    """Clé courte et stable pour une combinaison de filtres"""
+    brut = '&'.join(f'{k}={str(v or "").strip().lower()}' for k, v in sorted(filtres.items()))
+    return hashlib.md5(brut.encode()).hexdigest()[:16]
+
+
+def donnees_carte(queryset, bbox, zoom, filtres_cle):
+    """
+    Données de la carte pour une zone et un zoom.
+
+    Returns:
+        dict: {'mode': 'groupes'|'points', 'precision', 'data': {colonne: [valeurs]}, 'tronque'}
+    """
+    precision = precision_groupes(zoom)
+    mode = 'points' if precision is None else 'groupes'
+
+    # Cellules de cache : un cran plus grossières que les groupes, en nombre limité
+    precision_cellule = (precision or GEOHASH_PRECISION) - 1
+    while precision_cellule > 1 and _nombre_cellules(bbox, precision_cellule) > CARTE_MAX_CELLULES:
+        precision_cellule -= 1
+    precision_cellule = max(precision_cellule, 1)
+    cellules = cellules_couvrantes(bbox, precision_cellule)
+
+    generation = _generation()
+    cles = {
+        f'carte_{generation}_{filtres_cle}_{mode}_{precision}_{cellule}': cellule
+        for cellule in cellules
+    }
+    en_cache = cache.get_many(list(cles))
+    manquants = {}
+    for cle, cellule in cles.items():
+        if cle not in en_cache:
+            if mode == 'points':
+                manquants[cle] = _points_cellule(queryset, cellule)
+            else:
+                manquants[cle] = _groupes_cellule(queryset, cellule, precision)
+    if manquants:
+        cache.set_many(manquants, CARTE_CACHE_TIMEOUT)
+    en_cache.update(manquants)
+
+    data = None
+    for cle in cles:
+        morceau = en_cache[cle]
+        if data is None:
+            data = {k: list(v) for k, v in morceau.items()}
+        else:
+            for k, v in morceau.items():
+                data[k].extend(v)
+
+    tronque = False
+    if mode == 'points' and data:
+        ouest, sud, est, nord = bbox
+        garder = [i for i, (lat, lon) in enumerate(zip(data['lat'], data['lon']))
+                  if sud <= lat <= nord and ouest <= lon <= est]
+        tronque = len(garder) > CARTE_MAX_POINTS
+        garder = garder[:CARTE_MAX_POINTS]
+        data = {k: [v[i] for i in garder] for k, v in data.items()}
+
+    return {'mode': mode, 'precision': precision, 'data': data or {}, 'tronque': tronque}
+
+
+# ===== RECHERCHE DE PROXIMITÉ =====
+
+RAYON_TERRE_KM = 6371.0
+# Rayon maximum accepté par la recherche de proximité
+PROXIMITE_RAYON_MAX_KM = getattr(settings, 'PROXIMITE_RAYON_MAX_KM', 50)
+
+
+def rectangle_englobant(latitude, longitude, rayon_km):
+    """(lat_min, lat_max, lon_min, lon_max) contenant le cercle de rayon ``rayon_km``"""
+    delta_lat = math.degrees(rayon_km / RAYON_TERRE_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6 or latitude + delta_lat >= 90 or latitude - delta_lat <= -90:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(math.degrees(rayon_km / (RAYON_TERRE_KM * cos_lat)), 180.0)
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def distances_km(latitude, longitude, latitudes, longitudes):
+    """Distances haversine (km) entre un point et des tableaux de positions"""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def recherche_proximite(queryset, latitude, longitude, rayon_km, curseur=None, limite=20):
+    """
+    Déclarations à moins de ``rayon_km`` d'un point, de la plus proche à la plus lointaine.
+
+    Le rectangle englobant est filtré par la base (index latitude/longitude),
+    la distance exacte est calculée sur les seuls candidats restants.
+
+    Args:
+        curseur: position {'d': distance, 'id': id} de la dernière ligne de la page précédente
+
+    Returns:
+        tuple: (liste de (declaration, distance_km), position de la page suivante ou None)
+    """
+    lat_min, lat_max, lon_min, lon_max = rectangle_englobant(latitude, longitude, rayon_km)
+    candidats = queryset.filter(latitude__range=(lat_min, lat_max))
+    if lon_max - lon_min < 360:
+        candidats = candidats.filter(longitude__range=(lon_min, lon_max))
+    lignes = list(candidats.order_by().values_list('id', 'latitude', 'longitude'))
+    if not lignes:
+        return [], None
+
+    ids = np.array([l[0] for l in lignes], dtype=np.int64)
+    distances = distances_km(
+        latitude, longitude,
+        np.array([float(l[1]) for l in lignes]),
+        np.array([float(l[2]) for l in lignes]),
+    )
+    # Arrondi au mètre : la position du curseur est relue sans perte
+    distances = np.round(distances, 3)
+
+    garder = distances <= rayon_km
+    if curseur:
+        garder &= (distances > curseur['d']) | ((distances == curseur['d']) & (ids > curseur['id']))
+    ids, distances = ids[garder], distances[garder]
+    ordre = np.lexsort((ids, distances))[:limite + 1]
+
+    page = [(int(ids[i]), float(distances[i])) for i in ordre]
+    suivant = None
+    if len(page) > limite:
+        page = page[:limite]
+        suivant = {'d': page[-1][1], 'id': page[-1][0]}
+
+    declarations = queryset.in_bulk([pk for pk, _ in page])
+    return [(declarations[pk], distance) for pk, distance in page], suivant
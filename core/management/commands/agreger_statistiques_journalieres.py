@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from core import statistiques
+from core.models import Declaration
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les agrégats journaliers des déclarations (idempotent). Par défaut, "
+            "seuls les derniers jours sont recalculés ; les écritures les tiennent à jour entre deux passages")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=2,
+                            help="Nombre de derniers jours recalculés (défaut: 2, aujourd'hui et hier)")
+        parser.add_argument('--modifiees', type=int, metavar='HEURES',
+                            help="Recalculer aussi les jours des déclarations modifiées depuis N heures")
+        parser.add_argument('--depuis', help="Recalculer depuis une date (AAAA-MM-JJ)")
+        parser.add_argument('--tout', action='store_true', help="Recalculer tout l'historique")
+        parser.add_argument('--lot-jours', type=int, default=31, help="Nombre de jours recalculés par transaction")
+
+    def handle(self, *args, **options):
+        aujourd_hui = timezone.localdate()
+
+        self.stdout.write("📈 Agrégats journaliers des déclarations - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        if options['tout']:
+            premiere = Declaration.objects.aggregate(premiere=Min('date_declaration'))['premiere']
+            debut = statistiques.jour_declaration(premiere) if premiere else aujourd_hui
+        elif options['depuis']:
+            try:
+                debut = datetime.strptime(options['depuis'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+        else:
+            debut = aujourd_hui - timedelta(days=max(options['jours'], 1) - 1)
+
+        periodes = []
+        jour = debut
+        while jour <= aujourd_hui:
+            fin = min(jour + timedelta(days=options['lot_jours'] - 1), aujourd_hui)
+            periodes.append((jour, fin))
+            jour = fin + timedelta(days=1)
+
+        if options['modifiees']:
+            depuis = timezone.now() - timedelta(hours=options['modifiees'])
+            periodes += [(j, j) for j in statistiques.jours_modifies(depuis) if j < debut]
+
+        debut_chrono = time.monotonic()
+        lignes = 0
+        for premier, dernier in periodes:
+            lignes += statistiques.recalculer_jours(premier, dernier)
+            self.stdout.write(f"   ⏳ {premier} → {dernier} recalculé(s)")
+
+        duree = time.monotonic() - debut_chrono
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {lignes} ligne(s) d'agrégat écrite(s) sur {len(periodes)} période(s) en {duree:.1f}s"
+        ))
@@ -0,0 +1,77 @@
+import time
+
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+
+from core import courriels
+from core.smtp_local import ServeurSMTPLocal
+
+
+class Command(BaseCommand):
+    help = ("Mesure le débit d'envoi des emails (emails/s) contre un serveur SMTP local : "
+            "send_mail par message ou envoi groupé sur une seule connexion")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=200, help="Nombre d'emails par mesure")
+        parser.add_argument('--delai-connexion', type=float, default=0.02,
+                            help="Coût simulé d'une ouverture de connexion SMTP (secondes)")
+
+    def contexte(self, numero):
+        notification = {
+            'titre': f"Objet retrouvé n°{numero}",
+            'message': "Un objet correspondant à votre déclaration a été déposé au commissariat central.",
+            'lien_action': f"/declarations/{numero}/",
+        }
+        return {'notification': notification, 'user': {'username': f'citoyen{numero}'}}
+
+    def par_message(self, nombre):
+        debut = time.perf_counter()
+        for numero in range(nombre):
+            contexte = {**courriels.contexte_site(), **self.contexte(numero)}
+            send_mail(
+                subject=f"[TogoRetrouve] Objet retrouvé n°{numero}",
+                message=render_to_string('emails/notification.txt', contexte),
+                from_email='noreply@togoretrouve.tg',
+                recipient_list=[f'citoyen{numero}@example.tg'],
+                html_message=render_to_string('emails/notification.html', contexte),
+            )
+        return time.perf_counter() - debut
+
+    def groupe(self, nombre):
+        debut = time.perf_counter()
+        composeur = courriels.Composeur()
+        messages = [
+            composeur.composer('emails/notification', self.contexte(numero),
+                               f"[TogoRetrouve] Objet retrouvé n°{numero}", f'citoyen{numero}@example.tg')
+            for numero in range(nombre)
+        ]
+        courriels.envoyer(messages, debit=0, connexion=get_connection())
+        return time.perf_counter() - debut
+
+    def handle(self, *args, **options):
+        nombre = options['emails']
+
+        self.stdout.write("📧 Benchmark envoi d'emails - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        resultats = {}
+        for nom, mesure in (('par_message', self.par_message), ('groupe', self.groupe)):
+            with ServeurSMTPLocal(delai_connexion=options['delai_connexion']) as serveur, override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=serveur.port,
+                EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            ):
+                duree = mesure(nombre)
+                resultats[nom] = (duree, serveur.connexions, len(serveur.messages))
+
+        duree, connexions, recus = resultats['par_message']
+        self.stdout.write(f"   ⏳ send_mail par message : {recus / duree:,.0f} emails/s "
+                          f"({connexions} connexion(s), {duree:.2f}s)")
+        avant = duree
+        duree, connexions, recus = resultats['groupe']
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Envoi groupé : {recus / duree:,.0f} emails/s ({connexions} connexion(s), {duree:.2f}s), "
+            f"x{avant / duree:.1f}"
+        ))
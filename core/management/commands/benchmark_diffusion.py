@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+
+from core.consumers import MessagerieConsumer
+from core.messagerie import evenement_groupe
+
+
+class _Connexion(MessagerieConsumer):
+    """Connexion mesurée : les trames sont comptées au lieu d'être écrites sur un socket"""
+
+    def __init__(self, user_id):
+        super().__init__()
+        self.user = SimpleNamespace(id=user_id)
+        self.trames = 0
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.trames += 1
+
+    async def chat_message_reencode(self, event):
+        # Ancien handler : la trame est réencodée pour chaque destinataire
+        await self.send(text_data=json.dumps({
+            'type': 'message',
+            'conversation_id': event['conversation_id'],
+            'data': event['message'],
+        }))
+
+
+def _donnees(numero):
+    return {
+        'id': numero,
+        'contenu': "Bonjour, j'ai retrouvé un portefeuille noir près du marché de Tokoin ce matin. " * 2,
+        'sender_id': 1,
+        'sender_name': 'Agent Kossi',
+        'sender_role': 'agent',
+        'receiver_id': 2,
+        'receiver_name': 'Ama Mensah',
+        'type_message': 'texte',
+        'is_read': False,
+        'created_at': '2025-01-10T09:30:00+00:00',
+        'fichier_url': None,
+        'file_name': None,
+        'is_image': False,
+    }
+
+
+async def _mesurer(participants, messages, pre_serialise):
+    """Durée de diffusion de ``messages`` messages à ``participants`` connexions"""
+    layer = InMemoryChannelLayer()
+    connexions = [_Connexion(i) for i in range(participants)]
+    canaux = [await layer.new_channel() for _ in connexions]
+    for canal in canaux:
+        await layer.group_add('chat_1', canal)
+
+    debut = time.perf_counter()
+    for numero in range(messages):
+        if pre_serialise:
+            evenement = evenement_groupe('chat_message', 1, 'message', _donnees(numero), 1)
+        else:
+            evenement = {'type': 'chat_message', 'conversation_id': 1, 'user_id': 1, 'message': _donnees(numero)}
+        await layer.group_send('chat_1', evenement)
+        for connexion, canal in zip(connexions, canaux):
+            recu = await layer.receive(canal)
+            if pre_serialise:
+                await connexion.chat_message(recu)
+            else:
+                await connexion.chat_message_reencode(recu)
+    duree = time.perf_counter() - debut
+
+    if sum(c.trames for c in connexions) != participants * messages:
+        raise CommandError("Trames perdues pendant la diffusion")
+    return duree
+
+
+class Command(BaseCommand):
+    help = ("Mesure le débit de diffusion des messages de chat (messages/s × participants) "
+            "avec la couche en mémoire, trame réencodée par destinataire ou pré-sérialisée")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', default='2,10,50',
+                            help="Nombres de connexions par conversation, séparés par des virgules")
+        parser.add_argument('--messages', type=int, default=2000, help="Nombre de messages diffusés par mesure")
+
+    def handle(self, *args, **options):
+        try:
+            tailles = [int(n) for n in options['participants'].split(',') if n.strip()]
+        except ValueError:
+            raise CommandError("--participants attend des entiers séparés par des virgules")
+        messages = options['messages']
+
+        self.stdout.write("📡 Benchmark diffusion WebSocket - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        for participants in tailles:
+            avant = asyncio.run(_mesurer(participants, messages, pre_serialise=False))
+            apres = asyncio.run(_mesurer(participants, messages, pre_serialise=True))
+            livraisons = participants * messages
+            self.stdout.write(f"📊 {participants} participant(s), {messages} message(s)")
+            self.stdout.write(f"   ⏳ Réencodage par destinataire : {livraisons / avant:,.0f} trames/s "
+                              f"({messages / avant:,.0f} messages/s)")
+            self.stdout.write(self.style.SUCCESS(
+                f"   ✅ Trame pré-sérialisée : {livraisons / apres:,.0f} trames/s "
+                f"({messages / apres:,.0f} messages/s), x{avant / apres:.2f}"
+            ))
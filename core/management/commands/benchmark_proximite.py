@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import geo
+from core.models import Declaration, Utilisateur
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Mesure la recherche de proximité (rectangle englobant + haversine) sur un jeu "
+            "de déclarations synthétiques, annulé à la fin")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Nombre de déclarations générées")
+        parser.add_argument('--requetes', type=int, default=50, help="Nombre de recherches mesurées")
+        parser.add_argument('--rayon', type=float, default=5.0, help="Rayon de recherche (km)")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Taille des lots d'insertion")
+        parser.add_argument('--sans-reference', action='store_true',
+                            help="Ne pas mesurer le parcours complet sans préfiltre")
+
+    def handle(self, *args, **options):
+        self.stdout.write("📍 Benchmark recherche de proximité - Lost & Found")
+        self.stdout.write("=" * 50)
+        try:
+            with transaction.atomic():
+                self._executer(options)
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write("↩️ Données synthétiques annulées")
+
+    def _executer(self, options):
+        rng = random.Random(42)
+        declarant = Utilisateur.objects.create(username=f'benchmark_{uuid.uuid4().hex[:8]}')
+
+        # Positions réparties sur le Togo (lat 6-11, lon 0.2-1.8)
+        debut = time.monotonic()
+        lot = []
+        for i in range(options['rows']):
+            lot.append(Declaration(
+                numero_declaration=f'BENCH{i:09d}',
+                type_declaration=rng.choice(['perdu', 'trouve']),
+                statut='publie',
+                nom_objet='Objet de test',
+                description='',
+                lieu_precis='',
+                date_incident=date(2025, 1, 1) + timedelta(days=rng.randrange(365)),
+                declarant=declarant,
+                latitude=Decimal(f'{rng.uniform(6.0, 11.0):.6f}'),
+                longitude=Decimal(f'{rng.uniform(0.2, 1.8):.6f}'),
+            ))
+            if len(lot) >= options['batch_size']:
+                Declaration.objects.bulk_create(lot)
+                lot = []
+        if lot:
+            Declaration.objects.bulk_create(lot)
+        self.stdout.write(f"📊 {options['rows']} déclaration(s) insérée(s) en {time.monotonic() - debut:.1f}s")
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE core_declaration")
+
+        points = [(rng.uniform(6.0, 11.0), rng.uniform(0.2, 1.8)) for _ in range(options['requetes'])]
+        signalements = Declaration.objects.filter(visible_publiquement=True, statut__in=['publie', 'valide'])
+        rayon = options['rayon']
+
+        durees, resultats = [], []
+        for lat, lon in points:
+            t = time.perf_counter()
+            page, _ = geo.recherche_proximite(signalements, lat, lon, rayon, limite=20)
+            durees.append((time.perf_counter() - t) * 1000)
+            resultats.append(len(page))
+        self._rapport("Rectangle englobant + haversine", durees)
+        self.stdout.write(f"   {statistics.mean(resultats):.1f} résultat(s) par page en moyenne")
+
+        if options['sans_reference']:
+            return
+        durees = []
+        for lat, lon in points[:max(len(points) // 10, 1)]:
+            t = time.perf_counter()
+            lignes = list(signalements.order_by().values_list('id', 'latitude', 'longitude'))
+            distances = geo.distances_km(
+                lat, lon,
+                [float(l[1]) for l in lignes],
+                [float(l[2]) for l in lignes],
+            )
+            sorted(zip(distances, (l[0] for l in lignes)))[:20]
+            durees.append((time.perf_counter() - t) * 1000)
+        self._rapport("Référence : parcours complet", durees)
+
+    def _rapport(self, titre, durees):
+        durees = sorted(durees)
+        p95 = durees[min(int(len(durees) * 0.95), len(durees) - 1)]
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {titre} : médiane {statistics.median(durees):.1f} ms, p95 {p95:.1f} ms ({len(durees)} requête(s))"
+        ))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import matching
+from core.models import Declaration, CorrespondanceDeclaration
+
+
+class Command(BaseCommand):
+    help = "Calcule les correspondances perdu/trouvé des déclarations existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            choices=['trouve', 'perdu'],
+            default='trouve',
+            help="Type des déclarations sources (défaut: trouve)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=matching.MATCHING_BATCH_SIZE,
+            help="Nombre de déclarations notées par lot",
+        )
+        parser.add_argument(
+            '--purger',
+            action='store_true',
+            help="Supprimer toutes les correspondances avant le calcul",
+        )
+
+    def handle(self, *args, **options):
+        type_source = options['type']
+        taille = options['batch_size']
+
+        self.stdout.write("🔗 Calcul des correspondances perdu/trouvé - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        if options['purger']:
+            count, _ = CorrespondanceDeclaration.objects.all().delete()
+            self.stdout.write(f"🗑️ {count} correspondance(s) supprimée(s)")
+
+        sources = Declaration.objects.filter(
+            type_declaration=type_source,
+            statut__in=matching.STATUTS_ACTIFS,
+        )
+        total = sources.count()
+        self.stdout.write(f"📊 {total} déclaration(s) de type '{type_source}' à traiter")
+
+        debut = time.monotonic()
+        traitees = 0
+        enregistrees = 0
+        for lot in matching.Lot.depuis_queryset(sources, taille):
+            meilleurs = matching.calculer_lot(type_source, lot, taille=taille)
+            enregistrees += matching.enregistrer(type_source, meilleurs)
+            traitees += len(lot)
+            self.stdout.write(f"   ⏳ {traitees}/{total} déclaration(s) traitée(s)")
+
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {enregistrees} correspondance(s) enregistrée(s) en {duree:.1f}s"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import digest
+
+
+class Command(BaseCommand):
+    help = ("Calcule et envoie le digest hebdomadaire de tous les agents (statistiques en "
+            "quelques requêtes agrégées, emails par lots) et affiche la durée et le nombre de requêtes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Calculer les statistiques sans envoyer d'email")
+        parser.add_argument('--taille-lot', type=int, default=digest.DIGEST_TAILLE_LOT,
+                            help="Emails envoyés par connexion SMTP")
+
+    def handle(self, *args, **options):
+        self.stdout.write("📬 Digest hebdomadaire des agents - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        requetes = []
+
+        def compter(execute, sql, params, many, context):
+            requetes.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(compter):
+            rapport = digest.envoyer_digest_hebdomadaire(
+                taille_lot=options['taille_lot'], envoyer=not options['dry_run']
+            )
+
+        self.stdout.write(f"📊 {rapport['agents']} agent(s), {rapport['avec_activite']} avec de l'activité")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("⚠️ Simulation : aucun email envoyé (--dry-run)"))
+        elif rapport['echecs']:
+            self.stdout.write(self.style.WARNING(f"⚠️ {rapport['echecs']} email(s) non envoyé(s)"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {rapport['envoyes']} digest(s) envoyé(s) en {rapport['duree']:.2f}s, {len(requetes)} requête(s) SQL"
+        ))
@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from core import taches
+from core.models import Tache
+
+
+class Command(BaseCommand):
+    help = ("Met une tâche en file pour les travailleurs de run_worker (à appeler depuis cron, "
+            "ex: digest_hebdomadaire, agreger_statistiques_journalieres, reconcilier_statistiques)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('nom', nargs='?', help="Nom de la tâche")
+        parser.add_argument('--kwargs', default='{}', help="Arguments nommés en JSON, ex: '{\"jours\": 7}'")
+        parser.add_argument('--priorite', type=int, help="Remplace la priorité par défaut")
+        parser.add_argument('--lister', action='store_true', help="Lister les tâches connues et l'état de la file")
+
+    def handle(self, *args, **options):
+        self.stdout.write("📋 File de tâches - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        if options['lister'] or not options['nom']:
+            for nom, definition in sorted(taches.REGISTRE.items()):
+                self.stdout.write(f"   {nom} (priorité {definition['priorite']}, "
+                                  f"{definition['max_tentatives']} tentative(s))")
+            etats = dict(Tache.objects.values_list('statut').annotate(n=Count('id')))
+            resume = ', '.join(f"{libelle}: {etats.get(statut, 0)}" for statut, libelle in Tache.STATUT_CHOICES)
+            self.stdout.write(f"📊 {resume}")
+            return
+
+        try:
+            kwargs = json.loads(options['kwargs'])
+        except ValueError:
+            raise CommandError("--kwargs doit être un objet JSON")
+        if not isinstance(kwargs, dict):
+            raise CommandError("--kwargs doit être un objet JSON")
+
+        try:
+            taches.planifier(options['nom'], priorite=options['priorite'], **kwargs)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Tâche {options['nom']} mise en file"))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import retention
+
+
+class Command(BaseCommand):
+    help = ("Purge par tranches de clé primaire les données au-delà de leur durée de conservation "
+            "(notifications lues, journal d'actions, messages de chat lus, tâches terminées)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('politiques', nargs='*', metavar='POLITIQUE',
+                            help=f"Politiques à purger (défaut : toutes) : {', '.join(retention.POLITIQUES)}")
+        parser.add_argument('--jours', action='append', default=[], metavar='POLITIQUE=JOURS',
+                            help="Remplacer une durée de conservation, ex: --jours messages=90")
+        parser.add_argument('--taille-lot', type=int, default=retention.RETENTION_TAILLE_LOT,
+                            help="Identifiants par tranche")
+        parser.add_argument('--pause', type=float, default=retention.RETENTION_PAUSE,
+                            help="Pause en secondes entre deux tranches")
+        parser.add_argument('--dry-run', action='store_true', help="Compter les lignes sans les supprimer")
+
+    def handle(self, *args, **options):
+        noms = options['politiques'] or list(retention.POLITIQUES)
+        inconnues = [nom for nom in noms if nom not in retention.POLITIQUES]
+        if inconnues:
+            raise CommandError(f"Politique(s) inconnue(s) : {', '.join(inconnues)}")
+
+        durees = {}
+        for valeur in options['jours']:
+            nom, _, jours = valeur.partition('=')
+            if nom not in retention.POLITIQUES or not jours.isdigit():
+                raise CommandError(f"--jours attend POLITIQUE=JOURS, reçu : {valeur}")
+            durees[nom] = int(jours)
+
+        self.stdout.write("🧹 Purge des données anciennes - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        paliers = {}
+
+        def progression(nom, supprimes, avancement):
+            # Une ligne tous les 10 %
+            palier = int(avancement * 10)
+            if palier > paliers.get(nom, 0):
+                paliers[nom] = palier
+                self.stdout.write(f"   ⏳ {nom} : {supprimes} ligne(s), {avancement:.0%}")
+
+        total = 0
+        for nom in noms:
+            politique = retention.POLITIQUES[nom]
+            jours = durees.get(nom, politique['jours'])
+            resultat = retention.purger(
+                nom, jours=jours, taille_lot=options['taille_lot'], pause=options['pause'],
+                simulation=options['dry_run'], progression=progression,
+            )
+            total += resultat['supprimes']
+            mode = "DELETE direct" if resultat['directe'] else "suppression Django"
+            self.stdout.write(f"📊 {nom} (> {jours} jours, {mode}) : {resultat['supprimes']} ligne(s) "
+                              f"en {resultat['tranches']} tranche(s), {resultat['duree']:.1f}s")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"⚠️ {total} ligne(s) à purger (non supprimées, --dry-run)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {total} ligne(s) supprimée(s)"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des déclarations (SQLite FTS5)"
+
+    def handle(self, *args, **options):
+        self.stdout.write("🔎 Reconstruction de l'index de recherche - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        if not search.create_index():
+            self.stdout.write(self.style.WARNING(
+                "⚠️ Moteur de base de données sans FTS5 : la recherche utilise les filtres classiques"
+            ))
+            return
+
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"✅ {count} déclaration(s) indexée(s)"))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import messagerie, notifications
+
+
+class Command(BaseCommand):
+    help = ("Recalcule depuis les messages et les notifications les compteurs de non lus "
+            "des conversations et des utilisateurs, et corrige les dérives")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Signaler les dérives sans les corriger",
+        )
+
+    def handle(self, *args, **options):
+        corriger = not options['dry_run']
+
+        self.stdout.write("💬 Réconciliation des messages non lus - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        debut = time.monotonic()
+        derives = messagerie.reconcilier_non_lus(corriger=corriger)
+        derives_notifications = notifications.reconcilier(corriger=corriger)
+        duree = time.monotonic() - debut
+
+        for derive in derives:
+            ecarts = ', '.join(f"{nom}: {stocke} → {reel}" for nom, (stocke, reel) in derive['ecarts'].items())
+            self.stdout.write(f"   ⚠️ Conversation #{derive['conversation_id']} : {ecarts}")
+        for derive in derives_notifications:
+            self.stdout.write(
+                f"   ⚠️ Utilisateur #{derive['utilisateur_id']} : notifications_non_lues: {derive['stocke']} → {derive['reel']}"
+            )
+
+        total = len(derives) + len(derives_notifications)
+        if not total:
+            self.stdout.write(self.style.SUCCESS(f"✅ Aucune dérive détectée ({duree:.1f}s)"))
+        elif corriger:
+            self.stdout.write(self.style.SUCCESS(f"✅ {total} compteur(s) corrigé(s) en {duree:.1f}s"))
+        else:
+            self.stdout.write(self.style.WARNING(f"⚠️ {total} compteur(s) en dérive (non corrigés, --dry-run)"))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import statistiques
+
+
+class Command(BaseCommand):
+    help = ("Vérifie les compteurs statistiques par région et par structure locale "
+            "et corrige les dérives (à lancer périodiquement)")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Signaler les dérives sans les corriger",
+        )
+
+    def handle(self, *args, **options):
+        corriger = not options['dry_run']
+
+        self.stdout.write("📊 Réconciliation des statistiques - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        debut = time.monotonic()
+        derives = statistiques.reconcilier(corriger=corriger)
+        duree = time.monotonic() - debut
+
+        for derive in derives:
+            ecarts = ', '.join(f"{nom}: {stocke} → {reel}" for nom, (stocke, reel) in derive['ecarts'].items())
+            self.stdout.write(f"   ⚠️ {derive['modele']._meta.verbose_name} #{derive['zone_id']} : {ecarts}")
+
+        if not derives:
+            self.stdout.write(self.style.SUCCESS(f"✅ Aucune dérive détectée ({duree:.1f}s)"))
+        elif corriger:
+            self.stdout.write(self.style.SUCCESS(f"✅ {len(derives)} zone(s) corrigée(s) en {duree:.1f}s"))
+        else:
+            self.stdout.write(self.style.WARNING(f"⚠️ {len(derives)} zone(s) en dérive (non corrigées, --dry-run)"))
@@ -0,0 +1,106 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import taches
+
+
+# Arrêt demandé (SIGINT/SIGTERM) : chaque travailleur termine sa tâche en cours
+_arret = threading.Event()
+
+
+def _processus(attente, une_fois, compteur):
+    # Processus enfant : arrêt silencieux, le parent annonce l'arrêt
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: _arret.set())
+    executees = taches.travailler(_arret, attente=attente, une_fois=une_fois)
+    with compteur.get_lock():
+        compteur.value += executees
+
+
+class Command(BaseCommand):
+    help = ("Exécute les tâches d'arrière-plan de la file en base (emails, digests, "
+            "statistiques, exports) avec N threads ou processus")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrence', type=int, default=1, help="Nombre de travailleurs (défaut: 1)")
+        parser.add_argument('--mode', choices=['threads', 'processus'], default='threads',
+                            help="Travailleurs en threads (défaut) ou en processus séparés")
+        parser.add_argument('--attente', type=float, default=taches.TACHES_ATTENTE,
+                            help="Pause en secondes quand la file est vide")
+        parser.add_argument('--une-fois', action='store_true',
+                            help="Traiter les tâches disponibles puis s'arrêter")
+
+    def handle(self, *args, **options):
+        concurrence = options['concurrence']
+        if concurrence < 1:
+            raise CommandError("--concurrence doit être au moins 1")
+        attente, une_fois = options['attente'], options['une_fois']
+        if options['mode'] == 'processus' and 'fork' not in multiprocessing.get_all_start_methods():
+            # Windows : pas de fork, les enfants ne pourraient pas hériter de Django configuré
+            raise CommandError("--mode processus exige fork (indisponible sur ce système) : utilisez --mode threads")
+
+        self.stdout.write("⚙️ Travailleurs de la file de tâches - Lost & Found")
+        self.stdout.write("=" * 50)
+        self.stdout.write(f"   {concurrence} travailleur(s) en {options['mode']}, "
+                          f"tâches : {', '.join(sorted(taches.REGISTRE))}")
+
+        _arret.clear()
+
+        def arreter(signum, frame):
+            if not _arret.is_set():
+                self.stdout.write("⏳ Arrêt demandé, fin des tâches en cours...")
+            _arret.set()
+
+        signal.signal(signal.SIGINT, arreter)
+        signal.signal(signal.SIGTERM, arreter)
+
+        debut = time.monotonic()
+        if options['mode'] == 'threads':
+            executees = self.threads(concurrence, attente, une_fois)
+        else:
+            executees = self.processus(concurrence, attente, une_fois)
+        duree = time.monotonic() - debut
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {executees} tâche(s) exécutée(s) en {duree:.1f}s"))
+
+    def threads(self, concurrence, attente, une_fois):
+        resultats = [0] * concurrence
+
+        def boucle(numero):
+            resultats[numero] = taches.travailler(_arret, attente=attente, une_fois=une_fois)
+
+        travailleurs = [threading.Thread(target=boucle, args=(i,), name=f"travailleur-{i + 1}")
+                        for i in range(concurrence)]
+        for travailleur in travailleurs:
+            travailleur.start()
+        # join() avec délai : le thread principal reste disponible pour les signaux
+        while any(t.is_alive() for t in travailleurs):
+            for travailleur in travailleurs:
+                travailleur.join(timeout=0.5)
+        return sum(resultats)
+
+    def processus(self, concurrence, attente, une_fois):
+        contexte = multiprocessing.get_context('fork')
+        compteur = contexte.Value('i', 0)
+        # Les connexions ouvertes ne doivent pas être partagées avec les enfants
+        connections.close_all()
+        enfants = [contexte.Process(target=_processus, args=(attente, une_fois, compteur),
+                                    name=f"travailleur-{i + 1}")
+                   for i in range(concurrence)]
+        for enfant in enfants:
+            enfant.start()
+        transmis = False
+        while any(e.is_alive() for e in enfants):
+            if _arret.is_set() and not transmis:
+                for enfant in enfants:
+                    if enfant.is_alive():
+                        enfant.terminate()
+                transmis = True
+            for enfant in enfants:
+                enfant.join(timeout=0.5)
+        return compteur.value
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import compteur_vues
+
+
+class Command(BaseCommand):
+    help = ("Écrit en base les vues des déclarations tamponnées par les processus web "
+            "(à appeler depuis cron, ex: chaque minute)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("👁️ Compteurs de vues - Lost & Found")
+        self.stdout.write("=" * 50)
+
+        debut = time.monotonic()
+        vues = compteur_vues.vider()
+        duree = time.monotonic() - debut
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {vues} vue(s) écrite(s) en {duree:.1f}s"))
@@ -0,0 +1,396 @@
+"""
+Rapprochement automatique des objets perdus et des objets trouvés.
+
+Chaque déclaration de perte est comparée aux déclarations d'objets trouvés
+(et inversement) sur cinq critères :
+
+- la catégorie ;
+- l'écart entre les dates d'incident (la perte précède la découverte) ;
+- la distance GPS ;
+- la hiérarchie administrative (structure locale, préfecture, région) ;
+- la similarité des textes (``nom_objet`` et ``description``).
+
+Les candidats sont chargés par lots avec ``values_list`` puis notés en bloc
+avec NumPy (matrice lots sources × lots candidats) plutôt que ligne par ligne
+dans l'ORM. Seul le score global de chaque paire est gardé pendant la
+recherche ; le détail par critère n'est recalculé que pour les
+``MATCHING_TOP_K`` meilleurs rapprochements de chaque déclaration, enregistrés
+dans ``CorrespondanceDeclaration``. Le calcul d'une nouvelle déclaration passe
+par la file de tâches.
+"""
+
+import logging
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Declaration, CorrespondanceDeclaration
+from .taches import planifier
+from .text import normalize_search_key
+
+logger = logging.getLogger(__name__)
+
+CRITERES = ['categorie', 'date', 'distance', 'localite', 'texte']
+
+POIDS = getattr(settings, 'MATCHING_WEIGHTS', {
+    'categorie': 0.25,
+    'date': 0.15,
+    'distance': 0.20,
+    'localite': 0.15,
+    'texte': 0.25,
+})
+
+# Nombre de correspondances conservées par déclaration
+MATCHING_TOP_K = getattr(settings, 'MATCHING_TOP_K', 10)
+# Score minimal pour enregistrer une correspondance
+MATCHING_MIN_SCORE = getattr(settings, 'MATCHING_MIN_SCORE', 0.35)
+# La perte doit avoir eu lieu au plus N jours avant la découverte
+MATCHING_WINDOW_DAYS = getattr(settings, 'MATCHING_WINDOW_DAYS', 60)
+# Tolérance (jours) quand la découverte est datée avant la perte (erreur de saisie)
+MATCHING_TOLERANCE_DAYS = getattr(settings, 'MATCHING_TOLERANCE_DAYS', 2)
+# Distance (km) à laquelle le score GPS tombe à 1/e
+MATCHING_DISTANCE_KM = getattr(settings, 'MATCHING_DISTANCE_KM', 5)
+# Nombre de déclarations chargées par lot
+MATCHING_BATCH_SIZE = getattr(settings, 'MATCHING_BATCH_SIZE', 2000)
+# Activer le calcul automatique à la création d'une déclaration
+MATCHING_AUTO = getattr(settings, 'MATCHING_AUTO', True)
+
+# Déclarations encore susceptibles d'être rapprochées
+STATUTS_ACTIFS = ['cree', 'en_validation', 'valide', 'publie']
+
+TYPE_OPPOSE = {'perdu': 'trouve', 'trouve': 'perdu'}
+
+_COLONNES = (
+    'id', 'date_incident', 'categorie_id', 'latitude', 'longitude',
+    'region_id', 'prefecture_id', 'structure_locale_id',
+    'nom_objet_normalise', 'description',
+)
+
+# Champs de Declaration dont la modification change ses correspondances (voir _COLONNES)
+CHAMPS_RAPPROCHES = {
+    'date_incident', 'categorie', 'categorie_id', 'latitude', 'longitude',
+    'region', 'region_id', 'prefecture', 'prefecture_id', 'structure_locale', 'structure_locale_id',
+    'nom_objet', 'nom_objet_normalise', 'description', 'statut', 'type_declaration',
+}
+
+# Dimension du hachage des mots (sac de mots binaire)
+_HASH_DIM = 1024
+_MOTS_VIDES = {
+    'de', 'du', 'des', 'la', 'le', 'les', 'un', 'une', 'et', 'en', 'au', 'aux',
+    'avec', 'sans', 'pour', 'sur', 'dans', 'par', 'mon', 'ma', 'mes', 'son', 'sa', 'ses',
+}
+_RAYON_TERRE_KM = 6371.0
+
+
+def _sacs_de_mots(textes):
+    """Matrice binaire (n × _HASH_DIM) des mots hachés de chaque texte"""
+    matrice = np.zeros((len(textes), _HASH_DIM), dtype=np.float32)
+    for i, texte in enumerate(textes):
+        for mot in texte.split():
+            if len(mot) > 1 and mot not in _MOTS_VIDES:
+                matrice[i, zlib.crc32(mot.encode()) % _HASH_DIM] = 1.0
+    return matrice
+
+
+def _jaccard(a, b):
+    """Similarité de Jaccard entre chaque ligne de ``a`` et chaque ligne de ``b``"""
+    intersection = a @ b.T
+    union = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def _identifiants(valeurs):
+    return np.array([v if v is not None else -1 for v in valeurs], dtype=np.int64)
+
+
+def _coordonnees(valeurs):
+    return np.radians(np.array([float(v) if v is not None else np.nan for v in valeurs], dtype=np.float64))
+
+
+class Lot:
+    """Colonnes d'un lot de déclarations, sous forme de tableaux NumPy"""
+
+    def __init__(self, lignes):
+        colonnes = list(zip(*lignes)) if lignes else [()] * len(_COLONNES)
+        self.ids = np.array(colonnes[0], dtype=np.int64)
+        self.jours = np.array([d.toordinal() for d in colonnes[1]], dtype=np.int64)
+        self.categorie = _identifiants(colonnes[2])
+        self.latitude = _coordonnees(colonnes[3])
+        self.longitude = _coordonnees(colonnes[4])
+        self.region = _identifiants(colonnes[5])
+        self.prefecture = _identifiants(colonnes[6])
+        self.structure = _identifiants(colonnes[7])
+        self.nom = _sacs_de_mots(colonnes[8])
+        self.description = _sacs_de_mots([normalize_search_key(d) for d in colonnes[9]])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def selection(self, indices):
+        """Sous-lot des lignes ``indices`` (dans cet ordre, répétitions permises)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        lot = Lot.__new__(Lot)
+        for nom, colonne in vars(self).items():
+            setattr(lot, nom, colonne[indices])
+        return lot
+
+    @classmethod
+    def depuis_queryset(cls, queryset, taille=None):
+        """Itérer sur un queryset de déclarations par lots de ``taille``"""
+        taille = taille or MATCHING_BATCH_SIZE
+        lignes = []
+        for ligne in queryset.order_by('pk').values_list(*_COLONNES).iterator(chunk_size=taille):
+            lignes.append(ligne)
+            if len(lignes) >= taille:
+                yield cls(lignes)
+                lignes = []
+        if lignes:
+            yield cls(lignes)
+
+
+def _jaccard_paires(a, b):
+    """Similarité de Jaccard entre ``a[i]`` et ``b[i]``"""
+    intersection = (a * b).sum(axis=1)
+    union = a.sum(axis=1) + b.sum(axis=1) - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def _egal(a, b):
+    """1 si égaux, 0 si différents, NaN si inconnu (tableaux déjà alignés pour la diffusion)"""
+    resultat = (a == b).astype(np.float64)
+    resultat[(a < 0) | (b < 0)] = np.nan
+    return resultat
+
+
+def _criteres(perdus, trouves, paires=False):
+    """
+    Itérer sur (critère, scores) de chaque paire.
+
+    Scores en matrice p × t, ou, si ``paires``, en vecteur pour ``perdus[i]``
+    avec ``trouves[i]``. Un critère à la fois : l'appelant peut cumuler les
+    scores sans garder les cinq matrices.
+    """
+    if paires:
+        def p(colonne):
+            return colonne
+
+        def t(colonne):
+            return colonne
+        jaccard = _jaccard_paires
+    else:
+        def p(colonne):
+            return colonne[:, None]
+
+        def t(colonne):
+            return colonne[None, :]
+        jaccard = _jaccard
+
+    # Catégorie : identique 1, différente 0, inconnue 0.5
+    yield 'categorie', np.nan_to_num(_egal(p(perdus.categorie), t(trouves.categorie)), nan=0.5)
+
+    # Date : décroissance linéaire sur la fenêtre, 0 hors fenêtre
+    ecart = t(trouves.jours) - p(perdus.jours)
+    date_score = np.clip(1.0 - np.maximum(ecart, 0) / MATCHING_WINDOW_DAYS, 0.0, 1.0)
+    date_score[ecart < -MATCHING_TOLERANCE_DAYS] = 0.0
+    del ecart
+    yield 'date', date_score
+
+    # Distance : haversine, 0.5 si une des positions est inconnue
+    dlat = t(trouves.latitude) - p(perdus.latitude)
+    dlon = t(trouves.longitude) - p(perdus.longitude)
+    a = (np.sin(dlat / 2) ** 2 +
+         np.cos(p(perdus.latitude)) * np.cos(t(trouves.latitude)) * np.sin(dlon / 2) ** 2)
+    del dlat, dlon
+    distance_km = 2 * _RAYON_TERRE_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    del a
+    yield 'distance', np.nan_to_num(np.exp(-distance_km / MATCHING_DISTANCE_KM), nan=0.5)
+    del distance_km
+
+    # Localité : même structure 1, même préfecture 0.75, même région 0.5
+    localite = np.zeros(date_score.shape)
+    for poids, a_ids, b_ids in (
+        (0.5, perdus.region, trouves.region),
+        (0.75, perdus.prefecture, trouves.prefecture),
+        (1.0, perdus.structure, trouves.structure),
+    ):
+        localite[_egal(p(a_ids), t(b_ids)) == 1.0] = poids
+    inconnue = (p(perdus.region) < 0) | (t(trouves.region) < 0)
+    localite[inconnue & (localite == 0)] = 0.25
+    yield 'localite', localite
+    del localite, inconnue
+
+    # Texte : le nom de l'objet compte plus que la description
+    yield 'texte', 0.7 * jaccard(perdus.nom, trouves.nom) + 0.3 * jaccard(perdus.description, trouves.description)
+
+
+def scorer(perdus, trouves):
+    """
+    Noter toutes les paires d'un lot de pertes et d'un lot de découvertes.
+
+    Returns:
+        ndarray: scores globaux (p × t)
+    """
+    total = sum(POIDS[c] for c in CRITERES)
+    scores = np.zeros((len(perdus), len(trouves)))
+    for critere, valeurs in _criteres(perdus, trouves):
+        scores += valeurs * (POIDS[critere] / total)
+        if critere == 'date':
+            # Une découverte hors de la fenêtre de dates n'est jamais retenue
+            hors_fenetre = valeurs == 0
+    scores[hors_fenetre] = 0.0
+    return scores
+
+
+class _Meilleurs:
+    """Top-k des candidats de chaque source (scores globaux seulement), fusionné lot après lot"""
+
+    def __init__(self, type_source, sources, k):
+        self.type_source = type_source
+        self.sources = sources
+        self.k = k
+        self.ids = np.full((len(sources), 0), -1, dtype=np.int64)
+        self.scores = np.zeros((len(sources), 0))
+
+    def ajouter(self, candidats, scores):
+        ids = np.concatenate([self.ids, np.broadcast_to(candidats.ids, scores.shape)], axis=1)
+        scores = np.concatenate([self.scores, scores], axis=1)
+        if scores.shape[1] > self.k:
+            garder = np.argpartition(-scores, self.k - 1, axis=1)[:, :self.k]
+            ids = np.take_along_axis(ids, garder, axis=1)
+            scores = np.take_along_axis(scores, garder, axis=1)
+        self.ids, self.scores = ids, scores
+
+    def resultats(self, score_min):
+        """
+        Itérer sur (id source, id candidat, score, détails) au-dessus du seuil.
+
+        Les candidats retenus sont relus en une requête et leurs critères
+        recalculés paire par paire pour les détails.
+        """
+        lignes, colonnes = np.nonzero(self.scores >= score_min)
+        candidat_ids = self.ids[lignes, colonnes]
+        retenus = Lot(list(
+            Declaration.objects.filter(pk__in=np.unique(candidat_ids).tolist()).values_list(*_COLONNES)
+        ))
+        position = {pk: i for i, pk in enumerate(retenus.ids.tolist())}
+        # Candidats supprimés entre-temps : ignorés
+        existe = np.array([pk in position for pk in candidat_ids.tolist()], dtype=bool)
+        lignes, colonnes, candidat_ids = lignes[existe], colonnes[existe], candidat_ids[existe]
+        if not len(lignes):
+            return
+
+        sources = self.sources.selection(lignes)
+        candidats = retenus.selection([position[pk] for pk in candidat_ids.tolist()])
+        perdus, trouves = (candidats, sources) if self.type_source == 'trouve' else (sources, candidats)
+        criteres = dict(_criteres(perdus, trouves, paires=True))
+
+        scores = self.scores[lignes, colonnes]
+        for n in np.lexsort((-scores, lignes)):
+            details = {c: round(float(criteres[c][n]), 3) for c in CRITERES}
+            yield int(self.sources.ids[lignes[n]]), int(candidat_ids[n]), float(scores[n]), details
+
+
+def _candidats(type_source, sources):
+    """Déclarations du type opposé dont la date est compatible avec le lot source"""
+    premier = date.fromordinal(int(sources.jours.min()))
+    dernier = date.fromordinal(int(sources.jours.max()))
+    if type_source == 'trouve':
+        debut = premier - timedelta(days=MATCHING_WINDOW_DAYS)
+        fin = dernier + timedelta(days=MATCHING_TOLERANCE_DAYS)
+    else:
+        debut = premier - timedelta(days=MATCHING_TOLERANCE_DAYS)
+        fin = dernier + timedelta(days=MATCHING_WINDOW_DAYS)
+    return Declaration.objects.filter(
+        type_declaration=TYPE_OPPOSE[type_source],
+        statut__in=STATUTS_ACTIFS,
+        date_incident__range=(debut, fin),
+    ).exclude(pk__in=sources.ids.tolist())
+
+
+def calculer_lot(type_source, sources, top_k=None, taille=None):
+    """
+    Calculer les meilleures correspondances d'un lot de déclarations du même type.
+
+    Returns:
+        _Meilleurs: top-k de chaque déclaration du lot
+    """
+    meilleurs = _Meilleurs(type_source, sources, top_k or MATCHING_TOP_K)
+    for candidats in Lot.depuis_queryset(_candidats(type_source, sources), taille):
+        if type_source == 'trouve':
+            scores = scorer(candidats, sources).T
+        else:
+            scores = scorer(sources, candidats)
+        meilleurs.ajouter(candidats, scores)
+    return meilleurs
+
+
+def enregistrer(type_source, meilleurs, score_min=None):
+    """
+    Remplacer les correspondances enregistrées pour les déclarations sources.
+
+    Returns:
+        int: nombre de correspondances enregistrées
+    """
+    score_min = MATCHING_MIN_SCORE if score_min is None else score_min
+    champ_source, champ_candidat = (
+        ('declaration_trouvee_id', 'declaration_perdue_id') if type_source == 'trouve'
+        else ('declaration_perdue_id', 'declaration_trouvee_id')
+    )
+    objets = [
+        CorrespondanceDeclaration(**{champ_source: source_id, champ_candidat: candidat_id},
+                                  score=score, details=details)
+        for source_id, candidat_id, score, details in meilleurs.resultats(score_min)
+    ]
+    with transaction.atomic():
+        CorrespondanceDeclaration.objects.filter(
+            **{f'{champ_source}__in': meilleurs.sources.ids.tolist()}
+        ).delete()
+        CorrespondanceDeclaration.objects.bulk_create(
+            objets,
+            update_conflicts=True,
+            unique_fields=['declaration_perdue', 'declaration_trouvee'],
+            update_fields=['score', 'details', 'date_calcul'],
+        )
+    return len(objets)
+
+
+def mettre_a_jour_correspondances(declaration):
+    """
+    Recalculer les correspondances d'une déclaration.
+
+    Returns:
+        int: nombre de correspondances enregistrées
+    """
+    if declaration.statut not in STATUTS_ACTIFS:
+        return 0
+    sources = Lot([tuple(getattr(declaration, c) for c in _COLONNES)])
+    return enregistrer(declaration.type_declaration, calculer_lot(declaration.type_declaration, sources))
+
+
+def planifier_correspondances(declaration_id):
+    """Confier le calcul des correspondances à la file de tâches (après validation)"""
+    planifier('correspondances_declaration', declaration_id)
+
+
+def correspondances_pour(declaration, limite=None):
+    """
+    Correspondances encore actives d'une déclaration, de la meilleure à la moins bonne.
+
+    Chaque correspondance reçoit un attribut ``autre`` : la déclaration rapprochée.
+    """
+    if declaration.type_declaration == 'perdu':
+        champ = 'declaration_trouvee'
+        qs = declaration.correspondances_trouvees
+    else:
+        champ = 'declaration_perdue'
+        qs = declaration.correspondances_perdues
+    qs = qs.filter(**{f'{champ}__statut__in': STATUTS_ACTIFS}).select_related(
+        f'{champ}__categorie', f'{champ}__prefecture', f'{champ}__region'
+    ).order_by('-score')[:limite or MATCHING_TOP_K]
+    correspondances = list(qs)
+    for c in correspondances:
+        c.autre = getattr(c, champ)
+    return correspondances
@@ -0,0 +1,186 @@
+"""
+Messagerie agent ↔ déclarant : compteurs de messages non lus et accusés de lecture.
+
+Chaque conversation stocke le nombre de messages non lus de chacun de ses
+participants (``non_lus_agent``, ``non_lus_declarant``). Ils sont incrémentés
+dans la transaction qui crée le message (``Message.save``) et décrémentés par
+les lectures (``Conversation.marquer_comme_lus``, ``Message.mark_as_read``) :
+les listes de conversations et les compteurs de notification lisent une
+colonne au lieu de compter les messages de chaque conversation.
+
+Les écritures qui contournent le modèle (``QuerySet.update``, ``bulk_create``)
+peuvent les faire dériver : ``reconcilier_non_lus`` les recalcule.
+
+Une lecture avance aussi le filigrane du lecteur (id du dernier message lu).
+L'évènement ``messages_read`` diffusé aux participants le transporte : les
+clients marquent lus leurs messages jusqu'à cet id sans recharger la
+conversation. WebSocket et endpoints REST passent par ``evenement_lecture``.
+
+Les endpoints de polling sont incrémentaux (``synchronisation``) : le client
+renvoie ``since_id`` ou l'ETag de la conversation (dernier message et
+filigranes) et reçoit les seuls nouveaux messages, ou un 304 sans écriture.
+
+Les évènements de groupe ``chat_<id>`` (``evenement_groupe``) portent la trame
+WebSocket déjà sérialisée : chaque connexion destinataire la transmet telle
+quelle au lieu de la réencoder, et n'inspecte que l'en-tête ``user_id`` pour
+ignorer ses propres évènements.
+
+L'historique est servi par fenêtres (``fenetre_historique``) : les messages
+les plus récents d'abord, puis les plus anciens page par page avec un curseur
+sur (created_at, id) au lieu d'un OFFSET.
+"""
+
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+
+from .models import Conversation
+from .pagination import PaginateurCurseur
+
+logger = logging.getLogger(__name__)
+
+# Nombre de messages par fenêtre d'historique
+HISTORIQUE_PAR_PAGE = getattr(settings, 'HISTORIQUE_PAR_PAGE', 30)
+
+# Valeurs réelles des compteurs, calculées depuis les messages
+NON_LUS_REELS = {
+    'reel_agent': Count('messages', filter=Q(messages__is_read=False, messages__receiver=F('agent'))),
+    'reel_declarant': Count('messages', filter=Q(messages__is_read=False, messages__receiver=F('declarant'))),
+}
+
+
+def reconcilier_non_lus(corriger=True):
+    """
+    Comparer les compteurs de non lus aux messages et corriger les écarts.
+
+    Args:
+        corriger: False pour seulement détecter les dérives
+
+    Returns:
+        list: dérives [{'conversation_id', 'ecarts': {compteur: (stocké, réel)}}]
+    """
+    derives = []
+    a_modifier = []
+    lignes = Conversation.objects.annotate(**NON_LUS_REELS).order_by('pk')
+    for conversation in lignes.iterator(chunk_size=1000):
+        reels = {'non_lus_agent': conversation.reel_agent, 'non_lus_declarant': conversation.reel_declarant}
+        ecarts = {nom: (getattr(conversation, nom), reel) for nom, reel in reels.items()
+                  if getattr(conversation, nom) != reel}
+        if not ecarts:
+            continue
+        derives.append({'conversation_id': conversation.pk, 'ecarts': ecarts})
+        if corriger:
+            for nom, reel in reels.items():
+                setattr(conversation, nom, reel)
+            a_modifier.append(conversation)
+
+    Conversation.objects.bulk_update(a_modifier, Conversation.COMPTEURS_NON_LUS, batch_size=500)
+
+    if derives:
+        logger.warning(f"Messagerie : {len(derives)} conversation(s) en dérive{' corrigée(s)' if corriger else ''}")
+    return derives
+
+
+def evenement_groupe(type_evenement, conversation_id, type_trame, donnees, user_id=None):
+    """
+    Évènement de groupe d'une conversation portant sa trame WebSocket
+    sérialisée une seule fois.
+
+    Args:
+        type_evenement: Handler du consumer (ex: 'chat_message')
+        type_trame: Type de la trame reçue par le client (ex: 'message')
+        donnees: Contenu ``data`` de la trame
+        user_id: Auteur de l'évènement (les handlers qui filtrent leurs propres évènements le comparent)
+    """
+    return {
+        'type': type_evenement,
+        'conversation_id': conversation_id,
+        'user_id': user_id,
+        'frame': json.dumps({'type': type_trame, 'conversation_id': conversation_id, 'data': donnees}),
+    }
+
+
+def evenement_lecture(conversation, lecteur, nombre):
+    """Évènement de groupe ``messages_read`` portant le filigrane du lecteur"""
+    donnees = {
+        'user_id': lecteur.id,
+        'username': lecteur.get_full_name(),
+        'last_read_message_id': conversation.lu_jusqua(lecteur),
+        'count': nombre,
+    }
+    return {**evenement_groupe('messages_read', conversation.id, 'messages_read', donnees, lecteur.id), **donnees}
+
+
+def marquer_lus(conversation, lecteur, jusqua=None):
+    """
+    Marquer lus les messages reçus par ``lecteur`` et prévenir les participants
+    connectés (chemin commun des endpoints REST).
+
+    Returns:
+        int: Nombre de messages marqués
+    """
+    nombre = conversation.marquer_comme_lus(lecteur, jusqua)
+    if nombre:
+        try:
+            channel_layer = get_channel_layer()
+            if channel_layer is not None:
+                async_to_sync(channel_layer.group_send)(
+                    f'chat_{conversation.id}', evenement_lecture(conversation, lecteur, nombre)
+                )
+        except Exception as e:
+            logger.warning(f"Accusé de lecture non diffusé (conversation {conversation.id}): {e}")
+    return nombre
+
+
+def version_conversation(conversation):
+    """ETag de l'état d'une conversation : dernier message et filigranes de lecture"""
+    return (f'"{conversation.pk}-{conversation.last_message_id or 0}'
+            f'-{conversation.lu_jusqua_agent}-{conversation.lu_jusqua_declarant}"')
+
+
+def synchronisation(request, conversation):
+    """
+    Négocier une synchronisation incrémentale des messages d'une conversation.
+
+    Avec ``If-None-Match``, le 304 dépend de l'ETag (les accusés de lecture
+    comptent) ; avec ``since_id`` seul, il dépend des nouveaux messages.
+
+    Returns:
+        tuple: (réponse 304 ou None, since_id ou None)
+    """
+    etag = version_conversation(conversation)
+    reponse = get_conditional_response(request, etag=etag)
+    since_id = request.GET.get('since_id', '')
+    since_id = int(since_id) if since_id.isdigit() else None
+    if reponse is None and since_id is not None and 'If-None-Match' not in request.headers:
+        if since_id >= (conversation.last_message_id or 0):
+            reponse = HttpResponseNotModified()
+    if reponse is not None:
+        reponse['ETag'] = etag
+    return reponse, since_id
+
+
+def fenetre_historique(conversation, avant=None, par_page=None):
+    """
+    Fenêtre de l'historique d'une conversation, en ordre chronologique.
+
+    Args:
+        avant: Curseur renvoyé par la fenêtre précédente (None : les plus récents)
+        par_page: Nombre de messages (défaut HISTORIQUE_PAR_PAGE)
+
+    Returns:
+        tuple: (messages, curseur des messages plus anciens ou None)
+    """
+    paginateur = PaginateurCurseur(
+        conversation.messages.select_related('sender', 'receiver'),
+        par_page or HISTORIQUE_PAR_PAGE,
+        ordre=['-created_at', '-id'],
+    )
+    page = paginateur.page(avant)
+    return page.object_list[::-1], page.next_cursor
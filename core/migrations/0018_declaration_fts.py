@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    from core import search
+    if search.create_index(schema_editor.connection):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.FTS_TABLE} (rowid, {', '.join(search.FTS_COLUMNS)}) {search._SOURCE_SQL}"
+            )
+
+
+def drop_fts(apps, schema_editor):
+    from core import search
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_declaration_latitude_declaration_longitude'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
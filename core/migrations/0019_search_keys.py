@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+from core.text import normalize_search_key
+
+CHAMPS_NORMALISES = {
+    'Region': {'nom': 'nom_normalise'},
+    'Prefecture': {'nom': 'nom_normalise'},
+    'StructureLocale': {'nom': 'nom_normalise'},
+    'Declaration': {'nom_objet': 'nom_objet_normalise', 'lieu_precis': 'lieu_normalise'},
+    'Objet': {'nom': 'nom_normalise', 'lieu_trouve': 'lieu_normalise'},
+}
+
+
+def remplir_cles(apps, schema_editor):
+    for model_name, champs in CHAMPS_NORMALISES.items():
+        Model = apps.get_model('core', model_name)
+        objets = []
+        for obj in Model.objects.only('pk', *champs.keys()).iterator(chunk_size=1000):
+            for source, cible in champs.items():
+                setattr(obj, cible, normalize_search_key(getattr(obj, source)))
+            objets.append(obj)
+            if len(objets) >= 1000:
+                Model.objects.bulk_update(objets, list(champs.values()))
+                objets = []
+        if objets:
+            Model.objects.bulk_update(objets, list(champs.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_declaration_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='declaration',
+            name='lieu_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='declaration',
+            name='nom_objet_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='objet',
+            name='lieu_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='objet',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='prefecture',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='region',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='structurelocale',
+            name='nom_normalise',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150),
+        ),
+        migrations.RunPython(remplir_cles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorrespondanceDeclaration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Score global entre 0 et 1')),
+                ('details', models.JSONField(blank=True, default=dict, help_text='Score de chaque critère')),
+                ('date_calcul', models.DateTimeField(auto_now=True)),
+                ('declaration_perdue', models.ForeignKey(limit_choices_to={'type_declaration': 'perdu'}, on_delete=django.db.models.deletion.CASCADE, related_name='correspondances_trouvees', to='core.declaration')),
+                ('declaration_trouvee', models.ForeignKey(limit_choices_to={'type_declaration': 'trouve'}, on_delete=django.db.models.deletion.CASCADE, related_name='correspondances_perdues', to='core.declaration')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['declaration_perdue', '-score'], name='core_corres_declara_e63ffc_idx'), models.Index(fields=['declaration_trouvee', '-score'], name='core_corres_declara_e96fdc_idx')],
+                'unique_together': {('declaration_perdue', 'declaration_trouvee')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+from core.geo import encode_geohash
+
+
+def remplir_geohash(apps, schema_editor):
+    Declaration = apps.get_model('core', 'Declaration')
+    declarations = []
+    qs = Declaration.objects.filter(latitude__isnull=False, longitude__isnull=False).only('pk', 'latitude', 'longitude')
+    for declaration in qs.iterator(chunk_size=1000):
+        declaration.geohash = encode_geohash(declaration.latitude, declaration.longitude)
+        declarations.append(declaration)
+        if len(declarations) >= 1000:
+            Declaration.objects.bulk_update(declarations, ['geohash'])
+            declarations = []
+    if declarations:
+        Declaration.objects.bulk_update(declarations, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_correspondancedeclaration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='declaration',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Cellule geohash calculée à partir des coordonnées GPS', max_length=12),
+        ),
+        migrations.RunPython(remplir_geohash, migrations.RunPython.noop),
+    ]
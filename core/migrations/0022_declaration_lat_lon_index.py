@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_declaration_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['latitude', 'longitude'], name='core_decl_lat_lon_idx'),
+        ),
+    ]
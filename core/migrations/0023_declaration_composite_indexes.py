@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_declaration_lat_lon_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['statut', '-date_declaration'], name='core_decl_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['type_declaration', 'statut', '-date_declaration'], name='core_decl_type_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['structure_locale', 'statut', '-date_declaration'], name='core_decl_struct_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['region', '-date_declaration'], name='core_decl_region_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['declarant', '-date_declaration'], name='core_decl_declarant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['-date_declaration'], name='core_decl_date_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.7
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+from core.statistiques import COMPTEURS_DECLARATION, COMPTEURS_RECLAMATION
+
+
+def _agregats(definitions):
+    return {
+        nom: Count('id', filter=Q(**{f'{condition[0]}__in': sorted(condition[1])}) if condition else None)
+        for nom, condition in definitions.items()
+    }
+
+
+def remplir_statistiques(apps, schema_editor):
+    Declaration = apps.get_model('core', 'Declaration')
+    Reclamation = apps.get_model('core', 'Reclamation')
+    for nom_modele, cle in [('StatistiqueRegion', 'region'), ('StatistiqueStructure', 'structure_locale')]:
+        modele = apps.get_model('core', nom_modele)
+        valeurs = {}
+        declarations = Declaration.objects.filter(**{f'{cle}__isnull': False}).values(cle)
+        for ligne in declarations.annotate(**_agregats(COMPTEURS_DECLARATION)).order_by():
+            valeurs.setdefault(ligne.pop(cle), {}).update(ligne)
+        reclamations = Reclamation.objects.filter(**{f'declaration__{cle}__isnull': False}).values(f'declaration__{cle}')
+        for ligne in reclamations.annotate(**_agregats(COMPTEURS_RECLAMATION)).order_by():
+            valeurs.setdefault(ligne.pop(f'declaration__{cle}'), {}).update(ligne)
+        for zone_id, compteurs in valeurs.items():
+            publiees = compteurs.get('declarations_publiees', 0)
+            compteurs['taux_restitution'] = compteurs.get('objets_restitues', 0) / publiees * 100 if publiees else 0.0
+            modele.objects.update_or_create(**{f'{cle}_id': zone_id}, defaults=compteurs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_declaration_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistiqueregion',
+            name='declarations_perdues',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statistiqueregion',
+            name='declarations_trouvees',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statistiqueregion',
+            name='declarations_validees',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statistiqueregion',
+            name='reclamations_soumises',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StatistiqueStructure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_declarations', models.PositiveIntegerField(default=0)),
+                ('declarations_perdues', models.PositiveIntegerField(default=0)),
+                ('declarations_trouvees', models.PositiveIntegerField(default=0)),
+                ('declarations_en_attente', models.PositiveIntegerField(default=0)),
+                ('declarations_validees', models.PositiveIntegerField(default=0)),
+                ('declarations_publiees', models.PositiveIntegerField(default=0)),
+                ('objets_restitues', models.PositiveIntegerField(default=0)),
+                ('total_reclamations', models.PositiveIntegerField(default=0)),
+                ('reclamations_soumises', models.PositiveIntegerField(default=0)),
+                ('reclamations_en_cours', models.PositiveIntegerField(default=0)),
+                ('reclamations_approuvees', models.PositiveIntegerField(default=0)),
+                ('reclamations_rejetees', models.PositiveIntegerField(default=0)),
+                ('temps_moyen_traitement_heures', models.FloatField(default=0.0)),
+                ('taux_restitution', models.FloatField(default=0.0)),
+                ('derniere_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('structure_locale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to='core.structurelocale')),
+            ],
+            options={
+                'verbose_name': 'Statistique structure locale',
+                'verbose_name_plural': 'Statistiques structures locales',
+            },
+        ),
+        migrations.RunPython(remplir_statistiques, migrations.RunPython.noop),
+    ]
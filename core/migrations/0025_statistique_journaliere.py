@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from core.statistiques import DIMENSIONS_JOURNALIERES, cle_journaliere
+
+
+def remplir_agregats(apps, schema_editor):
+    Declaration = apps.get_model('core', 'Declaration')
+    StatistiqueJournaliere = apps.get_model('core', 'StatistiqueJournaliere')
+    groupes = Declaration.objects.annotate(jour=TruncDate('date_declaration')).values(
+        'jour', *DIMENSIONS_JOURNALIERES
+    ).annotate(nombre=Count('id')).order_by()
+    lignes = []
+    for groupe in groupes.iterator():
+        lignes.append(StatistiqueJournaliere(
+            cle=cle_journaliere(groupe['jour'], groupe), jour=groupe['jour'], nombre=groupe['nombre'],
+            region_id=groupe['region'], prefecture_id=groupe['prefecture'],
+            structure_locale_id=groupe['structure_locale'], categorie_id=groupe['categorie'],
+            type_declaration=groupe['type_declaration'], statut=groupe['statut'],
+        ))
+        if len(lignes) >= 1000:
+            StatistiqueJournaliere.objects.bulk_create(lignes)
+            lignes = []
+    StatistiqueJournaliere.objects.bulk_create(lignes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_statistiques_structure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(editable=False, max_length=150, unique=True)),
+                ('jour', models.DateField()),
+                ('type_declaration', models.CharField(choices=[('perdu', 'Objet perdu'), ('trouve', 'Objet trouvé')], max_length=10)),
+                ('statut', models.CharField(choices=[('cree', 'Créé'), ('en_validation', 'En validation'), ('valide', 'Validé'), ('publie', 'Publié'), ('reclame', 'Réclamé'), ('en_verification', 'En vérification'), ('restitue', 'Restitué'), ('rejete', 'Rejeté'), ('archive', 'Archivé')], max_length=20)),
+                ('nombre', models.PositiveIntegerField(default=0)),
+                ('categorie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.categorieobjet')),
+                ('prefecture', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.prefecture')),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.region')),
+                ('structure_locale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.structurelocale')),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+                'indexes': [models.Index(fields=['jour'], name='core_statj_jour_idx'), models.Index(fields=['region', 'jour'], name='core_statj_region_jour_idx')],
+            },
+        ),
+        migrations.RunPython(remplir_agregats, migrations.RunPython.noop),
+    ]
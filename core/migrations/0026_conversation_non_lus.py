@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+from core.messagerie import NON_LUS_REELS
+
+
+def remplir_non_lus(apps, schema_editor):
+    Conversation = apps.get_model('core', 'Conversation')
+    a_modifier = []
+    for conversation in Conversation.objects.annotate(**NON_LUS_REELS).iterator():
+        conversation.non_lus_agent = conversation.reel_agent
+        conversation.non_lus_declarant = conversation.reel_declarant
+        a_modifier.append(conversation)
+    Conversation.objects.bulk_update(a_modifier, ['non_lus_agent', 'non_lus_declarant'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_statistique_journaliere'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='non_lus_agent',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='non_lus_declarant',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(remplir_non_lus, migrations.RunPython.noop),
+    ]
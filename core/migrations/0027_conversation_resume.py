@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Count, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+
+
+def remplir_resume(apps, schema_editor):
+    Conversation = apps.get_model('core', 'Conversation')
+    Message = apps.get_model('core', 'Message')
+    derniers = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id')
+    apercus = derniers.annotate(apercu=Case(
+        When(contenu='', fichier__gt='', then=Value('Fichier joint')),
+        When(contenu='', then=Value('')),
+        default=Substr('contenu', 1, 100),
+    ))
+    totaux = Message.objects.filter(conversation=OuterRef('pk')).values('conversation').annotate(n=Count('id')).values('n')
+    Conversation.objects.update(
+        last_message=Subquery(derniers.values('pk')[:1]),
+        last_message_preview=Coalesce(Subquery(apercus.values('apercu')[:1]), Value('')),
+        last_message_sender=Subquery(derniers.values('sender')[:1]),
+        last_message_type=Coalesce(Subquery(derniers.values('type_message')[:1]), Value('')),
+        last_message_at=Subquery(derniers.values('created_at')[:1]),
+        message_count=Coalesce(Subquery(totaux), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_conversation_non_lus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_type',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.RunPython(remplir_resume, migrations.RunPython.noop),
+    ]
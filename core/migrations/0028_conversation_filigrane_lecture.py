@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remplir_filigranes(apps, schema_editor):
+    Conversation = apps.get_model('core', 'Conversation')
+    Message = apps.get_model('core', 'Message')
+
+    def dernier_lu(participant):
+        lus = Message.objects.filter(conversation=OuterRef('pk'), receiver=OuterRef(participant), is_read=True)
+        return Coalesce(Subquery(lus.values('conversation').annotate(n=Max('id')).values('n')), 0)
+
+    Conversation.objects.update(lu_jusqua_agent=dernier_lu('agent'), lu_jusqua_declarant=dernier_lu('declarant'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_conversation_resume'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='lu_jusqua_agent',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='lu_jusqua_declarant',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(remplir_filigranes, migrations.RunPython.noop),
+    ]
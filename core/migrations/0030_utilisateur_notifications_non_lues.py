@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remplir_notifications_non_lues(apps, schema_editor):
+    Utilisateur = apps.get_model('core', 'Utilisateur')
+    Notification = apps.get_model('core', 'Notification')
+    non_lues = Notification.objects.filter(destinataire=OuterRef('pk'), lue=False).order_by().values(
+        'destinataire'
+    ).annotate(total=Count('pk')).values('total')
+    Utilisateur.objects.filter(notifications__lue=False).update(
+        notifications_non_lues=Coalesce(Subquery(non_lues, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_message_index_historique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utilisateur',
+            name='notifications_non_lues',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(remplir_notifications_non_lues, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_utilisateur_notifications_non_lues'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('arguments', models.JSONField(blank=True, default=dict, help_text="{'args': [...], 'kwargs': {...}}")),
+                ('priorite', models.SmallIntegerField(default=0, help_text='Les plus grandes valeurs passent en premier')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echouee', 'Échouée')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('max_tentatives', models.PositiveSmallIntegerField(default=5)),
+                ('executer_apres', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bail_jusqua', models.DateTimeField(blank=True, null=True)),
+                ('travailleur', models.CharField(blank=True, max_length=100)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('resultat', models.JSONField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'indexes': [models.Index(fields=['statut', 'executer_apres', 'priorite'], name='core_tache_file_idx'), models.Index(fields=['statut', 'bail_jusqua'], name='core_tache_bail_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_tache'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='declaration',
+            name='core_decl_statut_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='declaration',
+            name='core_decl_type_statut_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='declaration',
+            name='core_decl_struct_statut_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='declaration',
+            name='core_decl_region_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='declaration',
+            name='core_decl_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['statut', '-date_declaration', '-id'], name='core_decl_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['type_declaration', '-date_declaration', '-id'], name='core_decl_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['structure_locale', '-date_declaration'], name='core_decl_struct_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['region', '-date_declaration', '-id'], name='core_decl_region_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['-date_declaration', '-id'], name='core_decl_date_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_index_declaration_tri'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='declaration',
+            name='core_decl_struct_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='declaration',
+            index=models.Index(fields=['structure_locale', '-date_declaration', '-id'], name='core_decl_struct_date_idx'),
+        ),
+    ]
@@ -1,12 +1,31 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 import uuid
 
+from .geo import encode_geohash
+from .text import normalize_search_key
+
+
+def _normaliser_champs(instance, kwargs, champs):
+    """
+    Recalculer les clés de recherche normalisées avant l'enregistrement.
+
+    champs: dictionnaire {champ source: champ normalisé}
+    """
+    update_fields = kwargs.get('update_fields')
+    for source, cible in champs.items():
+        setattr(instance, cible, normalize_search_key(getattr(instance, source)))
+        if update_fields is not None and source in update_fields:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {cible}
+
 
 class Region(models.Model):
     nom = models.CharField(max_length=100, unique=True)
+    nom_normalise = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
     code = models.CharField(max_length=10, unique=True, null=True, blank=True)
     actif = models.BooleanField(default=True)
     date_creation = models.DateTimeField(auto_now_add=True, null=True)
@@ -14,6 +33,10 @@ class Region(models.Model):
     class Meta:
         ordering = ['nom']
 
+    def save(self, *args, **kwargs):
+        _normaliser_champs(self, kwargs, {'nom': 'nom_normalise'})
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.nom
 
@@ -21,6 +44,7 @@ class Region(models.Model):
 class Prefecture(models.Model):
     region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='prefectures')
     nom = models.CharField(max_length=100)
+    nom_normalise = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
     code = models.CharField(max_length=10, unique=True, null=True, blank=True)
     actif = models.BooleanField(default=True)
     date_creation = models.DateTimeField(auto_now_add=True, null=True)
@@ -29,6 +53,10 @@ class Prefecture(models.Model):
         unique_together = ('region', 'nom')
         ordering = ['nom']
 
+    def save(self, *args, **kwargs):
+        _normaliser_champs(self, kwargs, {'nom': 'nom_normalise'})
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nom} ({self.region.nom})"
 
@@ -42,6 +70,7 @@ class StructureLocale(models.Model):
         ('autre', 'Autre structure locale'),
     ]
     nom = models.CharField(max_length=150)
+    nom_normalise = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
     type_structure = models.CharField(max_length=20, choices=TYPE_CHOICES)
     prefecture = models.ForeignKey(Prefecture, on_delete=models.CASCADE, related_name='structures_locales')
     adresse = models.TextField(blank=True)
@@ -53,6 +82,10 @@ class StructureLocale(models.Model):
     class Meta:
         ordering = ['nom']
 
+    def save(self, *args, **kwargs):
+        _normaliser_champs(self, kwargs, {'nom': 'nom_normalise'})
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.nom} - {self.prefecture.nom}"
 
@@ -79,6 +112,9 @@ class Utilisateur(AbstractUser):
     verifie = models.BooleanField(default=False, help_text="Compte vérifié par un admin")
     date_verification = models.DateTimeField(null=True, blank=True)
     
+    # Notifications non lues, tenu à jour à chaque création/lecture/suppression
+    notifications_non_lues = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         permissions = [
             ("can_manage_declarations", "Peut gérer les déclarations"),
@@ -91,6 +127,24 @@ class Utilisateur(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
     
+    def save(self, *args, **kwargs):
+        # Un enregistrement complet (ex: profil) ne doit pas écraser le compteur
+        # de notifications modifié entre-temps par d'autres requêtes
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'notifications_non_lues'
+            ]
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def ajuster_notifications_non_lues(utilisateur_id, delta):
+        """Ajouter delta au compteur de notifications non lues (UPDATE atomique, jamais négatif)"""
+        if delta:
+            Utilisateur.objects.filter(pk=utilisateur_id).update(
+                notifications_non_lues=Greatest(F('notifications_non_lues') + delta, 0)
+            )
+    
     def is_agent_or_above(self):
         return self.role in ['agent', 'admin', 'superadmin']
     
@@ -157,6 +211,10 @@ class Declaration(models.Model):
     structure_locale = models.ForeignKey(StructureLocale, on_delete=models.SET_NULL, null=True, blank=True)
     lieu_precis = models.CharField(max_length=300, help_text="Lieu précis de perte/découverte")
     
+    # Clés de recherche normalisées (sans accents, minuscules, sans ponctuation)
+    nom_objet_normalise = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    lieu_normalise = models.CharField(max_length=300, blank=True, editable=False, db_index=True)
+    
     # Coordonnées GPS pour géolocalisation
     latitude = models.DecimalField(
         max_digits=9, 
@@ -172,6 +230,8 @@ class Declaration(models.Model):
         blank=True,
         help_text="Longitude GPS de l'emplacement"
     )
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True,
+                               help_text="Cellule geohash calculée à partir des coordonnées GPS")
     
     # Dates
     date_incident = models.DateField(help_text="Date de perte ou de découverte")
@@ -202,8 +262,38 @@ class Declaration(models.Model):
             ("can_publish_declaration", "Peut publier une déclaration"),
             ("can_archive_declaration", "Peut archiver une déclaration"),
         ]
+        indexes = [
+            # Égalité puis tri : les listes lisent l'index dans l'ordre et s'arrêtent au LIMIT.
+            # Les listes de statuts (statut__in) restent des filtres résiduels : un IN en
+            # tête d'index obligerait SQLite à trier toutes les lignes retenues.
+            # '-id' départage les dates pour la pagination par curseur de la supervision.
+            models.Index(fields=['statut', '-date_declaration', '-id'], name='core_decl_statut_date_idx'),
+            # Accueil et listes publiques par type (objets trouvés / perdus)
+            models.Index(fields=['type_declaration', '-date_declaration', '-id'], name='core_decl_type_date_idx'),
+            # Tableau de bord et liste des agents (structure locale)
+            models.Index(fields=['structure_locale', '-date_declaration', '-id'], name='core_decl_struct_date_idx'),
+            # Supervision et statistiques d'un admin régional (région + période)
+            models.Index(fields=['region', '-date_declaration', '-id'], name='core_decl_region_date_idx'),
+            # Déclarations d'un citoyen
+            models.Index(fields=['declarant', '-date_declaration'], name='core_decl_declarant_date_idx'),
+            # Listes non filtrées et filtres par période
+            models.Index(fields=['-date_declaration', '-id'], name='core_decl_date_idx'),
+            # Préfiltre des recherches de proximité (rectangle englobant)
+            models.Index(fields=['latitude', 'longitude'], name='core_decl_lat_lon_idx'),
+        ]
     
     def save(self, *args, **kwargs):
+        _normaliser_champs(self, kwargs, {
+            'nom_objet': 'nom_objet_normalise',
+            'lieu_precis': 'lieu_normalise',
+        })
+        
+        # Cellule geohash pour la carte
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        
         # Générer le numéro de déclaration automatiquement
         if not self.numero_declaration:
             from django.db import transaction
@@ -263,6 +353,31 @@ class PhotoDeclaration(models.Model):
         return f"Photo pour {self.declaration.numero_declaration}"
 
 
+class CorrespondanceDeclaration(models.Model):
+    """
+    Rapprochement proposé entre une déclaration de perte et une déclaration
+    d'objet trouvé (calculé par ``core.matching``).
+    """
+    declaration_perdue = models.ForeignKey(Declaration, on_delete=models.CASCADE, related_name='correspondances_trouvees',
+                                           limit_choices_to={'type_declaration': 'perdu'})
+    declaration_trouvee = models.ForeignKey(Declaration, on_delete=models.CASCADE, related_name='correspondances_perdues',
+                                            limit_choices_to={'type_declaration': 'trouve'})
+    score = models.FloatField(help_text="Score global entre 0 et 1")
+    details = models.JSONField(default=dict, blank=True, help_text="Score de chaque critère")
+    date_calcul = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('declaration_perdue', 'declaration_trouvee')
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['declaration_perdue', '-score']),
+            models.Index(fields=['declaration_trouvee', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.declaration_perdue.numero_declaration} ↔ {self.declaration_trouvee.numero_declaration} ({self.score:.2f})"
+
+
 class Reclamation(models.Model):
     """Réclamations d'objets par des utilisateurs"""
     
@@ -400,10 +515,19 @@ class Notification(models.Model):
         return f"{self.titre} - {self.destinataire.username}"
     
     def marquer_comme_lue(self):
-        if not self.lue:
-            self.lue = True
-            self.date_lecture = timezone.now()
-            self.save(update_fields=['lue', 'date_lecture'])
+        """Marquer lue ; renvoie True si la notification ne l'était pas encore"""
+        if self.lue:
+            return False
+        self.lue = True
+        self.date_lecture = timezone.now()
+        with transaction.atomic():
+            # UPDATE conditionnel : deux lectures simultanées ne décomptent qu'une fois
+            marquee = Notification.objects.filter(pk=self.pk, lue=False).update(
+                lue=True, date_lecture=self.date_lecture
+            )
+            if marquee:
+                Utilisateur.ajuster_notifications_non_lues(self.destinataire_id, -1)
+        return bool(marquee)
 
 
 class ActionLog(models.Model):
@@ -463,23 +587,30 @@ class ActionLog(models.Model):
         return f"{self.get_action_display()} {user_info} - {self.date_action.strftime('%d/%m/%Y %H:%M')}"
 
 
-class StatistiqueRegion(models.Model):
-    """Statistiques pré-calculées par région pour optimiser les dashboards"""
-    region = models.OneToOneField(Region, on_delete=models.CASCADE, related_name='statistiques')
-    
+class CompteursStatistiques(models.Model):
+    """
+    Compteurs pré-calculés d'une zone (région ou structure locale).
+
+    Tenus à jour par incréments atomiques lors des changements de statut
+    (voir core/statistiques.py) et recalculés par `reconcilier_statistiques`.
+    """
     # Compteurs de déclarations
     total_declarations = models.PositiveIntegerField(default=0)
+    declarations_perdues = models.PositiveIntegerField(default=0)
+    declarations_trouvees = models.PositiveIntegerField(default=0)
     declarations_en_attente = models.PositiveIntegerField(default=0)
+    declarations_validees = models.PositiveIntegerField(default=0)
     declarations_publiees = models.PositiveIntegerField(default=0)
     objets_restitues = models.PositiveIntegerField(default=0)
     
     # Compteurs de réclamations
     total_reclamations = models.PositiveIntegerField(default=0)
+    reclamations_soumises = models.PositiveIntegerField(default=0)
     reclamations_en_cours = models.PositiveIntegerField(default=0)
     reclamations_approuvees = models.PositiveIntegerField(default=0)
     reclamations_rejetees = models.PositiveIntegerField(default=0)
     
-    # Métriques de performance
+    # Métriques de performance (recalculées lors de la réconciliation)
     temps_moyen_traitement_heures = models.FloatField(default=0.0)
     taux_restitution = models.FloatField(default=0.0)
     
@@ -487,11 +618,7 @@ class StatistiqueRegion(models.Model):
     derniere_mise_a_jour = models.DateTimeField(auto_now=True)
     
     class Meta:
-        verbose_name = "Statistique région"
-        verbose_name_plural = "Statistiques régions"
-    
-    def __str__(self):
-        return f"Stats {self.region.nom}"
+        abstract = True
     
     def calculer_taux_restitution(self):
         """Calcule le taux de restitution en pourcentage"""
@@ -500,19 +627,126 @@ class StatistiqueRegion(models.Model):
         return 0.0
 
 
+class StatistiqueRegion(CompteursStatistiques):
+    """Statistiques pré-calculées par région pour optimiser les dashboards"""
+    region = models.OneToOneField(Region, on_delete=models.CASCADE, related_name='statistiques')
+    
+    class Meta:
+        verbose_name = "Statistique région"
+        verbose_name_plural = "Statistiques régions"
+    
+    def __str__(self):
+        return f"Stats {self.region.nom}"
+
+
+class StatistiqueStructure(CompteursStatistiques):
+    """Statistiques pré-calculées par structure locale (dashboard agent)"""
+    structure_locale = models.OneToOneField(StructureLocale, on_delete=models.CASCADE, related_name='statistiques')
+    
+    class Meta:
+        verbose_name = "Statistique structure locale"
+        verbose_name_plural = "Statistiques structures locales"
+    
+    def __str__(self):
+        return f"Stats {self.structure_locale.nom}"
+
+
+class StatistiqueJournaliere(models.Model):
+    """
+    Table de faits des graphiques : nombre de déclarations par jour de
+    déclaration et par dimension (zone, catégorie, type, statut actuel).
+
+    Tenue à jour par incréments à chaque écriture et recalculée jour par jour
+    par `agreger_statistiques_journalieres`.
+    """
+    # Clé unique des dimensions (les colonnes nulles empêchent un unique_together)
+    cle = models.CharField(max_length=150, unique=True, editable=False)
+    jour = models.DateField()
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    prefecture = models.ForeignKey(Prefecture, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    structure_locale = models.ForeignKey(StructureLocale, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    categorie = models.ForeignKey(CategorieObjet, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    type_declaration = models.CharField(max_length=10, choices=Declaration.TYPE_CHOICES)
+    statut = models.CharField(max_length=20, choices=Declaration.STATUT_CHOICES)
+    nombre = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+        indexes = [
+            models.Index(fields=['jour'], name='core_statj_jour_idx'),
+            models.Index(fields=['region', 'jour'], name='core_statj_region_jour_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.jour} - {self.type_declaration}/{self.statut} : {self.nombre}"
+
+
+class Tache(models.Model):
+    """
+    Tâche d'arrière-plan de la file stockée en base (voir core/taches.py).
+
+    Un travailleur réserve une tâche par UPDATE conditionnel et la détient
+    jusqu'à `bail_jusqua` ; un bail expiré (travailleur arrêté) la rend à
+    nouveau disponible. Les échecs sont replanifiés avec un délai croissant
+    jusqu'à `max_tentatives`.
+    """
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echouee', 'Échouée'),
+    ]
+    
+    nom = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict, blank=True, help_text="{'args': [...], 'kwargs': {...}}")
+    priorite = models.SmallIntegerField(default=0, help_text="Les plus grandes valeurs passent en premier")
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    
+    # Exécution
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    max_tentatives = models.PositiveSmallIntegerField(default=5)
+    executer_apres = models.DateTimeField(default=timezone.now)
+    bail_jusqua = models.DateTimeField(null=True, blank=True)
+    travailleur = models.CharField(max_length=100, blank=True)
+    derniere_erreur = models.TextField(blank=True)
+    resultat = models.JSONField(null=True, blank=True)
+    
+    # Dates
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Tâche"
+        verbose_name_plural = "Tâches"
+        indexes = [
+            models.Index(fields=['statut', 'executer_apres', 'priorite'], name='core_tache_file_idx'),
+            models.Index(fields=['statut', 'bail_jusqua'], name='core_tache_bail_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.nom} #{self.pk} ({self.get_statut_display()})"
+
+
 # ============ MODÈLES DE COMPATIBILITÉ ============
 # Ces modèles restent pour la compatibilité avec les vues existantes
 
 class Objet(models.Model):
     """Modèle de compatibilité - redirige vers Declaration"""
     nom = models.CharField(max_length=200)
+    nom_normalise = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
     description = models.TextField(blank=True)
     categorie = models.CharField(max_length=100, blank=True)
     photo = models.ImageField(upload_to='objets/', blank=True, null=True)
     lieu_trouve = models.CharField(max_length=200, blank=True)
+    lieu_normalise = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
     date_trouve = models.DateField(blank=True, null=True)
     date_creation = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        _normaliser_champs(self, kwargs, {'nom': 'nom_normalise', 'lieu_trouve': 'lieu_normalise'})
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.nom
 
@@ -616,6 +850,45 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Messages non lus de chaque participant, tenus à jour par UPDATE atomiques
+    # à l'envoi et à la lecture (recalculables : reconcilier_non_lus)
+    non_lus_agent = models.PositiveIntegerField(default=0, editable=False)
+    non_lus_declarant = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Résumé pour les boîtes de réception, écrit dans la transaction de chaque
+    # nouveau message : les listes n'ont pas à lire les messages
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+    last_message_preview = models.CharField(max_length=100, blank=True, editable=False)
+    last_message_sender = models.ForeignKey(
+        Utilisateur,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+    last_message_type = models.CharField(max_length=10, blank=True, editable=False)
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False)
+    message_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Filigrane de lecture : id du dernier message lu par chaque participant
+    lu_jusqua_agent = models.PositiveBigIntegerField(default=0, editable=False)
+    lu_jusqua_declarant = models.PositiveBigIntegerField(default=0, editable=False)
+    
+    COMPTEURS_NON_LUS = ('non_lus_agent', 'non_lus_declarant')
+    FILIGRANES_LECTURE = ('lu_jusqua_agent', 'lu_jusqua_declarant')
+    CHAMPS_RESUME = (
+        'last_message', 'last_message_preview', 'last_message_sender',
+        'last_message_type', 'last_message_at', 'message_count',
+    )
+    
     class Meta:
         db_table = 'core_conversation_chat'
         unique_together = ['signalement', 'agent', 'declarant']
@@ -626,25 +899,130 @@ class Conversation(models.Model):
     def __str__(self):
         return f"Conversation {self.agent.get_full_name()} ↔ {self.declarant.get_full_name()} - {self.signalement.numero_declaration}"
     
+    def save(self, *args, **kwargs):
+        # Un enregistrement complet d'une instance chargée plus tôt ne doit pas
+        # écraser les compteurs et le résumé modifiés entre-temps par d'autres requêtes
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            denormalises = {*self.COMPTEURS_NON_LUS, *self.FILIGRANES_LECTURE, *self.CHAMPS_RESUME}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in denormalises
+            ]
+        super().save(*args, **kwargs)
+    
+    def champ_non_lus(self, utilisateur_id):
+        """Compteur de messages non lus d'un participant (None hors participants)"""
+        if utilisateur_id is None:
+            return None
+        if utilisateur_id == self.agent_id:
+            return 'non_lus_agent'
+        if utilisateur_id == self.declarant_id:
+            return 'non_lus_declarant'
+        return None
+    
+    def champ_lu_jusqua(self, utilisateur_id):
+        """Filigrane de lecture d'un participant (None hors participants)"""
+        champ = self.champ_non_lus(utilisateur_id)
+        return champ and champ.replace('non_lus_', 'lu_jusqua_')
+    
+    def lu_jusqua(self, utilisateur):
+        """Id du dernier message lu par un participant (0 : aucun)"""
+        champ = self.champ_lu_jusqua(utilisateur.id)
+        return getattr(self, champ) if champ else 0
+    
+    def a_lire(self, lecteur):
+        """Le lecteur a-t-il des non lus ou un filigrane en retard (état chargé) ?"""
+        champ = self.champ_non_lus(lecteur.id)
+        return bool(champ) and (getattr(self, champ) > 0 or (self.last_message_id or 0) > self.lu_jusqua(lecteur))
+    
+    def ajuster_non_lus(self, destinataire_id, delta):
+        """Ajouter delta au compteur du destinataire (UPDATE atomique, jamais négatif)"""
+        champ = self.champ_non_lus(destinataire_id)
+        if champ and delta:
+            Conversation.objects.filter(pk=self.pk).update(**{champ: Greatest(F(champ) + delta, 0)})
+            setattr(self, champ, max(getattr(self, champ) + delta, 0))
+    
+    def enregistrer_message(self, message):
+        """
+        Reporter un nouveau message sur la conversation en un seul UPDATE :
+        résumé, nombre de messages, non lus du destinataire et date d'activité.
+        """
+        valeurs = {
+            'last_message_id': message.pk,
+            'last_message_preview': message.apercu(),
+            'last_message_sender_id': message.sender_id,
+            'last_message_type': message.type_message,
+            'last_message_at': message.created_at,
+            'updated_at': message.created_at,
+        }
+        compteurs = ['message_count']
+        champ = None if message.is_read else self.champ_non_lus(message.receiver_id)
+        if champ:
+            compteurs.append(champ)
+        Conversation.objects.filter(pk=self.pk).update(
+            **{nom.removesuffix('_id'): valeur for nom, valeur in valeurs.items()},
+            **{nom: F(nom) + 1 for nom in compteurs},
+        )
+        for nom, valeur in valeurs.items():
+            setattr(self, nom, valeur)
+        for nom in compteurs:
+            setattr(self, nom, getattr(self, nom) + 1)
+    
+    def marquer_comme_lus(self, lecteur, jusqua=None):
+        """
+        Marquer comme lus, en un seul UPDATE, les messages reçus par ``lecteur``
+        jusqu'au message ``jusqua`` (par défaut le dernier de la conversation),
+        puis avancer son filigrane de lecture et décrémenter son compteur.
+        
+        Rien n'est écrit si le participant n'a aucun non lu et que son
+        filigrane est déjà à jour (cas courant du polling).
+        
+        Returns:
+            int: Nombre de messages marqués
+        """
+        champ_non_lus = self.champ_non_lus(lecteur.id)
+        if champ_non_lus is None:
+            return 0
+        champ_lu = self.champ_lu_jusqua(lecteur.id)
+        
+        dernier, non_lus, lu = Conversation.objects.filter(pk=self.pk).values_list(
+            'last_message_id', champ_non_lus, champ_lu
+        ).get()
+        jusqua = min(jusqua, dernier or 0) if jusqua is not None else (dernier or 0)
+        nombre = 0
+        if non_lus or jusqua > lu:
+            with transaction.atomic():
+                if non_lus:
+                    nombre = self.messages.filter(receiver=lecteur, is_read=False, pk__lte=jusqua).update(
+                        is_read=True, read_at=timezone.now()
+                    )
+                Conversation.objects.filter(pk=self.pk).update(**{
+                    champ_non_lus: Greatest(F(champ_non_lus) - nombre, 0),
+                    champ_lu: Greatest(F(champ_lu), jusqua),
+                })
+        
+        setattr(self, champ_non_lus, max(non_lus - nombre, 0))
+        setattr(self, champ_lu, max(lu, jusqua))
+        return nombre
+    
     @property
     def unread_count_for_agent(self):
         """Nombre de messages non lus par l'agent"""
-        return self.messages.filter(sender=self.declarant, is_read=False).count()
+        return self.non_lus_agent
     
     @property
     def unread_count_for_declarant(self):
         """Nombre de messages non lus par le déclarant"""
-        return self.messages.filter(sender=self.agent, is_read=False).count()
+        return self.non_lus_declarant
     
     @property
     def dernier_message(self):
         """Retourne le dernier message de la conversation"""
-        return self.messages.order_by('-created_at').first()
-        return self.messages.filter(sender=self.agent, is_read=False).count()
+        return self.last_message
     
     def get_last_message(self):
         """Retourne le dernier message de la conversation"""
-        return self.messages.order_by('-created_at').first()
+        return self.last_message
 
 
 class Message(models.Model):
@@ -712,6 +1090,10 @@ class Message(models.Model):
         ordering = ['created_at']
         verbose_name = "Message"
         verbose_name_plural = "Messages"
+        indexes = [
+            # Fenêtres d'historique par clé (created_at, id), du plus récent au plus ancien
+            models.Index(fields=['conversation', 'created_at', 'id'], name='core_msg_conv_date_idx'),
+        ]
     
     def __str__(self):
         if self.type_message == 'fichier':
@@ -721,12 +1103,31 @@ class Message(models.Model):
         else:
             return f"💬 {self.sender.get_full_name()} → {self.receiver.get_full_name()}: {self.contenu[:50]}..."
     
+    def save(self, *args, **kwargs):
+        nouveau = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if nouveau:
+                self.conversation.enregistrer_message(self)
+    
+    def apercu(self):
+        """Extrait affiché dans les boîtes de réception"""
+        if self.contenu:
+            return self.contenu[:100]
+        return 'Fichier joint' if self.fichier else ''
+    
     def mark_as_read(self):
         """Marque le message comme lu"""
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            with transaction.atomic():
+                # UPDATE conditionnel : deux lectures simultanées ne décomptent qu'une fois
+                marque = Message.objects.filter(pk=self.pk, is_read=False).update(
+                    is_read=True, read_at=self.read_at
+                )
+                if marque:
+                    self.conversation.ajuster_non_lus(self.receiver_id, -1)
     
     @property
     def file_name(self):
@@ -0,0 +1,247 @@
+"""
+Notifications en temps réel.
+
+Chaque création de ``Notification`` (quel que soit le chemin : utilitaires,
+vues, administration) incrémente le compteur ``notifications_non_lues`` du
+destinataire dans la même transaction, puis, après validation, publie la
+notification et le nouveau compteur sur le groupe ``notifications_<id>`` des
+connexions WebSocket de l'utilisateur. Les lectures et suppressions
+décrémentent le compteur et publient sa nouvelle valeur : les clients n'ont
+plus à interroger le serveur pour mettre à jour leur badge.
+
+Les envois à de nombreux destinataires (annonces, agents d'une région) passent
+par ``creer_notifications`` : lignes construites en mémoire, insérées par lots
+``bulk_create`` dans une seule transaction avec les compteurs ; chaque lot
+planifie sa publication WebSocket (et ses emails) dans la file de tâches, avec
+les seuls identifiants des notifications.
+"""
+
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.urls import reverse
+
+from .models import Notification, Utilisateur
+from .taches import planifier
+
+logger = logging.getLogger(__name__)
+
+# Nombre de notifications par INSERT lors des envois en masse
+NOTIFICATIONS_TAILLE_LOT = getattr(settings, 'NOTIFICATIONS_TAILLE_LOT', 1000)
+
+
+def lien_action(type_notification, declaration=None, reclamation=None):
+    """Lien vers l'action à effectuer selon le type de notification"""
+    if declaration:
+        if type_notification == 'declaration_publiee':
+            return reverse('declaration_detail', kwargs={'id': declaration.id})
+        if type_notification in ['declaration_validee', 'declaration_rejetee']:
+            return reverse('utilisateur:mes_declarations')
+    elif reclamation:
+        if type_notification in ['reclamation_approuvee', 'reclamation_rejetee']:
+            return reverse('utilisateur:mes_reclamations')
+    return ""
+
+
+def groupe(utilisateur_id):
+    """Groupe des connexions WebSocket d'un utilisateur"""
+    return f'notifications_{utilisateur_id}'
+
+
+def compteur(utilisateur_id):
+    """Nombre de notifications non lues stocké pour un utilisateur"""
+    return Utilisateur.objects.filter(pk=utilisateur_id).values_list(
+        'notifications_non_lues', flat=True
+    ).first() or 0
+
+
+def donnees(notification):
+    """Représentation JSON d'une notification pour les clients"""
+    return {
+        'id': notification.id,
+        'type_notification': notification.type_notification,
+        'titre': notification.titre,
+        'message': notification.message,
+        'lien_action': notification.lien_action,
+        'importante': notification.importante,
+        'lue': notification.lue,
+        'date_creation': notification.date_creation.isoformat() if notification.date_creation else None,
+    }
+
+
+def diffuser(utilisateur_id, evenement):
+    """Envoyer un évènement au groupe de l'utilisateur (sans effet si aucune couche n'est disponible)"""
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer:
+            async_to_sync(channel_layer.group_send)(groupe(utilisateur_id), evenement)
+    except Exception as e:
+        logger.warning(f"Notification non diffusée (utilisateur {utilisateur_id}): {e}")
+
+
+def diffuser_notifications(notification_ids):
+    """
+    Publier des notifications déjà enregistrées avec le compteur de leur destinataire.
+
+    Une seule requête pour le lot, et une seule boucle d'évènements pour tous
+    les envois au lieu d'un ``async_to_sync`` par destinataire.
+
+    Returns:
+        int: nombre de notifications publiées
+    """
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return 0
+    lot = Notification.objects.filter(pk__in=notification_ids).annotate(
+        non_lues=F('destinataire__notifications_non_lues')
+    )
+    evenements = [
+        (notification.destinataire_id, {
+            'type': 'notification',
+            'data': {**donnees(notification), 'notifications_non_lues': notification.non_lues},
+        })
+        for notification in lot
+    ]
+
+    async def envoyer():
+        for utilisateur_id, evenement in evenements:
+            try:
+                await channel_layer.group_send(groupe(utilisateur_id), evenement)
+            except Exception as e:
+                logger.warning(f"Notification non diffusée (utilisateur {utilisateur_id}): {e}")
+
+    async_to_sync(envoyer)()
+    return len(evenements)
+
+
+def publier(notification):
+    """Publier une nouvelle notification et le compteur après validation de la transaction"""
+    def envoyer():
+        diffuser(notification.destinataire_id, {
+            'type': 'notification',
+            'data': {**donnees(notification), 'notifications_non_lues': compteur(notification.destinataire_id)},
+        })
+    transaction.on_commit(envoyer)
+
+
+def publier_compteur(utilisateur_id):
+    """Publier le compteur de non lues après validation de la transaction"""
+    def envoyer():
+        diffuser(utilisateur_id, {
+            'type': 'notification_count',
+            'data': {'notifications_non_lues': compteur(utilisateur_id)},
+        })
+    transaction.on_commit(envoyer)
+
+
+def enregistrer(notification):
+    """Reporter une notification créée sur le compteur de son destinataire et la publier"""
+    if not notification.lue:
+        Utilisateur.ajuster_notifications_non_lues(notification.destinataire_id, 1)
+    publier(notification)
+
+
+def oublier(notification):
+    """Reporter la suppression d'une notification non lue sur le compteur"""
+    if not notification.lue:
+        Utilisateur.ajuster_notifications_non_lues(notification.destinataire_id, -1)
+        publier_compteur(notification.destinataire_id)
+
+
+def creer_notifications(destinataires, type_notification, titre, message, declaration=None,
+                        reclamation=None, importante=False, envoyer_email=False, taille_lot=None):
+    """
+    Créer la même notification pour de nombreux destinataires.
+
+    Les lignes sont insérées par lots ``bulk_create`` dans une seule
+    transaction, avec les compteurs de non lues (un UPDATE par lot) ;
+    publication WebSocket et emails sont planifiés par lot dans la file de
+    tâches, après validation.
+
+    Args:
+        destinataires: QuerySet d'utilisateurs (ou itérable d'utilisateurs)
+        envoyer_email: Envoyer aussi un email aux destinataires qui en ont un
+        taille_lot: Notifications par INSERT (défaut NOTIFICATIONS_TAILLE_LOT)
+
+    Returns:
+        dict: {'crees', 'duree', 'lignes_par_seconde'}
+    """
+    taille_lot = taille_lot or NOTIFICATIONS_TAILLE_LOT
+    if hasattr(destinataires, 'values_list'):
+        destinataire_ids = destinataires.order_by().values_list('pk', flat=True).iterator(chunk_size=taille_lot)
+    else:
+        destinataire_ids = (utilisateur.pk for utilisateur in destinataires)
+
+    commun = {
+        'declaration': declaration,
+        'reclamation': reclamation,
+        'type_notification': type_notification,
+        'titre': titre,
+        'message': message,
+        'lien_action': lien_action(type_notification, declaration, reclamation),
+        'importante': importante,
+    }
+
+    debut = time.perf_counter()
+    crees = 0
+    with transaction.atomic():
+        lot = []
+        for destinataire_id in destinataire_ids:
+            lot.append(Notification(destinataire_id=destinataire_id, **commun))
+            if len(lot) >= taille_lot:
+                crees += _inserer(lot, envoyer_email)
+                lot = []
+        if lot:
+            crees += _inserer(lot, envoyer_email)
+    duree = time.perf_counter() - debut
+
+    resultat = {
+        'crees': crees,
+        'duree': duree,
+        'lignes_par_seconde': crees / duree if duree else 0.0,
+    }
+    logger.info(f"Notifications : {resultat['crees']} créée(s) en {duree:.2f}s "
+                f"({resultat['lignes_par_seconde']:.0f} lignes/s)")
+    return resultat
+
+
+def _inserer(lot, envoyer_email):
+    """
+    Insérer un lot, incrémenter les compteurs (``bulk_create`` ne déclenche
+    pas les signaux) et planifier sa livraison après validation
+    """
+    Notification.objects.bulk_create(lot)
+    Utilisateur.objects.filter(pk__in=[n.destinataire_id for n in lot]).update(
+        notifications_non_lues=F('notifications_non_lues') + 1
+    )
+    # Seuls les identifiants sont conservés jusqu'à la validation
+    notification_ids = [n.pk for n in lot]
+    planifier('diffuser_notifications', notification_ids)
+    if envoyer_email:
+        # Les destinataires sans email sont ignorés par la tâche
+        planifier('emails_notifications', notification_ids)
+    return len(lot)
+
+
+def reconcilier(corriger=True):
+    """
+    Comparer les compteurs de notifications non lues aux notifications.
+
+    Returns:
+        list: dérives [{'utilisateur_id', 'stocke', 'reel'}]
+    """
+    lignes = Utilisateur.objects.annotate(
+        reel=Count('notifications', filter=Q(notifications__lue=False))
+    ).exclude(notifications_non_lues=F('reel')).values_list('pk', 'notifications_non_lues', 'reel')
+    derives = [{'utilisateur_id': pk, 'stocke': stocke, 'reel': reel} for pk, stocke, reel in lignes]
+    if corriger:
+        for derive in derives:
+            Utilisateur.objects.filter(pk=derive['utilisateur_id']).update(notifications_non_lues=derive['reel'])
+    if derives:
+        logger.warning(f"Notifications : {len(derives)} compteur(s) en dérive{' corrigé(s)' if corriger else ''}")
+    return derives
@@ -0,0 +1,211 @@
+"""
+Pagination par curseur.
+
+Un curseur est un jeton opaque (JSON encodé en base64 URL) qui mémorise la
+position de la dernière ligne renvoyée. La page suivante reprend après cette
+position au lieu de compter et sauter des lignes avec OFFSET, et le total
+n'est calculé que sur demande (exact, ou mis en cache).
+"""
+
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+
+
+class CurseurInvalide(ValueError):
+    """Jeton de pagination illisible ou falsifié"""
+
+
+def encoder_curseur(position):
+    """Encoder une position (dict sérialisable en JSON) en jeton opaque"""
+    brut = json.dumps(position, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def decoder_curseur(jeton):
+    """Décoder un jeton produit par ``encoder_curseur``. Lève CurseurInvalide."""
+    if not jeton:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(jeton + '=' * (-len(jeton) % 4))
+        position = json.loads(brut)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise CurseurInvalide("Curseur de pagination invalide")
+    if not isinstance(position, dict):
+        raise CurseurInvalide("Curseur de pagination invalide")
+    return position
+
+
+# Durée de cache des totaux approximatifs (secondes)
+PAGINATION_TOTAL_CACHE_TIMEOUT = getattr(settings, 'PAGINATION_TOTAL_CACHE_TIMEOUT', 120)
+
+
+def _cle_requete(prefixe, queryset):
+    """Clé de cache dérivée du SQL d'un queryset (filtres compris)"""
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return None
+    return f"{prefixe}_{hashlib.md5(sql.encode()).hexdigest()}"
+
+
+def total_en_cache(queryset, timeout=None):
+    """``count()`` d'un queryset, mis en cache quelques minutes selon ses filtres"""
+    cle = _cle_requete('pagination_total', queryset.order_by())
+    if cle is None:
+        return 0
+    return cache.get_or_set(cle, queryset.count, timeout or PAGINATION_TOTAL_CACHE_TIMEOUT)
+
+
+def agregats_en_cache(queryset, timeout=None, **expressions):
+    """``aggregate(**expressions)`` mis en cache selon les filtres du queryset"""
+    queryset = queryset.order_by()
+    cle = _cle_requete('pagination_agregats', queryset)
+    if cle is None:
+        return queryset.aggregate(**expressions)
+    cle = f"{cle}_{hashlib.md5(repr(sorted(expressions.items())).encode()).hexdigest()[:8]}"
+    return cache.get_or_set(cle, lambda: queryset.aggregate(**expressions),
+                            timeout or PAGINATION_TOTAL_CACHE_TIMEOUT)
+
+
+def _valeur_json(valeur):
+    if isinstance(valeur, (datetime.datetime, datetime.date)):
+        return valeur.isoformat()
+    if isinstance(valeur, (Decimal, uuid.UUID)):
+        return str(valeur)
+    return valeur
+
+
+class PageCurseur:
+    """Page renvoyée par ``PaginateurCurseur`` (itérable comme une page Django)"""
+
+    def __init__(self, object_list, has_previous, has_next, previous_cursor, next_cursor, total, total_approx):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+        self.total_approx = total_approx
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+
+class PaginateurCurseur:
+    """
+    Pagination par clé (keyset) sur l'ordre d'un queryset.
+
+    L'ordre est celui du queryset (ou celui du modèle), complété par la clé
+    primaire pour départager les égalités. Les champs d'ordre doivent être non
+    nuls. La page suivante filtre ``(champ1, champ2, ..., pk) > dernière ligne``
+    au lieu d'un OFFSET.
+
+    Args:
+        queryset: Queryset à paginer
+        par_page: Nombre d'éléments par page
+        ordre: Liste des champs d'ordre (ex: ['-date_declaration']), par défaut celui du queryset
+        total: None (pas de total), 'exact' (count()) ou 'cache' (count() mis en cache)
+    """
+
+    def __init__(self, queryset, par_page, ordre=None, total=None):
+        self.par_page = par_page
+        self.total = total
+        ordre = list(ordre or queryset.query.order_by or queryset.model._meta.ordering)
+        pk = queryset.model._meta.pk.name
+        if not any(champ.lstrip('-') in (pk, 'pk') for champ in ordre):
+            descendant = bool(ordre) and ordre[-1].startswith('-')
+            ordre.append(f"-{pk}" if descendant else pk)
+        self.champs = [(champ.lstrip('-'), champ.startswith('-')) for champ in ordre]
+        self.queryset = queryset.order_by(*ordre)
+        self.signature = hashlib.md5(','.join(ordre).encode()).hexdigest()[:8]
+
+    def _position(self, obj):
+        valeurs = []
+        for nom, _ in self.champs:
+            valeur = obj
+            for partie in nom.split('__'):
+                valeur = getattr(valeur, partie)
+            valeurs.append(_valeur_json(valeur))
+        return valeurs
+
+    def _filtre(self, valeurs, inverse):
+        """Condition « après la position » (ou « avant » si ``inverse``)"""
+        condition = Q()
+        egalites = {}
+        for (nom, descendant), valeur in zip(self.champs, valeurs):
+            operateur = 'lt' if descendant != inverse else 'gt'
+            condition |= Q(**egalites, **{f'{nom}__{operateur}': valeur})
+            egalites[nom] = valeur
+        return condition
+
+    def _compter(self):
+        if self.total == 'exact':
+            return self.queryset.count(), False
+        if self.total == 'cache':
+            return total_en_cache(self.queryset), True
+        return None, False
+
+    def page(self, jeton=None):
+        """Page correspondant au jeton (première page si absent ou invalide)"""
+        position = None
+        try:
+            position = decoder_curseur(jeton)
+        except CurseurInvalide:
+            pass
+        if position and (position.get('o') != self.signature or
+                         not isinstance(position.get('v'), list) or
+                         len(position['v']) != len(self.champs)):
+            position = None
+
+        arriere = bool(position) and position.get('sens') == 'p'
+        queryset = self.queryset
+        if position:
+            try:
+                queryset = queryset.filter(self._filtre(position['v'], inverse=arriere))
+            except (ValidationError, ValueError, TypeError):
+                queryset, position, arriere = self.queryset, None, False
+        if arriere:
+            queryset = queryset.reverse()
+
+        lignes = list(queryset[:self.par_page + 1])
+        encore = len(lignes) > self.par_page
+        lignes = lignes[:self.par_page]
+        if arriere:
+            lignes.reverse()
+            has_previous, has_next = encore, True
+        else:
+            has_previous, has_next = position is not None, encore
+
+        precedent = suivant = None
+        if lignes and has_previous:
+            precedent = encoder_curseur({'o': self.signature, 'sens': 'p', 'v': self._position(lignes[0])})
+        if lignes and has_next:
+            suivant = encoder_curseur({'o': self.signature, 'sens': 'n', 'v': self._position(lignes[-1])})
+
+        total, approx = self._compter()
+        return PageCurseur(lignes, has_previous, has_next, precedent, suivant, total, approx)
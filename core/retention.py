@@ -0,0 +1,180 @@
+"""
+Purge des données anciennes selon des politiques de conservation.
+
+Un ``.delete()`` unique sur une grande table chargeait toutes les lignes pour
+collecter les cascades et gardait le verrou d'écriture SQLite pendant toute
+la purge. Ici, chaque politique est purgée par tranches de clé primaire
+(``RETENTION_TAILLE_LOT`` identifiants, une transaction courte par tranche)
+avec une pause entre deux tranches pour laisser passer les autres écritures.
+
+Quand aucune cascade ne s'applique (aucune relation ne pointe vers le
+modèle) et qu'aucun signal de suppression n'est concerné, la tranche est
+supprimée par un DELETE direct, sans lire les lignes ; sinon elle passe par
+la suppression Django, bornée à la tranche.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, pre_delete
+from django.utils import timezone
+
+from .models import ActionLog, Conversation, Message, Notification, Tache
+
+logger = logging.getLogger(__name__)
+
+# Durées de conservation (jours)
+RETENTION_NOTIFICATIONS_JOURS = getattr(settings, 'RETENTION_NOTIFICATIONS_JOURS', 180)
+RETENTION_ACTIONS_JOURS = getattr(settings, 'RETENTION_ACTIONS_JOURS', 365)
+RETENTION_MESSAGES_JOURS = getattr(settings, 'RETENTION_MESSAGES_JOURS', 365)
+RETENTION_TACHES_JOURS = getattr(settings, 'RETENTION_TACHES_JOURS', 30)
+
+# Identifiants par tranche et pause entre deux tranches (secondes)
+RETENTION_TAILLE_LOT = getattr(settings, 'RETENTION_TAILLE_LOT', 1000)
+RETENTION_PAUSE = getattr(settings, 'RETENTION_PAUSE', 0.05)
+
+
+def _avant_suppression_messages(lot):
+    """Décompter les messages purgés de leur conversation et supprimer leurs fichiers après validation"""
+    par_nombre = defaultdict(list)
+    for ligne in lot.values('conversation').annotate(n=Count('id')).order_by():
+        par_nombre[ligne['n']].append(ligne['conversation'])
+    for nombre, conversations in par_nombre.items():
+        Conversation.objects.filter(pk__in=conversations).update(
+            message_count=Greatest(F('message_count') - nombre, 0)
+        )
+
+    fichiers = list(lot.exclude(fichier='').exclude(fichier__isnull=True).values_list('fichier', flat=True))
+    if fichiers:
+        def supprimer_fichiers():
+            for nom in fichiers:
+                try:
+                    default_storage.delete(nom)
+                except OSError as e:
+                    logger.warning(f"Fichier de message {nom} non supprimé : {e}")
+        transaction.on_commit(supprimer_fichiers)
+
+
+# Politiques : nom -> modèle, champ de date, durée, conditions des lignes purgeables
+POLITIQUES = {
+    'notifications': {
+        'modele': Notification,
+        'champ_date': 'date_creation',
+        'jours': RETENTION_NOTIFICATIONS_JOURS,
+        'conditions': [Q(lue=True)],
+        # Le signal de suppression ne concerne que les notifications non lues (compteur)
+        'ignorer_signaux': True,
+    },
+    'actions': {
+        'modele': ActionLog,
+        'champ_date': 'date_action',
+        'jours': RETENTION_ACTIONS_JOURS,
+        # Erreurs et connexions : conservées plus longtemps
+        'conditions': [~Q(action__in=['erreur', 'connexion'])],
+    },
+    'messages': {
+        'modele': Message,
+        'champ_date': 'created_at',
+        'jours': RETENTION_MESSAGES_JOURS,
+        # Messages lus, sauf le dernier de chaque conversation (aperçu des boîtes de réception)
+        'conditions': [Q(is_read=True), ~Exists(Conversation.objects.filter(last_message=OuterRef('pk')))],
+        'avant_suppression': _avant_suppression_messages,
+    },
+    'taches': {
+        'modele': Tache,
+        'champ_date': 'date_fin',
+        'jours': RETENTION_TACHES_JOURS,
+        'conditions': [Q(statut__in=['terminee', 'echouee'])],
+    },
+}
+
+
+def suppression_directe(modele, ignorer_signaux=False):
+    """Un DELETE direct est-il sans effet de bord (ni cascade, ni signal) ?"""
+    if not ignorer_signaux and (pre_delete.has_listeners(modele) or post_delete.has_listeners(modele)):
+        return False
+    return not any(
+        relation.auto_created and not relation.concrete and (relation.one_to_many or relation.one_to_one)
+        for relation in modele._meta.get_fields(include_hidden=True)
+    )
+
+
+def purgeables(nom, jours=None):
+    """Lignes purgeables d'une politique"""
+    politique = POLITIQUES[nom]
+    jours = politique['jours'] if jours is None else jours
+    limite = timezone.now() - timedelta(days=jours)
+    return politique['modele'].objects.filter(
+        **{f"{politique['champ_date']}__lt": limite}
+    ).filter(*politique['conditions'])
+
+
+def purger(nom, jours=None, taille_lot=None, pause=None, simulation=False, progression=None):
+    """
+    Purger une politique par tranches de clé primaire.
+
+    Args:
+        nom: Nom de la politique (voir POLITIQUES)
+        jours: Remplace la durée de conservation de la politique
+        taille_lot: Identifiants par tranche (défaut RETENTION_TAILLE_LOT)
+        pause: Secondes entre deux tranches (défaut RETENTION_PAUSE)
+        simulation: Compter sans supprimer
+        progression: Fonction (nom, supprimes, avancement de 0 à 1) appelée après chaque tranche
+
+    Returns:
+        dict: {'supprimes', 'tranches', 'directe', 'duree'}
+    """
+    if nom not in POLITIQUES:
+        raise ValueError(f"Politique de conservation inconnue : {nom}")
+    politique = POLITIQUES[nom]
+    modele = politique['modele']
+    taille_lot = taille_lot or RETENTION_TAILLE_LOT
+    pause = RETENTION_PAUSE if pause is None else pause
+    directe = suppression_directe(modele, politique.get('ignorer_signaux', False))
+
+    debut_chrono = time.monotonic()
+    lignes = purgeables(nom, jours)
+    bornes = lignes.aggregate(premier=Min('pk'), dernier=Max('pk'))
+    supprimes = tranches = 0
+
+    if bornes['premier'] is not None:
+        premier, dernier = bornes['premier'], bornes['dernier']
+        debut = premier
+        while debut <= dernier:
+            fin = debut + taille_lot
+            tranche = lignes.filter(pk__gte=debut, pk__lt=fin)
+            if simulation:
+                nombre = tranche.count()
+            else:
+                with transaction.atomic():
+                    if politique.get('avant_suppression'):
+                        politique['avant_suppression'](tranche)
+                    if directe:
+                        # Ce que fait Django pour ses suppressions rapides : un seul DELETE ... WHERE
+                        nombre = tranche._raw_delete(tranche.db)
+                    else:
+                        nombre = tranche.delete()[1].get(modele._meta.label, 0)
+            supprimes += nombre
+            tranches += 1
+            if progression:
+                progression(nom, supprimes, min((fin - premier) / (dernier - premier + 1), 1.0))
+            debut = fin
+            if nombre and pause and debut <= dernier:
+                time.sleep(pause)
+
+    resultat = {
+        'supprimes': supprimes,
+        'tranches': tranches,
+        'directe': directe,
+        'duree': time.monotonic() - debut_chrono,
+    }
+    if not simulation:
+        logger.info(f"Conservation {nom} : {supprimes} ligne(s) supprimée(s) en {tranches} tranche(s)")
+    return resultat
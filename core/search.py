@@ -0,0 +1,308 @@
+"""
+Service de recherche plein texte sur les déclarations.
+
+Sur SQLite, un index FTS5 (table virtuelle ``core_declaration_fts``) est tenu
+à jour par les signaux de ``core.signals``. Toutes les vues de recherche passent
+par ``search_declarations`` : on interroge l'index puis on restreint le queryset
+fourni par la vue, au lieu d'enchaîner des ``icontains`` qui parcourent toute
+la table. Les recherches par lieu comparent des préfixes sur les clés
+normalisées (``nom_normalise``) des régions, préfectures et structures locales.
+Sur un autre moteur (ou si l'index est absent), on retombe sur les clés
+normalisées des déclarations (voir ``core.text``).
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import CharField, F, FloatField, Func, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.lookups import In
+
+from .text import normalize_search_key
+
+FTS_TABLE = 'core_declaration_fts'
+
+# Colonnes de l'index, dans l'ordre de création
+FTS_COLUMNS = ['numero', 'nom_objet', 'description', 'lieu_precis', 'localite']
+
+# Champs de Declaration recopiés dans l'index (voir _SOURCE_SQL)
+CHAMPS_INDEXES = {
+    'numero_declaration', 'nom_objet', 'description', 'lieu_precis',
+    'prefecture', 'prefecture_id', 'region', 'region_id',
+}
+
+# Colonnes interrogées pour une recherche par nom d'objet / par lieu
+NOM_COLUMNS = ['nom_objet']
+LIEU_COLUMNS = ['lieu_precis']
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SOURCE_SQL = """
+    SELECT d.id, d.numero_declaration, d.nom_objet, d.description, d.lieu_precis,
+           TRIM(COALESCE(p.nom, '') || ' ' || COALESCE(r.nom, ''))
+    FROM core_declaration d
+    LEFT JOIN core_prefecture p ON p.id = d.prefecture_id
+    LEFT JOIN core_region r ON r.id = d.region_id
+"""
+
+_fts_ready = False
+
+
+def create_index(schema_connection=None):
+    """Créer la table FTS5 si le moteur le permet. Retourne True si l'index existe."""
+    global _fts_ready
+    conn = schema_connection or connection
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    _fts_ready = True
+    return True
+
+
+def drop_index(schema_connection=None):
+    global _fts_ready
+    _fts_ready = False
+    conn = schema_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def fts_enabled():
+    """Vrai si l'index FTS5 est disponible sur la connexion courante"""
+    global _fts_ready
+    if _fts_ready:
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+    _fts_ready = FTS_TABLE in connection.introspection.table_names()
+    return _fts_ready
+
+
+def rebuild_index():
+    """
+    Reconstruire entièrement l'index à partir de la table des déclarations.
+
+    Returns:
+        int: nombre de déclarations indexées
+    """
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) {_SOURCE_SQL}"
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _reindex_where(where_sql, params):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT d.id FROM core_declaration d WHERE {where_sql})",
+            params
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) {_SOURCE_SQL} WHERE {where_sql}",
+            params
+        )
+
+
+def index_declaration(declaration_id):
+    """(Ré)indexer une déclaration"""
+    _reindex_where('d.id = %s', [declaration_id])
+
+
+def reindex_prefecture(prefecture_id):
+    """Réindexer les déclarations d'une préfecture (après renommage)"""
+    _reindex_where('d.prefecture_id = %s', [prefecture_id])
+
+
+def reindex_region(region_id):
+    """Réindexer les déclarations d'une région (après renommage)"""
+    _reindex_where('d.region_id = %s', [region_id])
+
+
+def remove_declaration(declaration_id):
+    """Retirer une déclaration de l'index"""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [declaration_id])
+
+
+def build_match_expression(text, columns=None):
+    """
+    Transformer une saisie libre en expression MATCH FTS5.
+
+    Chaque mot (normalisé par ``normalize_search_key``) devient un préfixe entre
+    guillemets (``"tele"*``), tous les mots doivent être présents. ``columns``
+    restreint la recherche à certaines colonnes.
+    """
+    tokens = _TOKEN_RE.findall(normalize_search_key(text))
+    if not tokens:
+        return None
+    prefix = '{%s} : ' % ' '.join(columns) if columns else ''
+    return ' '.join(f'{prefix}"{token}"*' for token in tokens)
+
+
+def prefix_filter(field, text):
+    """
+    Préfixe sur une clé normalisée, exprimé en intervalle pour utiliser l'index.
+
+    ``LIKE 'cle%'`` n'utilise pas l'index sur SQLite (LIKE y est insensible à la
+    casse) ; ``cle <= champ < cle + U+FFFF`` est une simple recherche par intervalle.
+    """
+    key = normalize_search_key(text)
+    if not key:
+        return Q(pk__in=[])
+    return Q(**{f'{field}__gte': key, f'{field}__lt': key + '\uffff'})
+
+
+def word_prefix_filter(field, text):
+    """
+    Chaque mot saisi est le début d'un mot de la clé normalisée (``tele`` trouve
+    « Mon téléphone »), comme ``build_match_expression`` pour l'index plein texte.
+
+    Les mots de la clé sont séparés par une espace : un mot commence au début de
+    la clé ou après ``' '``. Un mot au milieu de la clé n'est pas un préfixe de la
+    colonne : ce filtre lit la clé de chaque ligne (pour les petites tables sans
+    index plein texte).
+    """
+    tokens = _TOKEN_RE.findall(normalize_search_key(text))
+    if not tokens:
+        return Q(pk__in=[])
+    condition = Q()
+    for token in tokens:
+        condition &= Q(**{f'{field}__startswith': token}) | Q(**{f'{field}__contains': ' ' + token})
+    return condition
+
+
+class _SansIndex(Func):
+    """Expression inchangée ; sur SQLite, ``+colonne`` écarte la colonne du choix d'index"""
+    template = '%(expressions)s'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='+%(expressions)s', **extra_context)
+
+
+def statut_parmi(statuts):
+    """
+    ``statut IN (...)`` vérifié ligne par ligne plutôt que cherché dans l'index.
+
+    Chercher plusieurs statuts dans ``(statut, -date_declaration, -id)`` oblige
+    SQLite à trier toutes les lignes retenues ; vérifié ligne par ligne, le
+    filtre laisse les listes triées par date lire un index de tri dans l'ordre
+    (et s'arrêter au LIMIT).
+    """
+    return Q(In(_SansIndex(F('statut'), output_field=CharField()), list(statuts)))
+
+
+def _localite_filter(lieu):
+    """Déclarations dont la région, la préfecture ou la structure locale commence par ``lieu``"""
+    from .models import Region, Prefecture, StructureLocale
+
+    cle = prefix_filter('nom_normalise', lieu)
+    return (
+        Q(region__in=Region.objects.filter(cle).values('pk')) |
+        Q(prefecture__in=Prefecture.objects.filter(cle).values('pk')) |
+        Q(structure_locale__in=StructureLocale.objects.filter(cle).values('pk'))
+    )
+
+
+def _normalized_filter(query=None, nom=None):
+    """Filtres sur les clés normalisées utilisés quand l'index n'est pas disponible"""
+    condition = Q()
+    if nom:
+        condition &= Q(nom_objet_normalise__contains=normalize_search_key(nom))
+    if query:
+        key = normalize_search_key(query)
+        condition &= (
+            Q(nom_objet_normalise__contains=key) |
+            Q(lieu_normalise__contains=key) |
+            Q(description__icontains=query) |
+            Q(numero_declaration__icontains=query) |
+            _localite_filter(query)
+        )
+    return condition
+
+
+def _fts_ids(match):
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+
+
+def _fts_rank(match, table):
+    """Score bm25 de la ligne courante (sous-requête corrélée sur le rowid ; plus petit = plus pertinent)"""
+    return RawSQL(
+        f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"AND rowid = {connection.ops.quote_name(table)}.id",
+        [match], output_field=FloatField(),
+    )
+
+
+def search_declarations(queryset, query=None, nom=None, lieu=None, ranked=False, extra=None):
+    """
+    Restreindre un queryset de déclarations à une recherche plein texte.
+
+    Args:
+        queryset: Queryset de Declaration déjà filtré par la vue
+        query: Texte recherché dans toutes les colonnes indexées
+        nom: Texte recherché uniquement dans le nom de l'objet
+        lieu: Texte recherché uniquement dans le lieu, la préfecture, la région
+            et la structure locale
+        ranked: Trier par pertinence (bm25) plutôt que par l'ordre du queryset
+        extra: Q supplémentaire combiné en OU avec la recherche (ex: déclarant)
+
+    Returns:
+        Queryset filtré
+    """
+    expressions = []
+    if query:
+        expressions.append(build_match_expression(query))
+    if nom:
+        expressions.append(build_match_expression(nom, NOM_COLUMNS))
+    expressions = [e for e in expressions if e]
+    lieu = normalize_search_key(lieu)
+    if not expressions and not lieu:
+        return queryset
+
+    fts = fts_enabled()
+    condition = Q()
+    rang = None
+
+    # Lieu : préfixe indexé sur les localités, ou mots du lieu précis
+    if lieu:
+        lieu_condition = _localite_filter(lieu)
+        if fts:
+            lieu_condition |= Q(pk__in=_fts_ids(build_match_expression(lieu, LIEU_COLUMNS)))
+        else:
+            lieu_condition |= Q(lieu_normalise__contains=lieu)
+        condition &= lieu_condition
+
+    if expressions and not fts:
+        condition &= _normalized_filter(query, nom)
+    elif expressions and ranked:
+        match = ' '.join(expressions)
+        condition &= Q(pk__in=_fts_ids(match))
+        rang = _fts_rank(match, queryset.model._meta.db_table)
+    elif expressions:
+        condition &= Q(pk__in=_fts_ids(' '.join(expressions)))
+
+    if extra is not None:
+        condition |= extra
+    queryset = queryset.filter(condition)
+
+    if rang is None:
+        return queryset
+    # Tous les résultats sont classés (pas de troncature) ; ceux retenus par ``extra`` seul en dernier
+    return queryset.annotate(search_rank=rang).order_by(
+        F('search_rank').asc(nulls_last=True), '-date_declaration'
+    )
@@ -0,0 +1,153 @@
+"""
+Signaux du module core : maintien des structures dérivées des modèles
+(index de recherche, correspondances perdu/trouvé, cache de la carte, compteurs statistiques,
+notifications en temps réel, etc.) lors des écritures.
+"""
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import cache_pages, geo, matching, notifications, search, statistiques
+from .models import CommentaireAnonyme, Declaration, Notification, Prefecture, Reclamation, Region
+
+
+@receiver(post_save, sender=Declaration)
+def indexer_declaration(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Tenir l'index plein texte à jour après chaque enregistrement"""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & search.CHAMPS_INDEXES:
+        return
+    search.index_declaration(instance.pk)
+
+
+@receiver(post_save, sender=Declaration)
+def rapprocher_declaration(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Chercher les objets perdus/trouvés correspondant à une déclaration nouvelle ou modifiée"""
+    if raw or not matching.MATCHING_AUTO:
+        return
+    if not created and update_fields is not None and not set(update_fields) & matching.CHAMPS_RAPPROCHES:
+        return
+    matching.planifier_correspondances(instance.pk)
+
+
+@receiver(post_delete, sender=Declaration)
+def desindexer_declaration(sender, instance, **kwargs):
+    search.remove_declaration(instance.pk)
+
+
+# Champs sans effet sur la carte (ex: compteur de vues)
+CHAMPS_HORS_CARTE = {'nombre_vues', 'derniere_modification'}
+
+
+@receiver(post_save, sender=Declaration)
+def invalider_carte_apres_enregistrement(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and set(update_fields) <= CHAMPS_HORS_CARTE:
+        return
+    geo.invalider_carte()
+
+
+@receiver(post_delete, sender=Declaration)
+def invalider_carte_apres_suppression(sender, instance, **kwargs):
+    geo.invalider_carte()
+
+
+# ----- Cache des pages publiques -----
+
+@receiver(post_save, sender=Declaration)
+def purger_pages_apres_enregistrement(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and set(update_fields) <= CHAMPS_HORS_CARTE:
+        return
+    cache_pages.purger_declaration(instance)
+
+
+@receiver(post_delete, sender=Declaration)
+def purger_pages_apres_suppression(sender, instance, **kwargs):
+    cache_pages.purger_declaration(instance)
+
+
+@receiver([post_save, post_delete], sender=CommentaireAnonyme)
+def purger_pages_commentaire(sender, instance, raw=False, **kwargs):
+    """Les commentaires ne sont affichés que sur la page de leur déclaration"""
+    if raw or not instance.declaration_id:
+        return
+    cache_pages.purger(f'declaration:{instance.declaration_id}')
+
+
+@receiver(post_save, sender=Region)
+def purger_pages_region(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    cache_pages.purger(f'region:{instance.pk}', 'accueil', 'signalements')
+
+
+@receiver(post_save, sender=Prefecture)
+def reindexer_prefecture(sender, instance, created=False, raw=False, **kwargs):
+    """Le nom de la préfecture est recopié dans l'index des déclarations"""
+    if raw or created:
+        return
+    search.reindex_prefecture(instance.pk)
+
+
+@receiver(post_save, sender=Region)
+def reindexer_region(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    search.reindex_region(instance.pk)
+
+
+# ----- Compteurs statistiques par région / structure locale -----
+
+@receiver(pre_save, sender=Declaration)
+def memoriser_etat_declaration(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    statistiques.memoriser_declaration(instance, update_fields)
+
+
+@receiver(post_save, sender=Declaration)
+def compter_declaration(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    statistiques.declaration_enregistree(instance, created)
+
+
+@receiver(post_delete, sender=Declaration)
+def decompter_declaration(sender, instance, **kwargs):
+    statistiques.declaration_supprimee(instance)
+
+
+@receiver(pre_save, sender=Reclamation)
+def memoriser_etat_reclamation(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    statistiques.memoriser_reclamation(instance, update_fields)
+
+
+@receiver(post_save, sender=Reclamation)
+def compter_reclamation(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    statistiques.reclamation_enregistree(instance, created)
+
+
+@receiver(post_delete, sender=Reclamation)
+def decompter_reclamation(sender, instance, **kwargs):
+    statistiques.reclamation_supprimee(instance)
+
+
+@receiver(post_save, sender=Notification)
+def publier_notification(sender, instance, created=False, raw=False, **kwargs):
+    """Compter la nouvelle notification et la pousser au destinataire après validation"""
+    if raw or not created:
+        return
+    notifications.enregistrer(instance)
+
+
+@receiver(post_delete, sender=Notification)
+def decompter_notification(sender, instance, **kwargs):
+    notifications.oublier(instance)
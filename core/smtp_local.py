@@ -0,0 +1,113 @@
+"""
+Serveur SMTP local minimal, pour mesurer les envois d'emails (tests et
+``benchmark_courriels``) sans dépendre d'un vrai serveur.
+
+Les messages reçus sont gardés en mémoire. Le serveur peut simuler le coût
+d'ouverture d'une connexion (poignée de main, TLS, authentification d'un vrai
+serveur) et refuser temporairement une adresse pour tester les nouveaux essais.
+"""
+
+import socketserver
+import threading
+import time
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def ecrire(self, reponse):
+        self.wfile.write(f"{reponse}\r\n".encode('ascii'))
+
+    def handle(self):
+        serveur = self.server.smtp
+        serveur.ouverture()
+        self.ecrire("220 localhost SMTP local")
+        destinataires = []
+        while True:
+            ligne = self.rfile.readline()
+            if not ligne:
+                break
+            commande = ligne.decode('utf-8', 'replace').strip()
+            verbe = commande[:4].upper()
+            if verbe in ('EHLO', 'HELO'):
+                self.ecrire("250 localhost")
+            elif verbe in ('MAIL', 'RSET'):
+                destinataires = []
+                self.ecrire("250 OK")
+            elif verbe == 'RCPT':
+                adresse = commande.split(':', 1)[1].strip().strip('<>')
+                if serveur.refuser(adresse):
+                    self.ecrire("451 Reessayer plus tard")
+                else:
+                    destinataires.append(adresse)
+                    self.ecrire("250 OK")
+            elif verbe == 'DATA':
+                self.ecrire("354 Fin avec <CRLF>.<CRLF>")
+                contenu = []
+                for ligne in iter(self.rfile.readline, b''):
+                    if ligne == b'.\r\n':
+                        break
+                    contenu.append(ligne)
+                serveur.recevoir(destinataires, b''.join(contenu))
+                destinataires = []
+                self.ecrire("250 OK")
+            elif verbe == 'NOOP':
+                self.ecrire("250 OK")
+            elif verbe == 'QUIT':
+                self.ecrire("221 Au revoir")
+                break
+            else:
+                self.ecrire("502 Commande non prise en charge")
+
+
+class _Serveur(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ServeurSMTPLocal:
+    """
+    Serveur SMTP en mémoire sur 127.0.0.1 (port libre choisi au démarrage).
+
+    Args:
+        delai_connexion: Secondes simulées par ouverture de connexion
+        refuser_une_fois: Adresses refusées (451) à leur premier envoi
+
+    Usage:
+        with ServeurSMTPLocal() as serveur:
+            ... EMAIL_HOST='127.0.0.1', EMAIL_PORT=serveur.port ...
+    """
+
+    def __init__(self, delai_connexion=0.0, refuser_une_fois=()):
+        self.delai_connexion = delai_connexion
+        self.a_refuser = set(refuser_une_fois)
+        self.connexions = 0
+        self.messages = []
+        self._verrou = threading.Lock()
+
+    def ouverture(self):
+        with self._verrou:
+            self.connexions += 1
+        if self.delai_connexion:
+            time.sleep(self.delai_connexion)
+
+    def refuser(self, adresse):
+        with self._verrou:
+            if adresse in self.a_refuser:
+                self.a_refuser.discard(adresse)
+                return True
+            return False
+
+    def recevoir(self, destinataires, contenu):
+        with self._verrou:
+            self.messages.append((destinataires, contenu))
+
+    def __enter__(self):
+        self._serveur = _Serveur(('127.0.0.1', 0), _Session)
+        self._serveur.smtp = self
+        self.port = self._serveur.server_address[1]
+        self._thread = threading.Thread(target=self._serveur.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._serveur.shutdown()
+        self._serveur.server_close()
@@ -0,0 +1,435 @@
+"""
+Compteurs statistiques incrémentaux par région et par structure locale, et
+agrégats journaliers des déclarations (table de faits des graphiques).
+
+Chaque déclaration (et chaque réclamation) contribue à un ensemble de
+compteurs déterminé par son type et son statut. Lors d'un enregistrement, on
+compare l'ensemble avant/après et on applique la différence par un UPDATE
+atomique (``F(compteur) + delta``) sur la ligne de la zone : aucun recomptage
+de la table. ``reconcilier`` recalcule tous les compteurs par agrégats groupés
+pour détecter et corriger les dérives (mises à jour en masse, imports, ...).
+
+Les agrégats journaliers suivent le même principe (une ligne par jour et par
+combinaison de dimensions, incrémentée à l'écriture) ; ``recalculer_jours``
+les reconstruit jour par jour de façon idempotente.
+"""
+
+import datetime
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import (
+    Declaration, Reclamation, Region, StructureLocale,
+    StatistiqueRegion, StatistiqueStructure, StatistiqueJournaliere,
+)
+
+logger = logging.getLogger(__name__)
+
+# Compteur -> (champ, valeurs) : la ligne est comptée si champ in valeurs (None = toujours)
+COMPTEURS_DECLARATION = {
+    'total_declarations': None,
+    'declarations_perdues': ('type_declaration', {'perdu'}),
+    'declarations_trouvees': ('type_declaration', {'trouve'}),
+    'declarations_en_attente': ('statut', {'cree', 'en_validation'}),
+    'declarations_validees': ('statut', {'valide', 'publie', 'restitue'}),
+    'declarations_publiees': ('statut', {'publie'}),
+    'objets_restitues': ('statut', {'restitue'}),
+}
+
+COMPTEURS_RECLAMATION = {
+    'total_reclamations': None,
+    'reclamations_soumises': ('statut', {'soumise'}),
+    'reclamations_en_cours': ('statut', {'soumise', 'en_cours'}),
+    'reclamations_approuvees': ('statut', {'approuvee'}),
+    'reclamations_rejetees': ('statut', {'rejetee'}),
+}
+
+COMPTEURS = [*COMPTEURS_DECLARATION, *COMPTEURS_RECLAMATION]
+
+# Niveaux de zone : (modèle de statistiques, champ de Declaration, modèle de la zone)
+ZONES = [
+    (StatistiqueRegion, 'region', Region),
+    (StatistiqueStructure, 'structure_locale', StructureLocale),
+]
+
+# Dimensions des agrégats journaliers (en plus du jour de déclaration)
+DIMENSIONS_JOURNALIERES = ['region', 'prefecture', 'structure_locale', 'categorie', 'type_declaration', 'statut']
+
+# Champs dont dépendent les compteurs et les agrégats journaliers
+CHAMPS_DECLARATION = set(DIMENSIONS_JOURNALIERES)
+CHAMPS_RECLAMATION = {'declaration', 'statut'}
+
+
+def _compteurs(definitions, etat):
+    """Compteurs auxquels contribue une ligne dans l'état donné"""
+    return [nom for nom, condition in definitions.items()
+            if condition is None or etat[condition[0]] in condition[1]]
+
+
+def _agregats(definitions, prefixe=''):
+    """Expressions Count() filtrées correspondant aux compteurs"""
+    expressions = {}
+    for nom, condition in definitions.items():
+        filtre = None
+        if condition is not None:
+            champ, valeurs = condition
+            filtre = Q(**{f'{prefixe}{champ}__in': sorted(valeurs)})
+        expressions[nom] = Count('id', filter=filtre)
+    return expressions
+
+
+def _ajouter(deltas, definitions, etat, signe, nombre=1):
+    """Ajouter la contribution (+/-) d'une ligne aux deltas de chaque zone"""
+    if etat is None:
+        return
+    for modele, cle, _ in ZONES:
+        if etat[cle] is None:
+            continue
+        for nom in _compteurs(definitions, etat):
+            deltas[(modele, cle, etat[cle])][nom] += signe * nombre
+
+
+def appliquer(deltas):
+    """
+    Appliquer les deltas par UPDATE atomique, une requête par zone touchée.
+
+    Une ligne absente est créée par recalcul complet de la zone (l'écriture en
+    cours y est donc déjà comptée).
+    """
+    maintenant = timezone.now()
+    for (modele, cle, zone_id), compteurs in deltas.items():
+        expressions = {
+            nom: F(nom) + delta if delta > 0 else Greatest(F(nom) + delta, Value(0))
+            for nom, delta in compteurs.items() if delta
+        }
+        if not expressions:
+            continue
+        if not modele.objects.filter(**{f'{cle}_id': zone_id}).update(derniere_mise_a_jour=maintenant, **expressions):
+            recalculer_zone(modele, cle, zone_id)
+
+
+def calculer(cle, zone_id=None):
+    """
+    Compteurs exacts par zone (deux agrégats groupés)
+
+    Returns:
+        dict: zone_id -> {compteur: valeur}
+    """
+    declarations = Declaration.objects.filter(**{f'{cle}__isnull': False})
+    reclamations = Reclamation.objects.filter(**{f'declaration__{cle}__isnull': False})
+    if zone_id is not None:
+        declarations = declarations.filter(**{f'{cle}_id': zone_id})
+        reclamations = reclamations.filter(**{f'declaration__{cle}_id': zone_id})
+
+    resultats = defaultdict(lambda: dict.fromkeys(COMPTEURS, 0))
+    for ligne in declarations.values(cle).annotate(**_agregats(COMPTEURS_DECLARATION)).order_by():
+        resultats[ligne.pop(cle)].update(ligne)
+    for ligne in reclamations.values(f'declaration__{cle}').annotate(**_agregats(COMPTEURS_RECLAMATION)).order_by():
+        resultats[ligne.pop(f'declaration__{cle}')].update(ligne)
+    return resultats
+
+
+def _taux_restitution(valeurs):
+    if valeurs['declarations_publiees'] > 0:
+        return (valeurs['objets_restitues'] / valeurs['declarations_publiees']) * 100
+    return 0.0
+
+
+def recalculer_zone(modele, cle, zone_id):
+    """Recalculer entièrement (et créer si besoin) la ligne de statistiques d'une zone"""
+    valeurs = calculer(cle, zone_id)[zone_id]
+    valeurs['taux_restitution'] = _taux_restitution(valeurs)
+    ligne, _ = modele.objects.update_or_create(**{f'{cle}_id': zone_id}, defaults=valeurs)
+    return ligne
+
+
+def reconcilier(corriger=True):
+    """
+    Comparer les compteurs stockés aux valeurs réelles et corriger les écarts.
+
+    Args:
+        corriger: False pour seulement détecter les dérives
+
+    Returns:
+        list: dérives [{'modele', 'zone_id', 'ecarts': {compteur: (stocké, réel)}}]
+    """
+    derives = []
+    for modele, cle, modele_zone in ZONES:
+        attendus = calculer(cle)
+        existants = {getattr(ligne, f'{cle}_id'): ligne for ligne in modele.objects.all()}
+        a_creer, a_modifier = [], []
+        for zone_id in modele_zone.objects.values_list('id', flat=True):
+            valeurs = attendus[zone_id]
+            ligne = existants.get(zone_id)
+            stocke = {nom: getattr(ligne, nom) if ligne else 0 for nom in COMPTEURS}
+            ecarts = {nom: (stocke[nom], valeurs[nom]) for nom in COMPTEURS if stocke[nom] != valeurs[nom]}
+            if ecarts:
+                derives.append({'modele': modele, 'zone_id': zone_id, 'ecarts': ecarts})
+            if not corriger:
+                continue
+
+            taux = _taux_restitution(valeurs)
+            if ligne is None:
+                a_creer.append(modele(**{f'{cle}_id': zone_id}, taux_restitution=taux, **valeurs))
+            elif ecarts or ligne.taux_restitution != taux:
+                for nom, valeur in valeurs.items():
+                    setattr(ligne, nom, valeur)
+                ligne.taux_restitution = taux
+                ligne.derniere_mise_a_jour = timezone.now()
+                a_modifier.append(ligne)
+
+        modele.objects.bulk_create(a_creer, ignore_conflicts=True)
+        modele.objects.bulk_update(a_modifier, [*COMPTEURS, 'taux_restitution', 'derniere_mise_a_jour'], batch_size=500)
+
+    if derives:
+        logger.warning(f"Statistiques : {len(derives)} zone(s) en dérive{' corrigée(s)' if corriger else ''}")
+    return derives
+
+
+def statistiques_region(region):
+    """Ligne de statistiques d'une région (créée au besoin)"""
+    return (StatistiqueRegion.objects.filter(region=region).first()
+            or recalculer_zone(StatistiqueRegion, 'region', region.pk))
+
+
+def statistiques_structure(structure):
+    """Ligne de statistiques d'une structure locale (créée au besoin)"""
+    return (StatistiqueStructure.objects.filter(structure_locale=structure).first()
+            or recalculer_zone(StatistiqueStructure, 'structure_locale', structure.pk))
+
+
+def compteurs_nationaux():
+    """
+    Compteurs de déclarations de toute la plateforme : somme des lignes
+    régionales, plus les déclarations sans région (comptées à la volée).
+    """
+    totaux = StatistiqueRegion.objects.aggregate(
+        **{nom: Coalesce(Sum(nom), 0) for nom in COMPTEURS_DECLARATION}
+    )
+    hors_region = Declaration.objects.filter(region__isnull=True).aggregate(**_agregats(COMPTEURS_DECLARATION))
+    return {nom: totaux[nom] + hors_region[nom] for nom in COMPTEURS_DECLARATION}
+
+
+# ----- Agrégats journaliers -----
+
+def jour_declaration(date_declaration):
+    """Jour (fuseau courant) auquel une déclaration est comptée"""
+    if date_declaration is None:
+        return None
+    if timezone.is_aware(date_declaration):
+        date_declaration = timezone.localtime(date_declaration)
+    return date_declaration.date()
+
+
+def cle_journaliere(jour, dimensions):
+    """Clé unique d'une ligne d'agrégat : jour + valeurs des dimensions"""
+    valeurs = [jour.isoformat()] + [str(dimensions[nom] or '') for nom in DIMENSIONS_JOURNALIERES]
+    return '|'.join(valeurs)
+
+
+def _colonnes(dimensions):
+    """Dimensions -> arguments du modèle (clés étrangères en *_id)"""
+    return {
+        f'{nom}_id' if nom not in ('type_declaration', 'statut') else nom: dimensions[nom]
+        for nom in DIMENSIONS_JOURNALIERES
+    }
+
+
+def _ajouter_fait(faits, etat, jour, signe):
+    if etat is None or jour is None:
+        return
+    faits[(jour, *(etat[nom] for nom in DIMENSIONS_JOURNALIERES))] += signe
+
+
+def appliquer_faits(faits):
+    """Appliquer les deltas journaliers par UPDATE atomique (ligne créée au besoin)"""
+    for (jour, *valeurs), delta in faits.items():
+        if not delta:
+            continue
+        dimensions = dict(zip(DIMENSIONS_JOURNALIERES, valeurs))
+        cle = cle_journaliere(jour, dimensions)
+        lignes = StatistiqueJournaliere.objects.filter(cle=cle)
+        if delta < 0:
+            lignes.update(nombre=Greatest(F('nombre') + delta, Value(0)))
+            continue
+        if not lignes.update(nombre=F('nombre') + delta):
+            StatistiqueJournaliere.objects.bulk_create(
+                [StatistiqueJournaliere(cle=cle, jour=jour, nombre=0, **_colonnes(dimensions))],
+                ignore_conflicts=True,
+            )
+            lignes.update(nombre=F('nombre') + delta)
+
+
+def _debut_jour(jour):
+    debut = datetime.datetime.combine(jour, datetime.time.min)
+    return timezone.make_aware(debut) if settings.USE_TZ else debut
+
+
+def recalculer_jours(debut, fin, taille_lot=1000):
+    """
+    Reconstruire les agrégats des jours [debut, fin] à partir des déclarations.
+
+    Idempotent : les lignes de la période sont supprimées puis réinsérées
+    dans la même transaction.
+
+    Returns:
+        int: nombre de lignes d'agrégat écrites
+    """
+    declarations = Declaration.objects.filter(
+        date_declaration__gte=_debut_jour(debut),
+        date_declaration__lt=_debut_jour(fin + datetime.timedelta(days=1)),
+    )
+    groupes = declarations.annotate(jour=TruncDate('date_declaration')).values(
+        'jour', *DIMENSIONS_JOURNALIERES
+    ).annotate(nombre=Count('id')).order_by()
+
+    with transaction.atomic():
+        StatistiqueJournaliere.objects.filter(jour__range=(debut, fin)).delete()
+        lignes = [
+            StatistiqueJournaliere(
+                cle=cle_journaliere(groupe['jour'], groupe), jour=groupe['jour'],
+                nombre=groupe['nombre'], **_colonnes(groupe)
+            )
+            for groupe in groupes
+        ]
+        StatistiqueJournaliere.objects.bulk_create(lignes, batch_size=taille_lot)
+    return len(lignes)
+
+
+def jours_modifies(depuis):
+    """Jours de déclaration des déclarations créées ou modifiées depuis une date"""
+    return list(Declaration.objects.filter(derniere_modification__gte=depuis).dates('date_declaration', 'day'))
+
+
+def faits_journaliers(debut=None, fin=None, region=None):
+    """
+    Lignes d'agrégat non nulles d'une période (bornes incluses), à grouper
+    avec ``values(...).annotate(total=Sum('nombre'))``.
+    """
+    faits = StatistiqueJournaliere.objects.filter(nombre__gt=0)
+    if debut is not None:
+        faits = faits.filter(jour__gte=debut)
+    if fin is not None:
+        faits = faits.filter(jour__lte=fin)
+    if region is not None:
+        faits = faits.filter(region=region)
+    return faits
+
+
+def somme(**filtre):
+    """Expression Sum('nombre') (filtrée), 0 si aucune ligne"""
+    return Coalesce(Sum('nombre', filter=Q(**filtre) if filtre else None), 0)
+
+
+# ----- Suivi des écritures (appelé par les signaux) -----
+
+def _etat_declaration(declaration):
+    return {
+        'region': declaration.region_id,
+        'prefecture': declaration.prefecture_id,
+        'structure_locale': declaration.structure_locale_id,
+        'categorie': declaration.categorie_id,
+        'type_declaration': declaration.type_declaration,
+        'statut': declaration.statut,
+    }
+
+
+def memoriser_declaration(declaration, update_fields=None):
+    """Avant enregistrement : mémoriser l'état en base si les compteurs peuvent changer"""
+    declaration._etat_statistiques = None
+    if declaration._state.adding or declaration.pk is None:
+        return
+    if update_fields is not None and not CHAMPS_DECLARATION & {f.removesuffix('_id') for f in update_fields}:
+        return
+    declaration._etat_statistiques = Declaration.objects.filter(pk=declaration.pk).values(*CHAMPS_DECLARATION).first()
+
+
+def declaration_enregistree(declaration, created):
+    avant = declaration.__dict__.pop('_etat_statistiques', None)
+    if not created and avant is None:
+        return
+    apres = _etat_declaration(declaration)
+    if avant == apres:
+        return
+
+    deltas = defaultdict(Counter)
+    _ajouter(deltas, COMPTEURS_DECLARATION, avant, -1)
+    _ajouter(deltas, COMPTEURS_DECLARATION, apres, +1)
+
+    # Les réclamations suivent la déclaration si elle change de zone
+    if avant and (avant['region'], avant['structure_locale']) != (apres['region'], apres['structure_locale']):
+        reclamations = declaration.reclamations.values('statut').annotate(nombre=Count('id')).order_by()
+        for ligne in reclamations:
+            _ajouter(deltas, COMPTEURS_RECLAMATION, {**avant, 'statut': ligne['statut']}, -1, ligne['nombre'])
+            _ajouter(deltas, COMPTEURS_RECLAMATION, {**apres, 'statut': ligne['statut']}, +1, ligne['nombre'])
+    appliquer(deltas)
+
+    jour = jour_declaration(declaration.date_declaration)
+    faits = Counter()
+    _ajouter_fait(faits, avant, jour, -1)
+    _ajouter_fait(faits, apres, jour, +1)
+    appliquer_faits(faits)
+
+
+def declaration_supprimee(declaration):
+    etat = _etat_declaration(declaration)
+    deltas = defaultdict(Counter)
+    _ajouter(deltas, COMPTEURS_DECLARATION, etat, -1)
+    appliquer(deltas)
+
+    faits = Counter()
+    _ajouter_fait(faits, etat, jour_declaration(declaration.date_declaration), -1)
+    appliquer_faits(faits)
+
+
+def _etat_reclamation(declaration_id, statut):
+    zones = Declaration.objects.filter(pk=declaration_id).values('region', 'structure_locale').first()
+    return {**zones, 'statut': statut} if zones else None
+
+
+def memoriser_reclamation(reclamation, update_fields=None):
+    reclamation._etat_statistiques = None
+    if reclamation._state.adding or reclamation.pk is None:
+        return
+    if update_fields is not None and not CHAMPS_RECLAMATION & {f.removesuffix('_id') for f in update_fields}:
+        return
+    avant = Reclamation.objects.filter(pk=reclamation.pk).values(
+        'declaration', 'statut', 'declaration__region', 'declaration__structure_locale'
+    ).first()
+    if avant:
+        reclamation._etat_statistiques = {
+            'declaration': avant['declaration'],
+            'region': avant['declaration__region'],
+            'structure_locale': avant['declaration__structure_locale'],
+            'statut': avant['statut'],
+        }
+
+
+def reclamation_enregistree(reclamation, created):
+    avant = reclamation.__dict__.pop('_etat_statistiques', None)
+    if not created and (avant is None or (avant['declaration'], avant['statut']) ==
+                        (reclamation.declaration_id, reclamation.statut)):
+        return
+
+    if reclamation._meta.get_field('declaration').is_cached(reclamation):
+        apres = {**_etat_declaration(reclamation.declaration), 'statut': reclamation.statut}
+    else:
+        apres = _etat_reclamation(reclamation.declaration_id, reclamation.statut)
+
+    deltas = defaultdict(Counter)
+    _ajouter(deltas, COMPTEURS_RECLAMATION, avant, -1)
+    _ajouter(deltas, COMPTEURS_RECLAMATION, apres, +1)
+    appliquer(deltas)
+
+
+def reclamation_supprimee(reclamation):
+    # Lors d'une suppression en cascade, la déclaration est supprimée après ses réclamations
+    deltas = defaultdict(Counter)
+    _ajouter(deltas, COMPTEURS_RECLAMATION, _etat_reclamation(reclamation.declaration_id, reclamation.statut), -1)
+    appliquer(deltas)
@@ -0,0 +1,381 @@
+"""
+File de tâches d'arrière-plan stockée en base (sans broker externe).
+
+Les travaux lents (emails, digests, recalculs statistiques, exports) ne
+s'exécutent plus dans la requête : ``planifier`` insère une ligne ``Tache``
+après validation de la transaction courante (une tâche n'est jamais visible
+pour un travail annulé), et les travailleurs de ``manage.py run_worker`` la
+réservent puis l'exécutent.
+
+- Priorités : les tâches disponibles sont servies par priorité décroissante,
+  puis par date d'échéance.
+- Baux : la réservation est un UPDATE conditionnel qui pose un bail de
+  ``TACHES_BAIL`` secondes, renouvelé pendant toute l'exécution par un
+  battement ; si le travailleur meurt, le bail expire et la tâche est
+  reprise par un autre.
+- Nouveaux essais : une tâche en échec est replanifiée avec un délai
+  exponentiel (avec gigue) jusqu'à ``max_tentatives``, puis marquée échouée.
+
+Les tâches sont enregistrées avec le décorateur ``@tache`` ; leurs arguments
+doivent être sérialisables en JSON (identifiants plutôt qu'instances).
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Tache
+
+logger = logging.getLogger(__name__)
+
+# Durée du bail d'une tâche réservée (secondes)
+TACHES_BAIL = getattr(settings, 'TACHES_BAIL', 300)
+
+# Délai avant le premier nouvel essai, doublé à chaque échec (secondes)
+TACHES_DELAI_BASE = getattr(settings, 'TACHES_DELAI_BASE', 10)
+TACHES_DELAI_MAX = getattr(settings, 'TACHES_DELAI_MAX', 3600)
+
+# Attente d'un travailleur quand la file est vide (secondes)
+TACHES_ATTENTE = getattr(settings, 'TACHES_ATTENTE', 1.0)
+
+# Tâches enregistrées : {nom: {'fonction', 'priorite', 'max_tentatives', 'bail'}}
+REGISTRE = {}
+
+
+def tache(nom, priorite=0, max_tentatives=5, bail=None):
+    """
+    Enregistrer une fonction comme tâche d'arrière-plan.
+
+    Args:
+        nom: Nom de la tâche (stocké en base)
+        priorite: Priorité par défaut (les plus grandes passent en premier)
+        max_tentatives: Nombre d'exécutions avant l'abandon
+        bail: Durée du bail en secondes (défaut TACHES_BAIL)
+    """
+    def decorateur(fonction):
+        REGISTRE[nom] = {
+            'fonction': fonction,
+            'priorite': priorite,
+            'max_tentatives': max_tentatives,
+            'bail': bail,
+        }
+        return fonction
+    return decorateur
+
+
+def planifier(nom, *args, priorite=None, delai=None, **kwargs):
+    """
+    Mettre une tâche en file après validation de la transaction courante.
+
+    Args:
+        nom: Nom d'une tâche enregistrée
+        priorite: Remplace la priorité par défaut de la tâche
+        delai: Secondes avant la première exécution
+        *args, **kwargs: Arguments de la tâche (sérialisables en JSON)
+    """
+    if nom not in REGISTRE:
+        raise ValueError(f"Tâche inconnue : {nom}")
+    definition = REGISTRE[nom]
+    arguments = {'args': list(args), 'kwargs': kwargs}
+    # Erreur levée dans l'appelant plutôt qu'après la validation
+    json.dumps(arguments)
+
+    def inserer():
+        Tache.objects.create(
+            nom=nom,
+            arguments=arguments,
+            priorite=definition['priorite'] if priorite is None else priorite,
+            max_tentatives=definition['max_tentatives'],
+            executer_apres=timezone.now() + timedelta(seconds=delai or 0),
+        )
+
+    transaction.on_commit(inserer)
+
+
+def identifiant_travailleur():
+    """Identifiant unique du travailleur courant (machine, processus, thread)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"[:100]
+
+
+def _disponibles(maintenant):
+    return (Q(statut='en_attente', executer_apres__lte=maintenant)
+            | Q(statut='en_cours', bail_jusqua__lt=maintenant))
+
+
+def reserver(travailleur, limite=1):
+    """
+    Réserver jusqu'à ``limite`` tâches disponibles pour un travailleur.
+
+    Chaque réservation est un UPDATE conditionnel : deux travailleurs ne
+    peuvent pas réserver la même tâche, sans verrou de ligne.
+
+    Returns:
+        list: Tâches réservées (tentative déjà comptée)
+    """
+    maintenant = timezone.now()
+    # Travailleur arrêté pendant la dernière tentative autorisée : abandon
+    Tache.objects.filter(
+        statut='en_cours', bail_jusqua__lt=maintenant, tentatives__gte=F('max_tentatives')
+    ).update(statut='echouee', date_fin=maintenant, bail_jusqua=None,
+             derniere_erreur="Bail expiré pendant la dernière tentative")
+
+    candidats = Tache.objects.filter(_disponibles(maintenant)).order_by(
+        '-priorite', 'executer_apres', 'id'
+    ).values_list('pk', 'nom')[:limite * 4]
+
+    reservees = []
+    for pk, nom in candidats:
+        if Tache.objects.filter(_disponibles(maintenant), pk=pk).update(
+            statut='en_cours',
+            travailleur=travailleur,
+            bail_jusqua=maintenant + timedelta(seconds=duree_bail(nom)),
+            tentatives=F('tentatives') + 1,
+        ):
+            reservees.append(pk)
+            if len(reservees) >= limite:
+                break
+    return list(Tache.objects.filter(pk__in=reservees).order_by('-priorite', 'executer_apres', 'id'))
+
+
+def duree_bail(nom):
+    """Durée du bail d'une tâche (secondes)"""
+    return REGISTRE.get(nom, {}).get('bail') or TACHES_BAIL
+
+
+class _Battement(threading.Thread):
+    """
+    Renouvelle le bail d'une tâche tous les tiers de bail pendant son
+    exécution : une tâche longue n'est pas reprise par un autre travailleur
+    tant que son détenteur est vivant.
+    """
+
+    def __init__(self, tache):
+        super().__init__(name=f"bail-tache-{tache.pk}", daemon=True)
+        self.tache = tache
+        self.bail = duree_bail(tache.nom)
+        self.fin = threading.Event()
+
+    def run(self):
+        detenue = Tache.objects.filter(pk=self.tache.pk, statut='en_cours', travailleur=self.tache.travailleur)
+        try:
+            while not self.fin.wait(self.bail / 3):
+                if not detenue.update(bail_jusqua=timezone.now() + timedelta(seconds=self.bail)):
+                    logger.warning(f"Bail de la tâche {self.tache} perdu pendant l'exécution")
+                    return
+        except DatabaseError:
+            logger.exception(f"Renouvellement du bail de la tâche {self.tache} impossible")
+        finally:
+            connection.close()
+
+    def arreter(self):
+        self.fin.set()
+        self.join()
+
+
+def delai_nouvel_essai(tentatives):
+    """Délai exponentiel avant le prochain essai, avec gigue de ±20 %"""
+    delai = min(TACHES_DELAI_BASE * 2 ** max(tentatives - 1, 0), TACHES_DELAI_MAX)
+    return delai * random.uniform(0.8, 1.2)
+
+
+def _serialisable(resultat):
+    try:
+        json.dumps(resultat)
+        return resultat
+    except (TypeError, ValueError):
+        return str(resultat)
+
+
+def executer(tache):
+    """
+    Exécuter une tâche réservée et enregistrer son issue.
+
+    L'issue n'est écrite que si le travailleur détient toujours la tâche :
+    après un bail expiré, c'est le nouveau détenteur qui conclut.
+
+    Returns:
+        bool: True si la tâche s'est terminée sans erreur
+    """
+    detenue = Tache.objects.filter(pk=tache.pk, statut='en_cours', travailleur=tache.travailleur)
+    battement = _Battement(tache)
+    battement.start()
+    try:
+        definition = REGISTRE.get(tache.nom)
+        if definition is None:
+            raise LookupError(f"Tâche inconnue : {tache.nom}")
+        arguments = tache.arguments or {}
+        resultat = definition['fonction'](*arguments.get('args', []), **arguments.get('kwargs', {}))
+    except Exception:
+        battement.arreter()
+        maintenant = timezone.now()
+        if tache.tentatives >= tache.max_tentatives:
+            issue = {'statut': 'echouee', 'date_fin': maintenant}
+            logger.error(f"Tâche {tache} abandonnée après {tache.tentatives} tentative(s)", exc_info=True)
+        else:
+            issue = {'statut': 'en_attente',
+                     'executer_apres': maintenant + timedelta(seconds=delai_nouvel_essai(tache.tentatives))}
+            logger.warning(f"Tâche {tache} en échec (tentative {tache.tentatives}/{tache.max_tentatives})", exc_info=True)
+        detenue.update(derniere_erreur=traceback.format_exc()[-5000:], bail_jusqua=None, **issue)
+        return False
+
+    battement.arreter()
+    if not detenue.update(statut='terminee', resultat=_serialisable(resultat),
+                          date_fin=timezone.now(), bail_jusqua=None):
+        logger.warning(f"Tâche {tache} terminée après l'expiration de son bail")
+    return True
+
+
+def travailler(arret=None, attente=None, une_fois=False, travailleur=None):
+    """
+    Boucle d'un travailleur : réserver, exécuter, recommencer.
+
+    Args:
+        arret: threading.Event demandant l'arrêt (après la tâche en cours)
+        attente: Pause quand la file est vide (défaut TACHES_ATTENTE)
+        une_fois: S'arrêter dès que la file est vide
+        travailleur: Identifiant du travailleur (défaut : machine/processus/thread)
+
+    Returns:
+        int: Nombre de tâches exécutées
+    """
+    arret = arret or threading.Event()
+    attente = TACHES_ATTENTE if attente is None else attente
+    travailleur = travailleur or identifiant_travailleur()
+    executees = 0
+    try:
+        while not arret.is_set():
+            try:
+                taches = reserver(travailleur)
+            except DatabaseError:
+                # Base indisponible ou verrouillée : nouvel essai après la pause
+                logger.exception(f"Réservation impossible pour {travailleur}")
+                connection.close()
+                arret.wait(attente)
+                continue
+            if not taches:
+                if une_fois:
+                    break
+                arret.wait(attente)
+                continue
+            for tache_reservee in taches:
+                executer(tache_reservee)
+                executees += 1
+    finally:
+        connection.close()
+    return executees
+
+
+# ============ TÂCHES DE L'APPLICATION ============
+
+@tache('emails_notifications', priorite=10)
+def emails_notifications(notification_ids):
+    """Envoyer les emails de notifications (les notifications déjà envoyées sont ignorées)"""
+    from .courriels import envoyer_notifications
+    from .models import Notification
+
+    notifications = Notification.objects.filter(
+        pk__in=notification_ids, envoyee_par_email=False
+    ).exclude(destinataire__email='').select_related('destinataire')
+    resultat = envoyer_notifications(list(notifications))
+    if resultat['echecs']:
+        # Les envois réussis sont marqués : le prochain essai ne reprend que les échecs
+        raise RuntimeError(f"{len(resultat['echecs'])} email(s) non envoyé(s) : {resultat['echecs'][:20]}")
+    return {'envoyes': len(resultat['envoyes']), 'par_seconde': round(resultat['par_seconde'], 1)}
+
+
+@tache('correspondances_declaration')
+def correspondances_declaration(declaration_id):
+    """Rapprocher une nouvelle déclaration des objets perdus/trouvés"""
+    from .matching import mettre_a_jour_correspondances
+    from .models import Declaration
+
+    declaration = Declaration.objects.filter(pk=declaration_id).first()
+    return {'enregistrees': mettre_a_jour_correspondances(declaration) if declaration else 0}
+
+
+@tache('diffuser_notifications', priorite=10)
+def diffuser_notifications(notification_ids):
+    """Publier sur WebSocket des notifications créées en masse"""
+    from .notifications import diffuser_notifications as diffuser
+
+    return {'diffusees': diffuser(notification_ids)}
+
+
+# Un seul essai : un nouvel essai renverrait le digest aux agents déjà servis (les refus
+# sont déjà réessayés message par message) ; bail couvrant l'envoi complet au débit limité
+@tache('digest_hebdomadaire', priorite=-5, max_tentatives=1, bail=3600)
+def digest_hebdomadaire():
+    """Digest hebdomadaire des agents"""
+    from .digest import envoyer_digest_hebdomadaire
+
+    return envoyer_digest_hebdomadaire()
+
+
+@tache('vider_compteurs_vues', priorite=-5)
+def vider_compteurs_vues():
+    """Écriture en base des vues tamponnées par les processus web de la machine"""
+    from .compteur_vues import vider
+
+    return {'vues': vider()}
+
+
+@tache('recalculer_statistiques_region', priorite=-5)
+def recalculer_statistiques_region(region_id):
+    """Recalcul complet des compteurs d'une région"""
+    from .models import StatistiqueRegion
+    from .statistiques import recalculer_zone
+
+    recalculer_zone(StatistiqueRegion, 'region', region_id)
+
+
+@tache('reconcilier_statistiques', priorite=-10, bail=1800)
+def reconcilier_statistiques():
+    """Correction des dérives des compteurs par zone"""
+    from .statistiques import reconcilier
+
+    return {'zones_corrigees': len(reconcilier())}
+
+
+@tache('agreger_statistiques_journalieres', priorite=-10, bail=1800)
+def agreger_statistiques_journalieres(jours=2):
+    """Recalcul des agrégats journaliers des derniers jours"""
+    from .statistiques import recalculer_jours
+
+    fin = timezone.localdate()
+    return {'lignes': recalculer_jours(fin - timedelta(days=max(jours, 1) - 1), fin)}
+
+
+@tache('purge_retention', priorite=-10, bail=3600)
+def purge_retention():
+    """Purge par tranches des données au-delà de leur durée de conservation"""
+    from .retention import POLITIQUES, purger
+
+    return {nom: purger(nom)['supprimes'] for nom in POLITIQUES}
+
+
+@tache('export_rapport_csv', priorite=5, bail=900)
+def export_rapport_csv(jours, demandeur_id):
+    """Générer le rapport CSV et notifier le demandeur avec le lien de téléchargement"""
+    from django.urls import reverse
+    from .exports import rapport_csv
+    from .models import Notification
+
+    nom = rapport_csv(jours)
+    Notification.objects.create(
+        destinataire_id=demandeur_id,
+        type_notification='systeme',
+        titre="Export CSV prêt",
+        message=f"Le rapport des {jours} derniers jours est prêt au téléchargement.",
+        lien_action=reverse('togo_admin:telecharger_export', args=[nom]),
+    )
+    return {'fichier': nom}
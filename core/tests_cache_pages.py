@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from . import compteur_vues
+from .cache_pages import statistiques_cache
+from .models import CommentaireAnonyme, Declaration, Utilisateur
+
+
+class CachePagesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        tampon = mock.patch.object(compteur_vues, 'VUES_TAMPON', os.path.join(dossier.name, 'vues.log'))
+        tampon.start()
+        self.addCleanup(tampon.stop)
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        self.declarations = [self.declarer(f'Sac {i}') for i in range(2)]
+
+    def declarer(self, nom):
+        return Declaration.objects.create(
+            type_declaration='perdu', nom_objet=nom, description='', lieu_precis='Lomé',
+            date_incident=date(2025, 1, 10), declarant=self.user, statut='publie'
+        )
+
+    def etat(self, url, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.get('X-Cache-Pages')
+
+    def test_home_is_cached_and_purged_on_write(self):
+        self.assertEqual([self.etat('/'), self.etat('/')], ['MISS', 'HIT'])
+        self.declarer('Montre')
+        self.assertEqual(self.etat('/'), 'MISS')
+        self.assertEqual(statistiques_cache()['accueil']['hit'], 1)
+
+    def test_purge_from_another_process_expires_cached_pages(self):
+        url = reverse('signalements_list')
+        self.assertEqual([self.etat(url), self.etat(url)], ['MISS', 'HIT'])
+        # Écriture traitée par un autre processus (travailleur de la file, autre processus gunicorn)
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             "from core import cache_pages; cache_pages.purger('signalements')"],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+        )
+        self.assertEqual(self.etat(url), 'MISS')
+
+    def test_query_parameters_are_normalized(self):
+        url = reverse('signalements_list')
+        self.assertEqual(self.etat(url, type='perdu', q=''), 'MISS')
+        self.assertEqual(self.etat(url, fbclid='abc', type='perdu', utm_source='fb'), 'HIT')
+        self.assertEqual(self.etat(url, type='trouve'), 'MISS')
+
+    def test_detail_purge_is_per_declaration(self):
+        premiere, seconde = [reverse('declaration_detail', args=[d.pk]) for d in self.declarations]
+        self.etat(premiere)
+        self.etat(seconde)
+        CommentaireAnonyme.objects.create(declaration=self.declarations[0], contenu='Vu près du marché')
+        self.assertEqual([self.etat(premiere), self.etat(seconde)], ['MISS', 'HIT'])
+        compteur_vues.vider()
+        self.declarations[1].refresh_from_db()
+        self.assertEqual(self.declarations[1].nombre_vues, 2)
+
+    def test_csrf_token_is_fresh_for_each_visitor(self):
+        url = reverse('declaration_detail', args=[self.declarations[0].pk])
+        self.etat(url)
+        visiteur = Client(enforce_csrf_checks=True)
+        resp = visiteur.get(url)
+        self.assertEqual(resp['X-Cache-Pages'], 'HIT')
+        jeton = resp.content.decode().split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+        post = visiteur.post(url, {'contenu': 'Je crois que c\'est le mien', 'csrfmiddlewaretoken': jeton})
+        self.assertEqual(post.status_code, 302)
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.force_login(self.user)
+        self.assertIsNone(self.etat('/'))
+        admin = Utilisateur.objects.create_user(username='admin2', password='x', role='admin')
+        self.client.force_login(admin)
+        vues = self.client.get(reverse('togo_admin:cache_pages_stats')).json()['vues']
+        self.assertEqual(vues['accueil']['bypass'], 1)
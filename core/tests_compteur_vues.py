@@ -0,0 +1,106 @@
+import os
+import tempfile
+import time
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import compteur_vues, taches
+from .models import Declaration, Tache, Utilisateur
+
+
+class CompteurVuesTests(TestCase):
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        tampon = mock.patch.object(compteur_vues, 'VUES_TAMPON', os.path.join(dossier.name, 'vues.log'))
+        tampon.start()
+        self.addCleanup(tampon.stop)
+        user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        self.declarations = [
+            Declaration.objects.create(
+                type_declaration='perdu', nom_objet=f'Sac {i}', description='', lieu_precis='Lomé',
+                date_incident=date(2025, 1, 10), declarant=user, statut='publie'
+            )
+            for i in range(3)
+        ]
+
+    def vues(self):
+        return [d.nombre_vues for d in Declaration.objects.order_by('pk')]
+
+    def test_views_are_buffered_then_written_in_grouped_updates(self):
+        premiere, seconde, troisieme = [d.pk for d in self.declarations]
+        for pk in [premiere, premiere, seconde, seconde, troisieme]:
+            compteur_vues.enregistrer_vue(pk)
+        self.assertEqual(self.vues(), [0, 0, 0])
+        self.assertEqual(compteur_vues.en_attente(premiere), 2)
+
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(compteur_vues.vider(), 5)
+        updates = [q['sql'] for q in requetes.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.vues(), [2, 2, 1])
+        self.assertEqual(compteur_vues.en_attente(), 0)
+
+    def test_overdue_buffer_is_flushed_by_next_view(self):
+        with mock.patch.object(compteur_vues, 'VUES_FLUSH_INTERVAL', 0):
+            resp = self.client.get(f'/declarations/{self.declarations[0].pk}/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.vues(), [1, 0, 0])
+
+    def test_failed_write_keeps_views_for_next_flush(self):
+        compteur_vues.enregistrer_vue(self.declarations[0].pk)
+        with mock.patch.object(compteur_vues, 'ecrire', side_effect=RuntimeError):
+            self.assertEqual(compteur_vues.vider(), 0)
+        self.assertEqual(compteur_vues.vider(), 1)
+        self.assertEqual(self.vues(), [1, 0, 0])
+
+    def test_buffer_is_flushed_by_management_command_and_queue_job(self):
+        # Vues tamponnées par un autre processus (le fichier est partagé)
+        with open(compteur_vues.VUES_TAMPON, 'a') as tampon:
+            tampon.write(f"{self.declarations[0].pk}\n{self.declarations[0].pk}\n")
+        out = StringIO()
+        call_command('vider_compteurs_vues', stdout=out)
+        self.assertIn('2 vue(s)', out.getvalue())
+        self.assertEqual(self.vues(), [2, 0, 0])
+
+        compteur_vues.enregistrer_vue(self.declarations[1].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            taches.planifier('vider_compteurs_vues')
+        taches.travailler(une_fois=True)
+        self.assertEqual(Tache.objects.get().resultat, {'vues': 1})
+        self.assertEqual(self.vues(), [2, 1, 0])
+
+    def test_abandoned_batch_is_written_by_next_flush(self):
+        lot = f"{compteur_vues.VUES_TAMPON}.1234.interrompu.lot"
+        with open(lot, 'w') as fichier:
+            fichier.write(f"{self.declarations[2].pk} 3\n")
+        # Lot récent : peut-être encore en cours d'écriture par un autre vidage
+        self.assertEqual(compteur_vues.vider(), 0)
+        ancien = time.time() - compteur_vues.VUES_LOT_ABANDONNE
+        os.utime(lot, (ancien, ancien))
+        self.assertEqual(compteur_vues.vider(), 3)
+        self.assertFalse(os.path.exists(lot))
+        self.assertEqual(self.vues(), [0, 0, 3])
+
+    def test_views_appended_to_batch_during_flush_are_kept(self):
+        compteur_vues.enregistrer_vue(self.declarations[0].pk)
+        ecrire = compteur_vues.ecrire
+
+        def ecrire_puis_vue_tardive(vues):
+            # Un processus qui avait ouvert le tampon avant son renommage
+            lot, = [nom for nom in os.listdir(os.path.dirname(compteur_vues.VUES_TAMPON)) if nom.endswith('.lot')]
+            with open(os.path.join(os.path.dirname(compteur_vues.VUES_TAMPON), lot), 'a') as fichier:
+                fichier.write(f"{self.declarations[1].pk}\n")
+            ecrire(vues)
+
+        with mock.patch.object(compteur_vues, 'ecrire', side_effect=ecrire_puis_vue_tardive):
+            self.assertEqual(compteur_vues.vider(), 1)
+        self.assertEqual(compteur_vues.en_attente(self.declarations[1].pk), 1)
+        self.assertEqual(compteur_vues.vider(), 1)
+        self.assertEqual(self.vues(), [1, 1, 0])
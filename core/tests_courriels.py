@@ -0,0 +1,62 @@
+import time
+from unittest import mock
+
+from django.core.mail import send_mail
+from django.test import TestCase, override_settings
+
+from . import courriels
+from .models import Notification, Utilisateur
+from .smtp_local import ServeurSMTPLocal
+
+
+def smtp_local(serveur):
+    return override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1', EMAIL_PORT=serveur.port,
+        EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+    )
+
+
+class EnvoiGroupeTests(TestCase):
+    def setUp(self):
+        self.citoyens = [
+            Utilisateur.objects.create_user(username=f'citoyen{i}', password='x', email=f'citoyen{i}@example.tg')
+            for i in range(20)
+        ]
+        Utilisateur.objects.create_user(username='sans_email', password='x')
+        for utilisateur in Utilisateur.objects.all():
+            Notification.objects.create(destinataire=utilisateur, type_notification='systeme',
+                                        titre='Objet retrouvé', message='Passez au commissariat')
+
+    def notifications(self, **filtre):
+        return list(Notification.objects.filter(**filtre).select_related('destinataire').order_by('pk'))
+
+    def test_batch_uses_one_connection_and_beats_send_mail(self):
+        with ServeurSMTPLocal(delai_connexion=0.01) as serveur, smtp_local(serveur):
+            resultat = courriels.envoyer_notifications(self.notifications())
+            self.assertEqual((serveur.connexions, len(serveur.messages)), (1, 20))
+
+        self.assertEqual((len(resultat['envoyes']), resultat['echecs']), (20, []))
+        self.assertEqual(Notification.objects.filter(envoyee_par_email=True).count(), 20)
+        self.assertIn(b'Passez au commissariat', serveur.messages[0][1])
+
+        # Référence : une connexion (et son coût d'ouverture) par message
+        with ServeurSMTPLocal(delai_connexion=0.01) as reference, smtp_local(reference):
+            debut = time.perf_counter()
+            for citoyen in self.citoyens:
+                send_mail('Objet retrouvé', 'Passez au commissariat', None, [citoyen.email])
+            par_message = len(self.citoyens) / (time.perf_counter() - debut)
+            self.assertEqual(reference.connexions, 20)
+        self.assertGreater(resultat['par_seconde'], par_message * 2)
+
+    @mock.patch.object(courriels, 'COURRIELS_DELAI_ESSAI', 0)
+    def test_refused_message_is_retried_alone_and_rate_is_limited(self):
+        with ServeurSMTPLocal(refuser_une_fois=['citoyen3@example.tg']) as serveur, smtp_local(serveur):
+            resultat = courriels.envoyer_notifications(self.notifications(destinataire__in=self.citoyens[:5]), debit=50)
+            self.assertEqual((serveur.connexions, len(serveur.messages)), (1, 5))
+            self.assertEqual(sorted(d for destinataires, _ in serveur.messages for d in destinataires),
+                             [f'citoyen{i}@example.tg' for i in range(5)])
+
+        self.assertEqual(len(resultat['envoyes']), 5)
+        # 6 essais à 50 emails/s : au moins 5 intervalles de 20 ms
+        self.assertGreaterEqual(resultat['duree'], 0.1)
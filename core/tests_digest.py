@@ -0,0 +1,73 @@
+from datetime import date
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import digest
+from .models import Declaration, Prefecture, Reclamation, Region, Utilisateur
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class DigestHebdomadaireTests(TestCase):
+    def setUp(self):
+        maritime = Region.objects.create(nom='Maritime')
+        plateaux = Region.objects.create(nom='Plateaux')
+        golfe = Prefecture.objects.create(nom='Golfe', region=maritime)
+        citoyen = Utilisateur.objects.create_user(username='citoyen1', password='x')
+
+        def agent(nom, **kwargs):
+            return Utilisateur.objects.create_user(username=nom, password='x', role='agent',
+                                                   email=f'{nom}@example.tg', **kwargs)
+
+        self.regional = agent('regional', region=maritime)
+        self.prefectoral = agent('prefectoral', prefecture=golfe)
+        self.national = agent('national')
+        self.calme = agent('calme', region=plateaux)
+
+        def declarer(**kwargs):
+            return Declaration.objects.create(
+                type_declaration='perdu', nom_objet='Sac', description='', lieu_precis='Lomé',
+                date_incident=date(2025, 1, 10), declarant=citoyen, **kwargs
+            )
+
+        golfe_declaration = declarer(region=maritime, prefecture=golfe,
+                                     agent_validateur=self.regional, date_publication=timezone.now())
+        declarer(region=maritime)
+        sans_region = declarer()
+        Reclamation.objects.create(declaration=golfe_declaration, reclamant=citoyen, justification='À moi',
+                                   agent_traitant=self.prefectoral, date_traitement=timezone.now())
+        Reclamation.objects.create(declaration=sans_region, reclamant=citoyen, justification='À moi')
+
+    def test_stats_follow_each_agent_scope(self):
+        agents = list(digest.destinataires())
+        with self.assertNumQueries(4):
+            statistiques = digest.statistiques_agents(agents, timezone.now() - timezone.timedelta(days=7), timezone.now())
+
+        def ligne(agent):
+            return [statistiques[agent.pk][nom] for nom in digest.STATISTIQUES]
+
+        self.assertEqual(ligne(self.regional), [2, 1, 1, 0])
+        self.assertEqual(ligne(self.prefectoral), [1, 0, 1, 1])
+        # Sans zone : toutes les réclamations, pas seulement celles sans région
+        self.assertEqual(ligne(self.national), [3, 0, 2, 0])
+        self.assertEqual(ligne(self.calme), [0, 0, 0, 0])
+
+    def test_query_count_does_not_grow_with_agents(self):
+        with self.assertNumQueries(5):
+            rapport = digest.envoyer_digest_hebdomadaire(taille_lot=2)
+        self.assertEqual((rapport['agents'], rapport['avec_activite'], rapport['envoyes']), (4, 3, 3))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['national@example.tg', 'prefectoral@example.tg', 'regional@example.tg'])
+
+        for i in range(20):
+            Utilisateur.objects.create_user(username=f'agent{i}', password='x', role='agent', email=f'agent{i}@example.tg')
+        with self.assertNumQueries(5):
+            self.assertEqual(digest.envoyer_digest_hebdomadaire(envoyer=False)['avec_activite'], 23)
+
+    def test_unreachable_smtp_counts_failures_instead_of_raising(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=ConnectionRefusedError):
+            rapport = digest.envoyer_digest_hebdomadaire(taille_lot=2)
+        self.assertEqual((rapport['envoyes'], rapport['echecs']), (0, 3))
+        self.assertEqual(mail.outbox, [])
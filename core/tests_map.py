@@ -0,0 +1,124 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from . import geo
+from .models import Declaration, Utilisateur
+
+TOGO = '0.5,5.9,1.9,11.2'
+LOME = '1.20,6.10,1.25,6.15'
+
+
+class GeohashTests(TestCase):
+    def test_encode_geohash(self):
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.encode_geohash(None, 1.2), '')
+
+    def test_covering_cells_contain_corners(self):
+        bbox = geo.parse_bbox(LOME)
+        cellules = geo.cellules_couvrantes(bbox, 5)
+        for lat, lon in [(6.10, 1.20), (6.15, 1.25), (6.125, 1.225)]:
+            self.assertIn(geo.encode_geohash(lat, lon, 5), cellules)
+
+
+class MapDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        self.lome = [
+            self.declarer('perdu', Decimal('6.1300'), Decimal('1.2200')),
+            self.declarer('trouve', Decimal('6.1310'), Decimal('1.2210')),
+        ]
+        self.kara = self.declarer('perdu', Decimal('9.5500'), Decimal('1.1900'))
+
+    def declarer(self, type_declaration, lat, lon):
+        return Declaration.objects.create(
+            type_declaration=type_declaration, nom_objet='Sac', description='Sac noir', lieu_precis='Lomé',
+            date_incident=date(2025, 1, 10), declarant=self.user, statut='publie', latitude=lat, longitude=lon
+        )
+
+    def get(self, **params):
+        resp = self.client.get('/api/signalements/map-data/', params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_geohash_is_maintained_on_save(self):
+        declaration = self.lome[0]
+        self.assertEqual(declaration.geohash, geo.encode_geohash(6.13, 1.22))
+        declaration.latitude = Decimal('9.5500')
+        declaration.save(update_fields=['latitude'])
+        declaration.refresh_from_db()
+        self.assertEqual(declaration.geohash, geo.encode_geohash(9.55, 1.22))
+
+    def test_low_zoom_returns_clusters(self):
+        reponse = self.get(bbox=TOGO, zoom=7)
+        self.assertEqual(reponse['mode'], 'groupes')
+        self.assertEqual(sorted(reponse['data']['count']), [1, 2])
+        self.assertEqual(sum(reponse['data']['perdu']), 2)
+
+    def test_high_zoom_returns_points_in_bbox(self):
+        reponse = self.get(bbox=LOME, zoom=16, type='trouve')
+        self.assertEqual(reponse['mode'], 'points')
+        self.assertEqual(reponse['data']['id'], [self.lome[1].id])
+
+    def test_cache_is_invalidated_on_write(self):
+        self.assertEqual(len(self.get(bbox=LOME, zoom=16)['data']['id']), 2)
+        self.declarer('trouve', Decimal('6.1320'), Decimal('1.2220'))
+        self.assertEqual(len(self.get(bbox=LOME, zoom=16)['data']['id']), 3)
+
+    def test_without_bbox_keeps_full_list(self):
+        self.assertEqual(len(self.get()), 3)
+
+    def test_invalid_bbox(self):
+        resp = self.client.get('/api/signalements/map-data/', {'bbox': 'a,b', 'zoom': 3})
+        self.assertEqual(resp.status_code, 400)
+
+
+class ProximiteTests(TestCase):
+    def setUp(self):
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        # Points à ~0, 1.1, 2.2, ... km au nord du centre de Lomé
+        self.declarations = [
+            Declaration.objects.create(
+                type_declaration='trouve', nom_objet=f'Objet {i}', description='', lieu_precis='Lomé',
+                date_incident=date(2025, 1, 10), declarant=self.user, statut='publie',
+                latitude=Decimal('6.130000') + Decimal('0.01') * i, longitude=Decimal('1.220000')
+            )
+            for i in range(6)
+        ]
+
+    def get(self, **params):
+        params.setdefault('lat', 6.13)
+        params.setdefault('lon', 1.22)
+        return self.client.get('/api/signalements/proximite/', params)
+
+    def test_bounding_box_contains_radius(self):
+        lat_min, lat_max, lon_min, lon_max = geo.rectangle_englobant(6.13, 1.22, 10)
+        for lat, lon in [(lat_min, 1.22), (lat_max, 1.22), (6.13, lon_min), (6.13, lon_max)]:
+            self.assertAlmostEqual(float(geo.distances_km(6.13, 1.22, [lat], [lon])[0]), 10, places=3)
+
+    def test_results_sorted_by_distance_within_radius(self):
+        data = self.get(radius=3.5).json()
+        ids = [r['id'] for r in data['results']]
+        self.assertEqual(ids, [d.id for d in self.declarations[:4]])
+        distances = [r['distance_km'] for r in data['results']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertIsNone(data['next_cursor'])
+
+    def test_cursor_pagination(self):
+        vus = []
+        params = {'radius': 50, 'limit': 2}
+        for _ in range(3):
+            data = self.get(**params).json()
+            vus.extend(r['id'] for r in data['results'])
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(vus, [d.id for d in self.declarations])
+        self.assertIsNone(params['cursor'])
+
+    def test_type_filter_and_invalid_params(self):
+        self.assertEqual(self.get(type='perdu').json()['results'], [])
+        self.assertEqual(self.get(lat='abc').status_code, 400)
+        self.assertEqual(self.get(radius=500).status_code, 400)
+        self.assertEqual(self.get(cursor='!!').status_code, 400)
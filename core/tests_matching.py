@@ -0,0 +1,104 @@
+from datetime import date
+from io import StringIO
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from . import matching, taches
+from .models import (
+    Region, Prefecture, StructureLocale, CategorieObjet, Declaration,
+    CorrespondanceDeclaration, Tache, Utilisateur,
+)
+
+
+class MatchingTests(TestCase):
+    def setUp(self):
+        self.region = Region.objects.create(nom='Maritime')
+        self.prefecture = Prefecture.objects.create(nom='Golfe', region=self.region)
+        self.structure = StructureLocale.objects.create(nom='Commissariat Central', type_structure='commissariat', prefecture=self.prefecture)
+        self.telephones = CategorieObjet.objects.create(nom='Téléphones')
+        self.cles = CategorieObjet.objects.create(nom='Clés')
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+
+    def declarer(self, type_declaration, nom, jour, categorie=None, lat=None, lon=None, **kwargs):
+        return Declaration.objects.create(
+            type_declaration=type_declaration, nom_objet=nom, description=kwargs.pop('description', nom),
+            lieu_precis='Lomé', date_incident=jour, declarant=self.user, categorie=categorie,
+            latitude=lat, longitude=lon, region=self.region, prefecture=self.prefecture,
+            structure_locale=self.structure, statut='publie', **kwargs
+        )
+
+    def test_best_match_is_ranked_first(self):
+        perdu = self.declarer('perdu', 'Téléphone Samsung noir', date(2025, 3, 1), self.telephones,
+                              Decimal('6.130000'), Decimal('1.220000'))
+        bon = self.declarer('trouve', 'Samsung noir', date(2025, 3, 2), self.telephones,
+                            Decimal('6.131000'), Decimal('1.221000'))
+        self.declarer('trouve', 'Trousseau de clés', date(2025, 3, 2), self.cles)
+        self.declarer('trouve', 'Téléphone Samsung', date(2024, 1, 1), self.telephones)  # hors fenêtre
+
+        matching.mettre_a_jour_correspondances(perdu)
+
+        correspondances = matching.correspondances_pour(perdu)
+        self.assertEqual(correspondances[0].autre, bon)
+        self.assertGreater(correspondances[0].score, 0.8)
+        self.assertNotIn(date(2024, 1, 1), [c.autre.date_incident for c in correspondances])
+        # Détails recalculés pour les seules paires retenues : cohérents avec le score global
+        total = sum(matching.POIDS.values())
+        for c in correspondances:
+            self.assertAlmostEqual(c.score, sum(matching.POIDS[k] * v for k, v in c.details.items()) / total, places=2)
+
+    def test_new_declaration_is_matched_on_commit(self):
+        perdu = self.declarer('perdu', 'Clés de voiture Toyota', date(2025, 3, 1), self.cles)
+        with self.captureOnCommitCallbacks(execute=True):
+            trouve = self.declarer('trouve', 'Clés Toyota', date(2025, 3, 3), self.cles)
+        self.assertFalse(CorrespondanceDeclaration.objects.exists())
+        taches.travailler(une_fois=True)
+
+        correspondance = CorrespondanceDeclaration.objects.get()
+        self.assertEqual((correspondance.declaration_perdue, correspondance.declaration_trouvee), (perdu, trouve))
+        self.assertEqual(set(correspondance.details), set(matching.CRITERES))
+
+    def test_edited_declaration_is_matched_again(self):
+        perdu = self.declarer('perdu', 'Clés de voiture Toyota', date(2025, 3, 1), self.cles)
+        trouve = self.declarer('trouve', 'Portefeuille', date(2025, 3, 3), self.telephones,
+                               description='Portefeuille en cuir')
+        Tache.objects.all().delete()
+
+        # Champs sans effet sur le rapprochement : rien à recalculer
+        with self.captureOnCommitCallbacks(execute=True):
+            trouve.nombre_vues = 3
+            trouve.save(update_fields=['nombre_vues'])
+        self.assertFalse(Tache.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trouve.nom_objet = trouve.description = 'Clés Toyota'
+            trouve.categorie = self.cles
+            trouve.save()
+        taches.travailler(une_fois=True)
+        self.assertEqual(matching.correspondances_pour(perdu)[0].autre, trouve)
+
+    def test_backfill_command(self):
+        for couleur in ['rouge', 'bleu', 'vert', 'jaune', 'noir']:
+            self.declarer('perdu', f'Sac à dos {couleur}', date(2025, 3, 1), self.cles)
+            self.declarer('trouve', f'Sac à dos {couleur}', date(2025, 3, 2), self.cles)
+
+        call_command('calculer_correspondances', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(CorrespondanceDeclaration.objects.count(), 25)
+        for trouve in Declaration.objects.filter(type_declaration='trouve'):
+            meilleure = matching.correspondances_pour(trouve)[0]
+            self.assertEqual(meilleure.autre.nom_objet, trouve.nom_objet)
+
+    def test_matches_shown_on_agent_detail(self):
+        perdu = self.declarer('perdu', 'Portefeuille marron', date(2025, 3, 1), self.cles)
+        trouve = self.declarer('trouve', 'Portefeuille marron', date(2025, 3, 1), self.cles)
+        matching.mettre_a_jour_correspondances(trouve)
+
+        agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent',
+                                                structure_locale=self.structure)
+        self.client.force_login(agent)
+        resp = self.client.get(reverse('togo_agent:signalement_detail', args=[trouve.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([c.autre for c in resp.context['correspondances']], [perdu])
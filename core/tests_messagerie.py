@@ -0,0 +1,230 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import messagerie
+from .consumers import MessagerieConsumer
+from .routing import websocket_urlpatterns
+from .models import Conversation, Message, Prefecture, Region, StructureLocale, Utilisateur
+
+
+class CompteursNonLusTests(TestCase):
+    def setUp(self):
+        region = Region.objects.create(nom='Maritime')
+        structure = StructureLocale.objects.create(
+            nom='Commissariat', type_structure='commissariat',
+            prefecture=Prefecture.objects.create(nom='Golfe', region=region)
+        )
+        self.agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent', structure_locale=structure)
+        self.citoyen = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        self.conversation = Conversation.objects.create(agent=self.agent, declarant=self.citoyen)
+
+    def envoyer(self, sender, receiver, contenu='Bonjour'):
+        return Message.objects.create(conversation=self.conversation, sender=sender, receiver=receiver, contenu=contenu)
+
+    def compteurs(self):
+        self.conversation.refresh_from_db()
+        return self.conversation.non_lus_agent, self.conversation.non_lus_declarant
+
+    def test_counters_follow_sends_and_reads(self):
+        self.envoyer(self.citoyen, self.agent)
+        self.envoyer(self.citoyen, self.agent)
+        message = self.envoyer(self.agent, self.citoyen)
+        # Un enregistrement complet d'une instance périmée n'écrase pas les compteurs
+        Conversation.objects.get(pk=self.conversation.pk).save()
+        self.assertEqual(self.compteurs(), (2, 1))
+
+        message.mark_as_read()
+        message.mark_as_read()
+        self.assertEqual(self.compteurs(), (2, 0))
+
+        self.client.force_login(self.agent)
+        resp = self.client.post(reverse('api_mark_conversation_read', args=[self.conversation.pk]))
+        self.assertEqual(resp.json()['marked_count'], 2)
+        self.assertEqual(self.compteurs(), (0, 0))
+
+    def test_agent_inbox_reads_stored_counters(self):
+        self.envoyer(self.citoyen, self.agent)
+        autre = Conversation.objects.create(agent=self.agent, declarant=Utilisateur.objects.create_user(username='citoyen2'))
+        self.client.force_login(self.agent)
+        # La conversation ouverte est marquée lue, l'autre garde son compteur
+        Message.objects.create(conversation=autre, sender=autre.declarant, receiver=self.agent, contenu='Bonsoir')
+        resp = self.client.get(reverse('togo_agent:messagerie'), {'conversation_id': self.conversation.pk})
+        non_lus = {c.pk: c.non_lus_agent for c in resp.context['conversations']}
+        self.assertEqual(non_lus, {self.conversation.pk: 0, autre.pk: 1})
+
+    def test_reconcile_repairs_drift(self):
+        self.envoyer(self.citoyen, self.agent)
+        Message.objects.update(is_read=True)
+        call_command('reconcilier_non_lus', '--dry-run', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.compteurs(), (1, 0))
+        call_command('reconcilier_non_lus', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.compteurs(), (0, 0))
+
+    def test_inbox_summary_is_written_with_each_message(self):
+        self.envoyer(self.citoyen, self.agent, 'Premier')
+        dernier = self.envoyer(self.agent, self.citoyen, 'x' * 120)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message, dernier)
+        self.assertEqual(self.conversation.last_message_preview, 'x' * 100)
+        self.assertEqual((self.conversation.last_message_sender, self.conversation.message_count), (self.agent, 2))
+
+        self.client.force_login(self.citoyen)
+        Conversation.objects.create(agent=self.agent, declarant=self.citoyen)
+        with self.assertNumQueries(3):  # session, utilisateur, conversations
+            data = self.client.get(reverse('api_conversations')).json()
+        resume = next(c for c in data if c['id'] == self.conversation.pk)
+        self.assertEqual((resume['unread_count'], resume['total_messages']), (1, 2))
+        self.assertEqual(resume['last_message']['contenu'], 'x' * 50 + '...')
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_mark_read_advances_watermark_and_broadcasts_it(self):
+        premier = self.envoyer(self.citoyen, self.agent)
+        self.envoyer(self.citoyen, self.agent)
+        layer = get_channel_layer()
+        canal = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'chat_{self.conversation.pk}', canal)
+
+        self.client.force_login(self.agent)
+        url = reverse('api_mark_conversation_read', args=[self.conversation.pk])
+        data = self.client.post(url, {'message_id': premier.pk}).json()
+        self.assertEqual((data['marked_count'], data['last_read_message_id']), (1, premier.pk))
+        evenement = async_to_sync(layer.receive)(canal)
+        self.assertEqual((evenement['type'], evenement['last_read_message_id']), ('messages_read', premier.pk))
+
+        self.assertEqual(self.client.post(url).json()['marked_count'], 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual((self.conversation.lu_jusqua_agent, self.conversation.non_lus_agent), (self.conversation.last_message_id, 0))
+        # Rien à marquer : une seule lecture, aucune écriture
+        with self.assertNumQueries(1):
+            self.assertEqual(self.conversation.marquer_comme_lus(self.agent), 0)
+
+    def test_polling_returns_only_new_messages_or_304(self):
+        premier = self.envoyer(self.citoyen, self.agent)
+        self.client.force_login(self.agent)
+        url = reverse('togo_agent:get_conversation_messages', args=[self.conversation.pk])
+
+        resp = self.client.get(url)
+        self.assertEqual([m['id'] for m in resp.json()['messages']], [premier.pk])
+        self.assertEqual(self.compteurs(), (0, 0))
+        etag = resp['ETag']
+
+        # Polling inactif : une recherche de la conversation, aucune écriture
+        with self.assertNumQueries(3):  # session, utilisateur, conversation
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {'since_id': premier.pk}).status_code, 304)
+
+        second = self.envoyer(self.citoyen, self.agent)
+        resp = self.client.get(url, {'since_id': premier.pk})
+        self.assertEqual([m['id'] for m in resp.json()['messages']], [second.pk])
+        self.assertNotEqual(resp['ETag'], etag)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_history_is_served_in_backward_windows(self):
+        envoyes = [self.envoyer(self.citoyen, self.agent, f'Message {i}').pk for i in range(5)]
+        self.client.force_login(self.agent)
+        patcher = mock.patch.object(messagerie, 'HISTORIQUE_PAR_PAGE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        resp = self.client.get(reverse('togo_agent:messagerie'), {'conversation_id': self.conversation.pk})
+        self.assertEqual([m.pk for m in resp.context['messages_conv']], envoyes[3:])
+
+        url = reverse('togo_agent:get_conversation_messages', args=[self.conversation.pk])
+        recus, curseur = [], resp.context['curseur_historique']
+        while curseur:
+            data = self.client.get(url, {'before': curseur}).json()
+            recus[:0], curseur = [m['id'] for m in data['messages']], data['older_cursor']
+        self.assertEqual(recus, envoyes[:3])
+
+        api = self.client.get(reverse('api_conversation_messages', args=[self.conversation.pk]), {'per_page': 3})
+        self.assertEqual([m['id'] for m in api.json()], envoyes[2:])
+        api = self.client.get(api.wsgi_request.path, {'per_page': 3, 'before': api['X-Older-Cursor']})
+        self.assertEqual([m['id'] for m in api.json()], envoyes[:2])
+        self.assertNotIn('X-Older-Cursor', api)
+
+    def test_consumer_send_is_one_insert_and_one_update(self):
+        consumer = MessagerieConsumer()
+        consumer.user = self.agent
+        conversation = async_to_sync(consumer.charger_conversation)(self.conversation.pk)
+        with CaptureQueriesContext(connection) as requetes:
+            message = async_to_sync(consumer.create_message)(conversation, 'Bonjour')
+        ecritures = [q['sql'].split()[0] for q in requetes if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(ecritures, ['INSERT', 'UPDATE'])
+        self.assertEqual(message.receiver.get_full_name(), self.citoyen.get_full_name())
+        self.conversation.refresh_from_db()
+        self.assertEqual((self.conversation.last_message_id, self.conversation.updated_at), (message.pk, message.created_at))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MessagerieMultiplexeeTests(TransactionTestCase):
+    def setUp(self):
+        self.agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent')
+        self.citoyens = [Utilisateur.objects.create_user(username=f'citoyen{i}', password='x') for i in range(2)]
+        self.conversations = [Conversation.objects.create(agent=self.agent, declarant=c) for c in self.citoyens]
+
+    async def connecter(self, user, chemin='/ws/messagerie/'):
+        communicator = ApplicationCommunicator(URLRouter(websocket_urlpatterns), {
+            'type': 'websocket', 'path': chemin, 'user': user,
+            'headers': [], 'query_string': b'', 'subprotocols': [],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(2))['type'], 'websocket.accept')
+        return communicator
+
+    async def envoyer(self, communicator, trame):
+        await communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(trame)})
+
+    async def recevoir(self, communicator):
+        return json.loads((await communicator.receive_output(2))['text'])
+
+    def test_one_socket_routes_every_conversation(self):
+        async def scenario():
+            agent = await self.connecter(self.agent)
+            premier = await self.connecter(self.citoyens[0], f'/ws/chat/{self.conversations[0].pk}/')
+            second = await self.connecter(self.citoyens[1])
+
+            # Trames de l'ancienne route : conversation implicite
+            await self.envoyer(premier, {'action': 'send_message', 'message': 'Bonjour'})
+            await self.envoyer(second, {'action': 'typing', 'conversation_id': self.conversations[1].pk, 'is_typing': True})
+            recues = {}
+            while len(recues) < 2:
+                trame = await self.recevoir(agent)
+                recues.setdefault(trame['type'], trame['conversation_id'])
+                if trame['type'] == 'user_status':
+                    del recues['user_status']
+            self.assertEqual(recues, {'message': self.conversations[0].pk, 'typing': self.conversations[1].pk})
+
+            # Hors de ses conversations : refusé ; après désabonnement : plus rien
+            await self.envoyer(second, {'action': 'subscribe', 'conversation_id': self.conversations[0].pk})
+            self.assertEqual((await self.recevoir(second))['type'], 'error')
+            await self.envoyer(agent, {'action': 'unsubscribe', 'conversation_id': self.conversations[1].pk})
+            self.assertEqual((await self.recevoir(agent))['type'], 'unsubscribed')
+            await self.envoyer(second, {'action': 'typing', 'conversation_id': self.conversations[1].pk, 'is_typing': False})
+            self.assertTrue(await agent.receive_nothing())
+
+            for communicator in (agent, premier, second):
+                await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+                await communicator.wait(2)
+
+        async_to_sync(scenario)()
+        self.assertEqual(self.conversations[0].messages.count(), 1)
+
+    def test_legacy_chat_route_keeps_error_frame_shape(self):
+        async def scenario():
+            citoyen = await self.connecter(self.citoyens[0], f'/ws/chat/{self.conversations[0].pk}/')
+            await self.envoyer(citoyen, {'action': 'send_message', 'message': '  '})
+            self.assertEqual(await self.recevoir(citoyen), {'type': 'error', 'message': 'Le message ne peut pas être vide'})
+            await citoyen.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await citoyen.wait(2)
+
+        async_to_sync(scenario)()
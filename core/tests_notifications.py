@@ -0,0 +1,80 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import notifications, taches
+from .models import Notification, Tache, Utilisateur
+from .utils import create_notification
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationsTempsReelTests(TestCase):
+    def setUp(self):
+        self.agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent')
+        self.layer = get_channel_layer()
+        self.canal = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(notifications.groupe(self.agent.pk), self.canal)
+
+    def recevoir(self):
+        return async_to_sync(self.layer.receive)(self.canal)
+
+    def compteur(self):
+        self.agent.refresh_from_db()
+        return self.agent.notifications_non_lues
+
+    def test_creation_is_pushed_after_commit_with_counter(self):
+        with self.captureOnCommitCallbacks() as rappels:
+            notification = create_notification(self.agent, 'systeme', 'Maintenance', 'Ce soir à 22h')
+            self.assertEqual(self.compteur(), 1)
+        # Rien n'est publié avant la validation de la transaction
+        self.assertEqual(len(rappels), 1)
+        rappels[0]()
+        evenement = self.recevoir()
+        self.assertEqual((evenement['type'], evenement['data']['id']), ('notification', notification.pk))
+        self.assertEqual(evenement['data']['notifications_non_lues'], 1)
+
+        # Un enregistrement complet d'une instance périmée n'écrase pas le compteur
+        Utilisateur.objects.get(pk=self.agent.pk).save()
+        self.assertEqual(self.compteur(), 1)
+
+    def test_reads_and_deletes_decrement_counter(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            premiere, seconde = [create_notification(self.agent, 'systeme', f'Info {i}', '') for i in range(2)]
+        self.client.force_login(self.agent)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(2):
+                self.client.post(reverse('togo_agent:ajax_marquer_notification_lue', args=[premiere.pk]))
+            seconde.delete()
+        self.assertEqual(self.compteur(), 0)
+        evenements = [self.recevoir() for _ in range(4)]
+        self.assertEqual([e['type'] for e in evenements], ['notification'] * 2 + ['notification_count'] * 2)
+        self.assertEqual(evenements[-1]['data'], {'notifications_non_lues': 0})
+
+    def test_reconcile_repairs_drift(self):
+        Notification.objects.create(destinataire=self.agent, type_notification='systeme', titre='Info', message='')
+        Utilisateur.objects.filter(pk=self.agent.pk).update(notifications_non_lues=5)
+        self.assertEqual(notifications.reconcilier(corriger=False), [{'utilisateur_id': self.agent.pk, 'stocke': 5, 'reel': 1}])
+        notifications.reconcilier()
+        self.assertEqual((self.compteur(), notifications.reconcilier(corriger=False)), (1, []))
+
+    def test_bulk_creation_uses_batches_and_delivers_after_commit(self):
+        citoyens = [Utilisateur.objects.create_user(username=f'citoyen{i}', password='x') for i in range(5)]
+        destinataires = Utilisateur.objects.filter(pk__in=[self.agent.pk] + [c.pk for c in citoyens])
+        with self.captureOnCommitCallbacks() as rappels:
+            # Savepoint, sélection des destinataires, puis INSERT + UPDATE des compteurs par lot de 4
+            with self.assertNumQueries(7):
+                resultat = notifications.creer_notifications(destinataires, 'systeme', 'Annonce', 'Maintenance', taille_lot=4)
+        self.assertEqual(resultat['crees'], 6)
+        self.assertGreater(resultat['lignes_par_seconde'], 0)
+        self.assertEqual(self.compteur(), 1)
+
+        # Une tâche de diffusion par lot, avec les seuls identifiants
+        self.assertEqual(len(rappels), 2)
+        for rappel in rappels:
+            rappel()
+        self.assertEqual(sorted(len(t.arguments['args'][0]) for t in Tache.objects.all()), [2, 4])
+        self.assertEqual(taches.travailler(une_fois=True), 2)
+        evenement = self.recevoir()
+        self.assertEqual((evenement['data']['titre'], evenement['data']['notifications_non_lues']), ('Annonce', 1))
+        self.assertEqual(notifications.reconcilier(corriger=False), [])
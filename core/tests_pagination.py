@@ -0,0 +1,84 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import Declaration, Region, Prefecture, StructureLocale, Utilisateur
+from .pagination import PaginateurCurseur, encoder_curseur
+
+
+class PaginateurCurseurTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        # Deux dates d'incident par jour : les égalités sont départagées par l'id
+        self.declarations = [
+            Declaration.objects.create(
+                type_declaration='perdu', nom_objet=f'Objet {i}', description='', lieu_precis='Lomé',
+                date_incident=date(2025, 1, 1 + i // 2), declarant=self.user
+            )
+            for i in range(7)
+        ]
+        self.ordre = sorted(self.declarations, key=lambda d: (d.date_incident, d.id))
+
+    def test_forward_and_backward(self):
+        paginateur = PaginateurCurseur(Declaration.objects.order_by('date_incident'), 3)
+        pages = [paginateur.page()]
+        while pages[-1].has_next():
+            pages.append(paginateur.page(pages[-1].next_cursor))
+        self.assertEqual([d for p in pages for d in p], self.ordre)
+        self.assertFalse(pages[0].has_previous())
+
+        precedente = paginateur.page(pages[-1].previous_cursor)
+        self.assertEqual(list(precedente), self.ordre[3:6])
+        self.assertTrue(precedente.has_next())
+        self.assertTrue(precedente.has_previous())
+
+    def test_invalid_or_stale_cursor_returns_first_page(self):
+        paginateur = PaginateurCurseur(Declaration.objects.order_by('date_incident'), 3)
+        jeton = paginateur.page().next_cursor
+        for mauvais in ['???', encoder_curseur({'v': [1]}), PaginateurCurseur(Declaration.objects.order_by('nom_objet'), 3).page().next_cursor]:
+            self.assertEqual(list(paginateur.page(mauvais)), self.ordre[:3])
+        self.assertEqual(list(paginateur.page(jeton)), self.ordre[3:6])
+
+    def test_totals(self):
+        qs = Declaration.objects.order_by('-date_declaration')
+        self.assertIsNone(PaginateurCurseur(qs, 3).page().total)
+        self.assertEqual(PaginateurCurseur(qs, 3, total='exact').page().total, 7)
+        page = PaginateurCurseur(qs, 3, total='cache').page()
+        self.assertEqual((page.total, page.total_approx), (7, True))
+
+
+class CursorViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        region = Region.objects.create(nom='Maritime')
+        prefecture = Prefecture.objects.create(nom='Golfe', region=region)
+        self.structure = StructureLocale.objects.create(nom='Commissariat', type_structure='commissariat', prefecture=prefecture)
+        citoyen = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        for i in range(25):
+            Declaration.objects.create(
+                type_declaration='trouve', nom_objet=f'Objet {i}', description='', lieu_precis='Lomé',
+                date_incident=date(2025, 1, 1), declarant=citoyen, structure_locale=self.structure
+            )
+
+    def test_agent_mes_signalements(self):
+        agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent', structure_locale=self.structure)
+        self.client.force_login(agent)
+        url = reverse('togo_agent:mes_signalements')
+        page = self.client.get(url).context['page_obj']
+        self.assertEqual((len(page), page.total), (20, 25))
+        suite = self.client.get(url, {'cursor': page.next_cursor}).context['page_obj']
+        self.assertEqual(len(suite), 5)
+        self.assertFalse(suite.has_next())
+
+    def test_admin_objets_supervision(self):
+        admin = Utilisateur.objects.create_user(username='admin2', password='x', role='admin')
+        self.client.force_login(admin)
+        resp = self.client.get(reverse('togo_admin:objets_supervision'), {'ordre': 'id; DROP TABLE'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['stats']['total'], 25)
+        self.assertEqual(len(resp.context['page_obj']), 25)
+        for name in ['users', 'agents_list', 'signalements_list']:
+            self.assertEqual(self.client.get(reverse(f'togo_admin:{name}')).status_code, 200)
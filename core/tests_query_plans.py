@@ -0,0 +1,104 @@
+"""
+Plans d'exécution des requêtes émises par les vues les plus sollicitées.
+
+Les requêtes sont capturées pendant une requête HTTP du client de test, puis
+passées à ``EXPLAIN QUERY PLAN`` : on vérifie ainsi le SQL réellement produit
+par les vues, pas une copie de leurs filtres. Pour chaque requête sur les
+déclarations (ou leurs agrégats journaliers) :
+
+- avec un filtre, la table est lue par un ``SEARCH`` dans un index, ou, si la
+  requête est triée, par un parcours de l'index de tri ;
+- triée sur ses colonnes, elle ne passe jamais par un ``USE TEMP B-TREE FOR
+  ORDER BY`` (tri de toutes les lignes retenues avant le LIMIT) ; un tri sur
+  un agrégat (« top 5 ») ne porte que sur les groupes et reste accepté ;
+- sans filtre (agrégats globaux, historique complet des agrégats journaliers
+  dont le seul filtre est ``nombre > 0``), le parcours complet est accepté.
+"""
+
+import re
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Region, Prefecture, StructureLocale, Utilisateur
+
+_TABLE = re.compile(r'^SELECT .*? FROM "([^"]+)"')
+_TABLES = {'core_declaration', 'core_statistiquejournaliere'}
+_FILTRE = re.compile(r' WHERE (?!"core_statistiquejournaliere"\."nombre" > 0( (GROUP|ORDER|LIMIT)\b|$))')
+_TRI_COLONNE = re.compile(r' ORDER BY "')
+_PARCOURS = re.compile(r'\bSCAN (core_declaration|core_statistiquejournaliere)\b.*')
+_TRI_TEMPORAIRE = re.compile(r'USE TEMP B-TREE FOR (.* )?ORDER BY')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN est propre à SQLite")
+class DeclarationQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = Region.objects.create(nom='Maritime')
+        cls.prefecture = Prefecture.objects.create(nom='Golfe', region=cls.region)
+        cls.structure = StructureLocale.objects.create(nom='Commissariat', type_structure='commissariat', prefecture=cls.prefecture)
+        cls.citoyen = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        cls.agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent', structure_locale=cls.structure)
+        cls.admin = Utilisateur.objects.create_user(username='admin1', password='x', role='admin')
+
+    def assertPlansIndexes(self, url, utilisateur=None, **params):
+        """Chaque requête de la vue sur les déclarations respecte les règles du module"""
+        if utilisateur:
+            self.client.force_login(utilisateur)
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+        verifiees = 0
+        for requete in requetes:
+            sql = requete['sql']
+            table = _TABLE.search(sql)
+            if not table or table.group(1) not in _TABLES:
+                continue
+            verifiees += 1
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = '\n'.join(ligne[-1] for ligne in cursor.fetchall())
+            message = f"{sql}\n{plan}"
+
+            trie = _TRI_COLONNE.search(sql) is not None
+            if trie:
+                self.assertIsNone(_TRI_TEMPORAIRE.search(plan), f"Tri hors index :\n{message}")
+            parcours = _PARCOURS.search(plan)
+            if parcours and _FILTRE.search(sql):
+                self.assertTrue(trie and ' USING ' in parcours.group(), f"Parcours complet de table :\n{message}")
+        self.assertGreater(verifiees, 0, f"Aucune requête sur les déclarations pour {url}")
+
+    def test_index(self):
+        self.assertPlansIndexes(reverse('index'))
+
+    def test_signalements_list(self):
+        self.assertPlansIndexes(reverse('signalements_list'))
+        self.assertPlansIndexes(reverse('signalements_list'), type='trouve')
+
+    def test_agent_dashboard(self):
+        self.assertPlansIndexes(reverse('togo_agent:dashboard'), self.agent)
+
+    def test_agent_mes_signalements(self):
+        self.assertPlansIndexes(reverse('togo_agent:mes_signalements'), self.agent)
+
+    def test_objets_supervision(self):
+        url = reverse('togo_admin:objets_supervision')
+        self.assertPlansIndexes(url, self.admin)
+        self.assertPlansIndexes(url, self.admin, statut='cree')
+        self.assertPlansIndexes(url, self.admin, type='perdu')
+        self.assertPlansIndexes(url, self.admin, region=self.region.pk)
+
+    def test_statistiques_page(self):
+        url = reverse('togo_admin:statistiques')
+        self.assertPlansIndexes(url, self.admin)
+        self.assertPlansIndexes(url, self.admin, region=self.region.pk)
+
+    def test_admin_dashboard(self):
+        self.assertPlansIndexes(reverse('togo_admin:dashboard'), self.admin)
+
+    def test_mes_signalements(self):
+        self.assertPlansIndexes(reverse('mes_signalements'), self.citoyen)
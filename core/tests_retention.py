@@ -0,0 +1,58 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from . import retention
+from .models import ActionLog, Conversation, Message, Notification, Utilisateur
+
+
+class PurgeRetentionTests(TestCase):
+    def setUp(self):
+        self.agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent')
+        self.citoyen = Utilisateur.objects.create_user(username='citoyen1', password='x')
+        self.ancien = timezone.now() - timedelta(days=400)
+
+    def notifier(self, lue, ancienne=True):
+        notification = Notification.objects.create(destinataire=self.citoyen, type_notification='systeme',
+                                                   titre='Info', message='...', lue=lue)
+        if ancienne:
+            Notification.objects.filter(pk=notification.pk).update(date_creation=self.ancien)
+        return notification
+
+    def test_read_notifications_and_logs_use_direct_delete(self):
+        for _ in range(5):
+            self.notifier(lue=True)
+        non_lue = self.notifier(lue=False)
+        recente = self.notifier(lue=True, ancienne=False)
+        for action in ['declaration_creee', 'connexion', 'erreur', 'declaration_validee']:
+            ActionLog.objects.create(utilisateur=self.agent, action=action, description='...')
+        ActionLog.objects.update(date_action=self.ancien)
+
+        self.assertEqual(retention.purger('notifications', simulation=True, taille_lot=2)['supprimes'], 5)
+        resultat = retention.purger('notifications', taille_lot=2, pause=0)
+        self.assertEqual((resultat['supprimes'], resultat['directe']), (5, True))
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {non_lue.pk, recente.pk})
+        self.citoyen.refresh_from_db()
+        self.assertEqual(self.citoyen.notifications_non_lues, 1)
+
+        self.assertEqual(retention.purger('actions', pause=0)['supprimes'], 2)
+        self.assertEqual(sorted(ActionLog.objects.values_list('action', flat=True)), ['connexion', 'erreur'])
+
+    def test_read_messages_keep_conversation_summary(self):
+        conversation = Conversation.objects.create(agent=self.agent, declarant=self.citoyen)
+        messages = [Message.objects.create(conversation=conversation, sender=self.citoyen,
+                                           receiver=self.agent, contenu=f'Message {i}') for i in range(4)]
+        Message.objects.exclude(pk=messages[2].pk).update(is_read=True)
+        Message.objects.update(created_at=self.ancien)
+
+        sortie = StringIO()
+        call_command('purge_retention', 'messages', '--jours', 'messages=30', '--taille-lot', '1', '--pause', '0',
+                     stdout=sortie)
+        self.assertIn('suppression Django', sortie.getvalue())
+        # Le message non lu et le dernier message (aperçu) sont conservés
+        self.assertEqual(set(Message.objects.values_list('pk', flat=True)), {messages[2].pk, messages[3].pk})
+        conversation.refresh_from_db()
+        self.assertEqual((conversation.message_count, conversation.last_message_id), (2, messages[3].pk))
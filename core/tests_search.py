@@ -0,0 +1,139 @@
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import search
+from .models import Region, Prefecture, StructureLocale, Declaration, Objet, Utilisateur
+from .text import normalize_search_key
+
+
+class DeclarationSearchTests(TestCase):
+    def setUp(self):
+        self.region = Region.objects.create(nom='Maritime', code='MAR')
+        self.prefecture = Prefecture.objects.create(nom='Golfe', region=self.region, code='GLF')
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+
+        self.telephone = Declaration.objects.create(
+            type_declaration='perdu', nom_objet='Téléphone Samsung', description='Coque bleue',
+            lieu_precis='Marché de Lomé', date_incident=date(2025, 1, 10), declarant=self.user,
+            region=self.region, prefecture=self.prefecture, statut='publie'
+        )
+        self.cles = Declaration.objects.create(
+            type_declaration='trouve', nom_objet='Clés de voiture', description='Trousseau avec porte-clé',
+            lieu_precis='Kara centre', date_incident=date(2025, 1, 11), declarant=self.user, statut='publie'
+        )
+
+    def ids(self, queryset):
+        return set(queryset.values_list('id', flat=True))
+
+    def test_index_is_available_on_sqlite(self):
+        self.assertTrue(search.fts_enabled())
+
+    def test_search_is_accent_and_case_insensitive(self):
+        qs = search.search_declarations(Declaration.objects.all(), query='telephone')
+        self.assertEqual(self.ids(qs), {self.telephone.id})
+        qs = search.search_declarations(Declaration.objects.all(), query='CLE')
+        self.assertEqual(self.ids(qs), {self.cles.id})
+
+    def test_lieu_matches_prefecture_and_region(self):
+        qs = search.search_declarations(Declaration.objects.all(), lieu='golfe')
+        self.assertEqual(self.ids(qs), {self.telephone.id})
+        qs = search.search_declarations(Declaration.objects.all(), lieu='maritime')
+        self.assertEqual(self.ids(qs), {self.telephone.id})
+
+    def test_nom_only_searches_object_name(self):
+        qs = search.search_declarations(Declaration.objects.all(), nom='coque')
+        self.assertEqual(self.ids(qs), set())
+
+    def test_index_follows_updates_and_deletes(self):
+        self.cles.nom_objet = 'Sac à dos'
+        self.cles.save()
+        self.assertEqual(self.ids(search.search_declarations(Declaration.objects.all(), query='sac')), {self.cles.id})
+
+        self.prefecture.nom = 'Agoè'
+        self.prefecture.save()
+        self.assertEqual(self.ids(search.search_declarations(Declaration.objects.all(), lieu='agoe')), {self.telephone.id})
+
+        telephone_id = self.telephone.id
+        self.telephone.delete()
+        self.assertEqual(self.ids(search.search_declarations(Declaration.objects.all(), query='telephone')), set())
+        self.assertFalse(Declaration.objects.filter(id=telephone_id).exists())
+
+    def test_ranked_results_keep_queryset_filters(self):
+        qs = search.search_declarations(
+            Declaration.objects.filter(type_declaration='trouve'), query='cle', ranked=True
+        )
+        self.assertEqual(list(qs.values_list('id', flat=True)), [self.cles.id])
+
+    def test_ranked_results_are_ordered_by_bm25(self):
+        porte_cles = Declaration.objects.create(
+            type_declaration='trouve', nom_objet='Porte-clés', description='Clé, clé et clé de cadenas',
+            lieu_precis='Lomé', date_incident=date(2025, 1, 12), declarant=self.user, statut='publie'
+        )
+        qs = search.search_declarations(Declaration.objects.all(), query='cle', ranked=True)
+        self.assertEqual(list(qs.values_list('id', flat=True)), [porte_cles.id, self.cles.id])
+        self.assertEqual(qs.count(), 2)
+
+    def test_counter_updates_skip_reindexing(self):
+        with CaptureQueriesContext(connection) as requetes:
+            self.cles.save(update_fields=['nombre_vues'])
+        self.assertFalse([q for q in requetes if search.FTS_TABLE in q['sql']])
+        with CaptureQueriesContext(connection) as requetes:
+            self.cles.save(update_fields=['description'])
+        self.assertTrue([q for q in requetes if search.FTS_TABLE in q['sql']])
+
+    def test_rebuild_index(self):
+        self.assertEqual(search.rebuild_index(), 2)
+
+    def test_public_list_uses_search(self):
+        resp = self.client.get('/signalements/', {'q': 'telephone'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['total_count'], 1)
+
+
+class SearchKeyTests(TestCase):
+    def test_normalize_search_key(self):
+        self.assertEqual(normalize_search_key('  Téléphone  SAMSUNG! '), 'telephone samsung')
+        self.assertEqual(normalize_search_key("Clé de l'Hôtel-de-Ville"), 'cle de l hotel de ville')
+        self.assertEqual(normalize_search_key(None), '')
+
+    def test_keys_are_maintained_on_save(self):
+        region = Region.objects.create(nom='Savanes')
+        prefecture = Prefecture.objects.create(nom='Tône', region=region)
+        structure = StructureLocale.objects.create(nom='Commissariat de Dapaong', type_structure='commissariat', prefecture=prefecture)
+        self.assertEqual(prefecture.nom_normalise, 'tone')
+
+        prefecture.nom = 'Kpendjal-Ouest'
+        prefecture.save(update_fields=['nom'])
+        prefecture.refresh_from_db()
+        self.assertEqual(prefecture.nom_normalise, 'kpendjal ouest')
+
+        user = Utilisateur.objects.create_user(username='citoyen2', password='x')
+        declaration = Declaration.objects.create(
+            type_declaration='perdu', nom_objet='Clé USB', description='', lieu_precis='Gare routière',
+            date_incident=date(2025, 2, 1), declarant=user, structure_locale=structure, statut='publie'
+        )
+        self.assertEqual(declaration.nom_objet_normalise, 'cle usb')
+        self.assertEqual(declaration.lieu_normalise, 'gare routiere')
+
+        qs = search.search_declarations(Declaration.objects.all(), lieu='commissariat de dap')
+        self.assertEqual(list(qs), [declaration])
+
+    def test_search_objets_uses_prefix_keys(self):
+        objet = Objet.objects.create(nom='Téléphone', lieu_trouve='Lomé')
+        Objet.objects.create(nom='Clé', lieu_trouve='Kara')
+        resp = self.client.get('/search/', {'nom': 'tele', 'lieu': 'LOME'})
+        self.assertEqual(list(resp.context['objets']), [objet])
+
+    def test_search_objets_matches_words_inside_names(self):
+        objet = Objet.objects.create(nom='Mon téléphone Samsung', lieu_trouve='Marché de Lomé')
+        Objet.objects.create(nom='Microphone', lieu_trouve='Lomé')
+        resp = self.client.get('/search/', {'nom': 'telephone', 'lieu': 'lome'})
+        self.assertEqual(list(resp.context['objets']), [objet])
+        resp = self.client.get('/search/', {'nom': 'sams tele'})
+        self.assertEqual(list(resp.context['objets']), [objet])
+        # Début de mot uniquement
+        resp = self.client.get('/search/', {'nom': 'phone'})
+        self.assertEqual(list(resp.context['objets']), [])
@@ -0,0 +1,125 @@
+from datetime import date
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import statistiques
+from .models import (
+    Declaration, Reclamation, Region, Prefecture, StructureLocale, Utilisateur,
+    StatistiqueRegion, StatistiqueStructure, StatistiqueJournaliere,
+)
+
+
+class CompteursStatistiquesTests(TestCase):
+    def setUp(self):
+        self.region = Region.objects.create(nom='Maritime')
+        prefecture = Prefecture.objects.create(nom='Golfe', region=self.region)
+        self.structure = StructureLocale.objects.create(nom='Commissariat', type_structure='commissariat', prefecture=prefecture)
+        self.autre_structure = StructureLocale.objects.create(nom='Mairie', type_structure='mairie', prefecture=prefecture)
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+
+    def declarer(self, type_declaration='trouve', **kwargs):
+        return Declaration.objects.create(
+            type_declaration=type_declaration, nom_objet='Sac', description='', lieu_precis='Lomé',
+            date_incident=date(2025, 1, 10), declarant=self.user,
+            region=self.region, structure_locale=self.structure, **kwargs
+        )
+
+    def lignes(self):
+        return (StatistiqueRegion.objects.get(region=self.region),
+                StatistiqueStructure.objects.get(structure_locale=self.structure))
+
+    def test_status_transitions_update_counters(self):
+        declaration = self.declarer()
+        self.declarer('perdu')
+        for ligne in self.lignes():
+            self.assertEqual((ligne.total_declarations, ligne.declarations_trouvees, ligne.declarations_en_attente), (2, 1, 2))
+
+        declaration.statut = 'publie'
+        declaration.save()
+        reclamation = Reclamation.objects.create(declaration=declaration, reclamant=self.user, justification='À moi')
+        reclamation.statut = 'approuvee'
+        reclamation.save(update_fields=['statut'])
+        declaration.statut = 'restitue'
+        declaration.save(update_fields=['statut'])
+
+        for ligne in self.lignes():
+            self.assertEqual(ligne.declarations_en_attente, 1)
+            self.assertEqual((ligne.declarations_publiees, ligne.objets_restitues, ligne.declarations_validees), (0, 1, 1))
+            self.assertEqual((ligne.total_reclamations, ligne.reclamations_soumises, ligne.reclamations_approuvees), (1, 0, 1))
+
+    def test_move_and_delete(self):
+        declaration = self.declarer()
+        Reclamation.objects.create(declaration=declaration, reclamant=self.user, justification='À moi')
+        declaration.structure_locale = self.autre_structure
+        declaration.save()
+        self.assertEqual(self.lignes()[1].total_reclamations, 0)
+        autre = StatistiqueStructure.objects.get(structure_locale=self.autre_structure)
+        self.assertEqual((autre.total_declarations, autre.reclamations_soumises), (1, 1))
+
+        declaration.delete()
+        region = StatistiqueRegion.objects.get(region=self.region)
+        self.assertEqual((region.total_declarations, region.total_reclamations), (0, 0))
+        self.assertEqual(statistiques.reconcilier(), [])
+
+    def test_reconcile_repairs_drift(self):
+        self.declarer()
+        StatistiqueRegion.objects.filter(region=self.region).update(total_declarations=7)
+        derives = statistiques.reconcilier(corriger=False)
+        self.assertEqual([(d['zone_id'], d['ecarts']) for d in derives], [(self.region.id, {'total_declarations': (7, 1)})])
+        statistiques.reconcilier()
+        self.assertEqual(self.lignes()[0].total_declarations, 1)
+        self.assertEqual(statistiques.reconcilier(corriger=False), [])
+
+    def test_agent_dashboard_reads_counters(self):
+        self.declarer(statut='restitue')
+        agent = Utilisateur.objects.create_user(username='agent1', password='x', role='agent', structure_locale=self.structure)
+        self.client.force_login(agent)
+        stats = self.client.get(reverse('togo_agent:ajax_stats')).json()['stats']
+        self.assertEqual((stats['total_signalements'], stats['objets_restitues']), (1, 1))
+
+
+class StatistiquesJournalieresTests(TestCase):
+    def setUp(self):
+        self.region = Region.objects.create(nom='Maritime')
+        self.user = Utilisateur.objects.create_user(username='citoyen1', password='x')
+
+    def declarer(self, type_declaration='perdu', **kwargs):
+        return Declaration.objects.create(
+            type_declaration=type_declaration, nom_objet='Sac', description='', lieu_precis='Lomé',
+            date_incident=date(2025, 1, 10), declarant=self.user, region=self.region, **kwargs
+        )
+
+    def lignes(self):
+        return dict(StatistiqueJournaliere.objects.filter(nombre__gt=0).values_list('cle', 'nombre'))
+
+    def test_incremental_rows_match_rebuild(self):
+        premiere = self.declarer()
+        self.declarer('trouve')
+        self.declarer(statut='publie').delete()
+        premiere.statut = 'restitue'
+        premiere.save(update_fields=['statut'])
+
+        incremental = self.lignes()
+        self.assertEqual(sum(incremental.values()), 2)
+        aujourd_hui = timezone.localdate()
+        statistiques.recalculer_jours(aujourd_hui, aujourd_hui)
+        self.assertEqual(self.lignes(), incremental)
+        statistiques.recalculer_jours(aujourd_hui, aujourd_hui)
+        self.assertEqual(self.lignes(), incremental)
+
+    def test_report_views_read_rollup(self):
+        self.declarer(statut='restitue')
+        self.declarer('trouve')
+        admin = Utilisateur.objects.create_user(username='admin2', password='x', role='admin')
+        self.client.force_login(admin)
+
+        stats = self.client.get(reverse('togo_admin:statistiques')).context['stats_generales']
+        self.assertEqual((stats['total_declarations'], stats['objets_restitues'], stats['taux_restitution']), (2, 1, 50.0))
+        rapports = self.client.get(reverse('togo_admin:reports')).context
+        self.assertEqual((rapports['total_signalements'], rapports['signalements_restitues']), (2, 1))
+        metriques = self.client.get(reverse('togo_admin:dashboard')).context['metriques']
+        self.assertEqual(metriques['declarations_periode'], 2)
+        statistics = self.client.get(reverse('togo_admin:statistics')).context
+        self.assertEqual((statistics['kpi']['total_declarations'], statistics['status_stats']['returned']), (2, 1))
@@ -0,0 +1,132 @@
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import taches
+from .models import Notification, Tache, Utilisateur
+from .utils import create_notification
+
+
+class FileTachesTests(TestCase):
+    def setUp(self):
+        self.appels = []
+        registre = mock.patch.dict(taches.REGISTRE)
+        registre.start()
+        self.addCleanup(registre.stop)
+        taches.tache('noter', max_tentatives=2)(self.noter)
+        taches.tache('urgente', priorite=10)(self.noter)
+
+    def noter(self, valeur, echouer=False):
+        self.appels.append(valeur)
+        if echouer:
+            raise RuntimeError("échec demandé")
+        return {'valeur': valeur}
+
+    def test_enqueue_on_commit_and_priority_order(self):
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            taches.planifier('noter', 'a')
+            taches.planifier('urgente', 'b')
+            self.assertFalse(Tache.objects.exists())
+        self.assertEqual(len(rappels), 2)
+
+        self.assertEqual(taches.travailler(une_fois=True), 2)
+        self.assertEqual(self.appels, ['b', 'a'])
+        self.assertEqual(list(Tache.objects.values_list('statut', 'tentatives').distinct()), [('terminee', 1)])
+        with self.assertRaises(ValueError):
+            taches.planifier('inconnue')
+
+    def test_failures_back_off_then_give_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            taches.planifier('noter', 'x', echouer=True)
+        [tache] = taches.reserver('t1')
+        self.assertFalse(taches.executer(tache))
+        tache.refresh_from_db()
+        self.assertEqual((tache.statut, tache.tentatives), ('en_attente', 1))
+        self.assertGreater(tache.executer_apres, timezone.now())
+        self.assertIn("échec demandé", tache.derniere_erreur)
+        self.assertEqual(taches.reserver('t1'), [])
+
+        Tache.objects.update(executer_apres=timezone.now())
+        taches.executer(taches.reserver('t1')[0])
+        tache.refresh_from_db()
+        self.assertEqual((tache.statut, tache.tentatives), ('echouee', 2))
+
+    def test_process_mode_requires_fork(self):
+        with mock.patch('multiprocessing.get_all_start_methods', return_value=['spawn']):
+            with self.assertRaisesMessage(CommandError, 'fork'):
+                call_command('run_worker', '--mode', 'processus', '--une-fois', stdout=StringIO())
+
+    def test_expired_lease_is_taken_over(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            taches.planifier('noter', 'y')
+        [premiere] = taches.reserver('t1')
+        self.assertEqual(taches.reserver('t2'), [])
+
+        Tache.objects.update(bail_jusqua=timezone.now() - timedelta(seconds=1))
+        [reprise] = taches.reserver('t2')
+        self.assertEqual((reprise.travailleur, reprise.tentatives), ('t2', 2))
+        # L'ancien détenteur ne peut plus conclure
+        taches.executer(premiere)
+        self.assertEqual(Tache.objects.get().statut, 'en_cours')
+        taches.executer(reprise)
+        self.assertEqual(Tache.objects.get().statut, 'terminee')
+
+
+class BailTachesTests(TransactionTestCase):
+    def setUp(self):
+        registre = mock.patch.dict(taches.REGISTRE)
+        registre.start()
+        self.addCleanup(registre.stop)
+        # Bail de 0,3 s renouvelé par le battement pendant une tâche de 0,6 s
+        taches.tache('longue', bail=0.3)(self.longue)
+
+    def longue(self):
+        time.sleep(0.6)
+        self.reprises = taches.reserver('t2')
+
+    def test_long_running_job_keeps_its_lease(self):
+        taches.planifier('longue')
+        [tache] = taches.reserver('t1')
+        self.assertTrue(taches.executer(tache))
+        self.assertEqual(self.reprises, [])
+        tache.refresh_from_db()
+        self.assertEqual((tache.statut, tache.travailleur, tache.tentatives), ('terminee', 't1', 1))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class TachesApplicationTests(TestCase):
+    def setUp(self):
+        self.admin = Utilisateur.objects.create_user(username='admin2', password='x', role='admin', email='admin@example.tg')
+
+    def test_notification_email_is_sent_by_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = create_notification(self.admin, 'systeme', 'Maintenance', 'Ce soir', envoyer_email=True)
+        self.assertEqual(len(mail.outbox), 0)
+
+        taches.travailler(une_fois=True)
+        self.assertEqual(len(mail.outbox), 1)
+        notification.refresh_from_db()
+        self.assertTrue(notification.envoyee_par_email)
+
+    def test_csv_export_runs_in_background(self):
+        self.client.force_login(self.admin)
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.get(reverse('togo_admin:reports'), {'periode': '7', 'export': 'csv'})
+            self.assertEqual(resp.status_code, 302)
+            self.assertEqual(Tache.objects.get().arguments, {'args': [7, self.admin.id], 'kwargs': {}})
+
+            taches.travailler(une_fois=True)
+            lien = Notification.objects.get(destinataire=self.admin, type_notification='systeme').lien_action
+            resp = self.client.get(lien)
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('RAPPORT TOGORETROUVE', b''.join(resp.streaming_content).decode('utf-8-sig'))
+            self.assertEqual(self.client.get(reverse('togo_admin:telecharger_export', args=['settings.py'])).status_code, 404)
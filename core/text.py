@@ -0,0 +1,28 @@
+"""
+Normalisation des textes pour la recherche.
+
+Les utilisateurs tapent « telephone », « Lome » ou « cle » alors que les données
+contiennent « Téléphone », « Lomé » et « Clé ». Les clés de recherche stockées
+sur les modèles sont donc repliées (NFKD sans diacritiques), en minuscules et
+sans ponctuation, pour être comparées par égalité ou par préfixe sur un index.
+"""
+
+import re
+import unicodedata
+
+_PONCTUATION_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_search_key(value):
+    """
+    Retourne la clé de recherche normalisée d'un texte.
+
+    >>> normalize_search_key("  Clé de l'Hôtel-de-Ville ")
+    'cle de l hotel de ville'
+    """
+    if not value:
+        return ''
+    n = unicodedata.normalize('NFKD', str(value))
+    n = ''.join(ch for ch in n if not unicodedata.combining(ch))
+    n = _PONCTUATION_RE.sub(' ', n.lower())
+    return ' '.join(n.split())
@@ -73,6 +73,7 @@ urlpatterns = [
     path('api/query/structures/', views.api_structures, name='api_structures_query'),
     # API Géolocalisation (AVANT le router DRF pour éviter les conflits)
     path('api/signalements/map-data/', views.signalements_map_data, name='signalements_map_data'),
+    path('api/signalements/proximite/', api_views.api_signalements_proximite, name='api_signalements_proximite'),
     # Router DRF (list/detail)
     path('api/', include(router.urls)),
     
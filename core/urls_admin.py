@@ -46,10 +46,12 @@ urlpatterns = [
     
     # Rapports et statistiques
     path('rapports/', views_admin.admin_rapports, name='reports'),
+    path('rapports/exports/<str:nom>/', views_admin.telecharger_export, name='telecharger_export'),
     path('statistics/', views_admin.statistics, name='statistics'),
     
     # Suivi des conversations
     path('conversations/', views_admin.conversations_monitoring, name='conversations_monitoring'),
+    path('monitoring/cache-pages/', views_admin.cache_pages_stats, name='cache_pages_stats'),
     
     # Supervision avancée des objets
     path('objets/', views_admin.objets_supervision, name='objets_supervision'),
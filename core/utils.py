@@ -1,10 +1,9 @@
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.urls import reverse
 from django.db.models import Q, Count, Avg
 from .models import Notification, ActionLog
+from .notifications import creer_notifications, lien_action
+from .taches import planifier
+from .courriels import envoyer_notifications
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,17 +27,6 @@ def create_notification(destinataire, type_notification, titre, message, declara
         Notification créée
     """
     try:
-        # Générer le lien d'action selon le contexte
-        lien_action = ""
-        if declaration:
-            if type_notification == 'declaration_publiee':
-                lien_action = reverse('declaration_detail', kwargs={'id': declaration.id})
-            elif type_notification in ['declaration_validee', 'declaration_rejetee']:
-                lien_action = reverse('utilisateur:mes_declarations')
-        elif reclamation:
-            if type_notification in ['reclamation_approuvee', 'reclamation_rejetee']:
-                lien_action = reverse('utilisateur:mes_reclamations')
-        
         # Créer la notification
         notification = Notification.objects.create(
             destinataire=destinataire,
@@ -47,13 +35,13 @@ def create_notification(destinataire, type_notification, titre, message, declara
             type_notification=type_notification,
             titre=titre,
             message=message,
-            lien_action=lien_action,
+            lien_action=lien_action(type_notification, declaration, reclamation),
             importante=importante
         )
         
-        # Envoyer l'email si demandé
+        # Envoyer l'email si demandé (file de tâches, après validation)
         if envoyer_email and destinataire.email:
-            send_notification_email(notification)
+            planifier('emails_notifications', [notification.pk])
         
         return notification
         
@@ -66,6 +54,9 @@ def send_notification_email(notification):
     """
     Envoyer un email pour une notification
     
+    Les envois en nombre passent par courriels.envoyer_notifications
+    (une seule connexion SMTP pour tout le lot).
+    
     Args:
         notification: Instance de Notification
     """
@@ -73,34 +64,8 @@ def send_notification_email(notification):
         if not notification.destinataire.email:
             return False
         
-        # Contexte pour le template email
-        context = {
-            'notification': notification,
-            'user': notification.destinataire,
-            'site_name': 'TogoRetrouve',
-            'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
-        }
-        
-        # Rendu du template email
-        html_content = render_to_string('emails/notification.html', context)
-        text_content = render_to_string('emails/notification.txt', context)
-        
-        # Envoi de l'email
-        sent = send_mail(
-            subject=f"[TogoRetrouve] {notification.titre}",
-            message=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[notification.destinataire.email],
-            html_message=html_content,
-            fail_silently=False
-        )
-        
-        if sent:
-            notification.envoyee_par_email = True
-            notification.date_envoi_email = timezone.now()
-            notification.save(update_fields=['envoyee_par_email', 'date_envoi_email'])
-        
-        return sent
+        resultat = envoyer_notifications([notification])
+        return bool(resultat['envoyes'])
         
     except Exception as e:
         logger.error(f"Erreur lors de l'envoi d'email de notification : {str(e)}")
@@ -190,15 +155,14 @@ def create_notification_for_new_declaration(declaration):
         actif=True
     )
     
-    for agent in agents:
-        create_notification(
-            destinataire=agent,
-            type_notification='declaration_cree',
-            titre=f"Nouvelle déclaration : {declaration.numero_declaration}",
-            message=f"Une nouvelle déclaration '{declaration.nom_objet}' a été soumise et nécessite une validation.",
-            declaration=declaration,
-            importante=True
-        )
+    return creer_notifications(
+        agents,
+        type_notification='declaration_cree',
+        titre=f"Nouvelle déclaration : {declaration.numero_declaration}",
+        message=f"Une nouvelle déclaration '{declaration.nom_objet}' a été soumise et nécessite une validation.",
+        declaration=declaration,
+        importante=True
+    )
 
 
 def create_notification_for_new_reclamation(reclamation):
@@ -214,87 +178,39 @@ def create_notification_for_new_reclamation(reclamation):
         actif=True
     )
     
-    for agent in agents:
-        create_notification(
-            destinataire=agent,
-            type_notification='nouvelle_reclamation',
-            titre=f"Nouvelle réclamation : {reclamation.numero_reclamation}",
-            message=f"Une nouvelle réclamation a été soumise pour l'objet '{reclamation.declaration.nom_objet}'.",
-            reclamation=reclamation,
-            importante=True
-        )
+    return creer_notifications(
+        agents,
+        type_notification='nouvelle_reclamation',
+        titre=f"Nouvelle réclamation : {reclamation.numero_reclamation}",
+        message=f"Une nouvelle réclamation a été soumise pour l'objet '{reclamation.declaration.nom_objet}'.",
+        reclamation=reclamation,
+        importante=True
+    )
 
 
 def update_region_statistics(region):
     """
-    Mettre à jour les statistiques d'une région
+    Planifier le recalcul complet des statistiques d'une région
+    
+    Les compteurs sont normalement tenus à jour par incréments (voir
+    core/statistiques.py) ; ce recalcul sert de correction ponctuelle et
+    s'exécute dans la file de tâches.
     
     Args:
         region: Instance de Region
     """
-    try:
-        from django.db.models import Count, Avg
-        from .models import Declaration, Reclamation, StatistiqueRegion
-        
-        # Obtenir ou créer les statistiques
-        stats, created = StatistiqueRegion.objects.get_or_create(region=region)
-        
-        # Calculer les statistiques de déclarations
-        declaration_stats = Declaration.objects.filter(region=region).aggregate(
-            total=Count('id'),
-            en_attente=Count('id', filter=Q(statut='cree')),
-            publiees=Count('id', filter=Q(statut='publie')),
-            restituees=Count('id', filter=Q(statut='restitue'))
-        )
-        
-        # Calculer les statistiques de réclamations
-        reclamation_stats = Reclamation.objects.filter(declaration__region=region).aggregate(
-            total=Count('id'),
-            en_cours=Count('id', filter=Q(statut__in=['soumise', 'en_cours'])),
-            approuvees=Count('id', filter=Q(statut='approuvee')),
-            rejetees=Count('id', filter=Q(statut='rejetee'))
-        )
-        
-        # Mettre à jour les statistiques
-        stats.total_declarations = declaration_stats['total'] or 0
-        stats.declarations_en_attente = declaration_stats['en_attente'] or 0
-        stats.declarations_publiees = declaration_stats['publiees'] or 0
-        stats.objets_restitues = declaration_stats['restituees'] or 0
-        
-        stats.total_reclamations = reclamation_stats['total'] or 0
-        stats.reclamations_en_cours = reclamation_stats['en_cours'] or 0
-        stats.reclamations_approuvees = reclamation_stats['approuvees'] or 0
-        stats.reclamations_rejetees = reclamation_stats['rejetees'] or 0
-        
-        # Calculer le taux de restitution
-        if stats.declarations_publiees > 0:
-            stats.taux_restitution = (stats.objets_restitues / stats.declarations_publiees) * 100
-        else:
-            stats.taux_restitution = 0.0
-        
-        stats.save()
-        
-        return stats
-        
-    except Exception as e:
-        logger.error(f"Erreur lors de la mise à jour des statistiques : {str(e)}")
-        return None
+    planifier('recalculer_statistiques_region', region.pk)
 
 
 def clean_old_notifications():
     """
-    Nettoyer les anciennes notifications (plus de 6 mois)
-    Cette fonction devrait être appelée périodiquement par une tâche cron
+    Nettoyer les anciennes notifications lues (plus de 6 mois)
+    Purge par tranches, voir core/retention.py et la commande purge_retention
     """
     try:
-        from datetime import timedelta
-        
-        cutoff_date = timezone.now() - timedelta(days=180)  # 6 mois
+        from .retention import purger
         
-        deleted_count = Notification.objects.filter(
-            date_creation__lt=cutoff_date,
-            lue=True
-        ).delete()[0]
+        deleted_count = purger('notifications', jours=180)['supprimes']
         
         logger.info(f"Nettoyage des notifications : {deleted_count} notifications supprimées")
         return deleted_count
@@ -307,18 +223,13 @@ def clean_old_notifications():
 def clean_old_action_logs():
     """
     Nettoyer les anciens logs d'action (plus de 1 an)
-    Cette fonction devrait être appelée périodiquement par une tâche cron
+    Purge par tranches, voir core/retention.py et la commande purge_retention
     """
     try:
-        from datetime import timedelta
+        from .retention import purger
         
-        cutoff_date = timezone.now() - timedelta(days=365)  # 1 an
-        
-        deleted_count = ActionLog.objects.filter(
-            date_action__lt=cutoff_date
-        ).exclude(
-            action__in=['erreur', 'connexion']  # Garder certains logs plus longtemps
-        ).delete()[0]
+        # Les erreurs et connexions sont gardées plus longtemps (politique 'actions')
+        deleted_count = purger('actions', jours=365)['supprimes']
         
         logger.info(f"Nettoyage des logs : {deleted_count} logs supprimés")
         return deleted_count
@@ -371,74 +282,13 @@ def validate_state_transition(declaration, new_status, user):
 def send_weekly_digest_to_agents():
     """
     Envoyer un digest hebdomadaire aux agents
-    Cette fonction devrait être appelée chaque semaine par une tâche cron
+    Planifiée chaque semaine dans la file de tâches (tâche digest_hebdomadaire) ;
+    le calcul pour tous les agents est fait en bloc (voir core/digest.py)
     """
     try:
-        from datetime import timedelta
-        from django.db.models import Q
-        from .models import Utilisateur, Declaration, Reclamation
-        
-        # Période : dernière semaine
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=7)
-        
-        agents = Utilisateur.objects.filter(
-            role__in=['agent', 'admin'],
-            actif=True,
-            email__isnull=False
-        ).exclude(email='')
-        
-        for agent in agents:
-            # Statistiques de la semaine pour l'agent
-            region_filter = Q()
-            if agent.region:
-                region_filter = Q(region=agent.region)
-            elif agent.prefecture:
-                region_filter = Q(prefecture=agent.prefecture)
-            
-            stats = {
-                'nouvelles_declarations': Declaration.objects.filter(
-                    region_filter & Q(date_declaration__range=[start_date, end_date])
-                ).count(),
-                'declarations_validees': Declaration.objects.filter(
-                    region_filter & Q(
-                        agent_validateur=agent,
-                        date_publication__range=[start_date, end_date]
-                    )
-                ).count(),
-                'nouvelles_reclamations': Reclamation.objects.filter(
-                    declaration__region=agent.region if agent.region else None,
-                    date_reclamation__range=[start_date, end_date]
-                ).count(),
-                'reclamations_traitees': Reclamation.objects.filter(
-                    agent_traitant=agent,
-                    date_traitement__range=[start_date, end_date]
-                ).count(),
-            }
-            
-            # Envoyer l'email de digest si il y a de l'activité
-            if any(stats.values()):
-                context = {
-                    'agent': agent,
-                    'stats': stats,
-                    'periode': f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
-                    'site_name': 'TogoRetrouve',
-                    'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
-                }
-                
-                html_content = render_to_string('emails/weekly_digest.html', context)
-                text_content = render_to_string('emails/weekly_digest.txt', context)
-                
-                send_mail(
-                    subject=f"[TogoRetrouve] Rapport hebdomadaire - {agent.region.nom if agent.region else 'Global'}",
-                    message=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[agent.email],
-                    html_message=html_content,
-                    fail_silently=True
-                )
+        from .digest import envoyer_digest_hebdomadaire
         
-        logger.info("Digest hebdomadaire envoyé aux agents")
+        return envoyer_digest_hebdomadaire()
         
     except Exception as e:
         logger.error(f"Erreur lors de l'envoi du digest hebdomadaire : {str(e)}")
\ No newline at end of file
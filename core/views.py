@@ -10,6 +10,10 @@ import os
 from .models import Signalement, Objet, Utilisateur, CommentaireAnonyme, Declaration, Conversation, Message
 from .forms import SignalementForm, SearchForm, CommentaireAnonymeForm, DeclarationForm
 from .decorators import role_required
+from .search import search_declarations, statut_parmi, word_prefix_filter
+from . import compteur_vues, geo
+from .cache_pages import cache_anonyme
+from .messagerie import fenetre_historique, marquer_lus, synchronisation, version_conversation
 from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
@@ -211,7 +215,9 @@ def utilisateur_notifications(request):
     return JsonResponse({
         'notifications': notifications[:10],  # Limiter à 10 notifications
         'count': len(notifications),
-        'unread_count': len(notifications)
+        'unread_count': len(notifications),
+        # Valeur initiale du badge, ensuite poussée par WebSocket
+        'notifications_non_lues': request.user.notifications_non_lues,
     })
 
 @login_required
@@ -286,7 +292,9 @@ def agent_notifications(request):
     return JsonResponse({
         'notifications': notifications,
         'count': len(notifications),
-        'unread_count': len(notifications)
+        'unread_count': len(notifications),
+        # Valeur initiale du badge, ensuite poussée par WebSocket
+        'notifications_non_lues': request.user.notifications_non_lues,
     })
 
 @login_required
@@ -583,6 +591,18 @@ def utilisateur_signalement_detail(request, pk):
 # ---------------------------
 # Pages publiques et recherche
 # ---------------------------
+def _tags_declaration(request, pk):
+    """Clés de substitution de la page publique d'une déclaration"""
+    region_id = Declaration.objects.filter(pk=pk).values_list('region_id', flat=True).first()
+    return [f'declaration:{pk}', f'region:{region_id}']
+
+
+def _vue_depuis_cache(request, pk):
+    """Page servie depuis le cache : compter quand même la vue"""
+    compteur_vues.enregistrer_vue(pk)
+
+
+@cache_anonyme('accueil', lambda request: ['accueil'])
 def index(request):
     # Gestion de la recherche rapide depuis l'accueil
     nom = request.GET.get('nom')
@@ -596,23 +616,20 @@ def index(request):
         recherche_effectuee = True
         # Recherche dans la table Declaration (élargie pour inclure les nouveaux signalements)
         base_search = Declaration.objects.filter(
-            statut__in=['cree', 'en_validation', 'valide', 'publie'],
+            statut_parmi(['cree', 'en_validation', 'valide', 'publie']),
             visible_publiquement=True
         )
-        if nom:
-            base_search = base_search.filter(nom_objet__icontains=nom)
-        if lieu:
-            base_search = base_search.filter(
-                Q(lieu_precis__icontains=lieu) |
-                Q(prefecture__nom__icontains=lieu) |
-                Q(region__nom__icontains=lieu)
-            )
         if date_perte:
             base_search = base_search.filter(date_incident=date_perte)
         
-        objets_resultats = base_search.select_related(
-            'declarant', 'region', 'prefecture', 'categorie'
-        ).order_by('-date_declaration')
+        objets_resultats = search_declarations(
+            base_search.select_related(
+                'declarant', 'region', 'prefecture', 'categorie'
+            ).order_by('-date_declaration'),
+            nom=nom,
+            lieu=lieu,
+            ranked=True
+        )
 
     # Récupération des déclarations d'objets TROUVÉS (publiés)
     objets_trouves = Declaration.objects.filter(
@@ -630,7 +647,7 @@ def index(request):
 
     # Récupération des déclarations récentes (tous types confondus)
     signalements_recents = Declaration.objects.filter(
-        statut__in=['cree', 'en_validation', 'valide', 'publie'],
+        statut_parmi(['cree', 'en_validation', 'valide', 'publie']),
         visible_publiquement=True
     ).select_related('declarant', 'region', 'prefecture', 'categorie').order_by('-date_declaration')[:4]
 
@@ -659,17 +676,18 @@ def search_objets(request):
         lieu = form.cleaned_data.get('lieu')
         date_perte = form.cleaned_data.get('date_perte')
         if nom:
-            objets = objets.filter(nom__icontains=nom)
+            objets = objets.filter(word_prefix_filter('nom_normalise', nom))
         if lieu:
-            objets = objets.filter(lieu__icontains=lieu)
+            objets = objets.filter(word_prefix_filter('lieu_normalise', lieu))
         if date_perte:
-            objets = objets.filter(date_perte=date_perte)
+            objets = objets.filter(date_trouve=date_perte)
     return render(request, 'search.html', {'form': form, 'objets': objets})
 
 def objet_detail(request, pk):
     objet = get_object_or_404(Objet, pk=pk)
     return render(request, 'objet_detail.html', {'objet': objet})
 
+@cache_anonyme('declaration_detail_public', _tags_declaration, lors_du_cache=_vue_depuis_cache)
 def declaration_detail_public(request, pk):
     """Vue publique pour afficher le détail d'une déclaration"""
     declaration = get_object_or_404(
@@ -679,9 +697,8 @@ def declaration_detail_public(request, pk):
         visible_publiquement=True
     )
     
-    # Incrémenter le nombre de vues
-    declaration.nombre_vues += 1
-    declaration.save(update_fields=['nombre_vues'])
+    # Compter la vue (écrite en base par lots, voir compteur_vues)
+    compteur_vues.enregistrer_vue(declaration.pk)
     
     # Récupérer les commentaires anonymes
     commentaires = CommentaireAnonyme.objects.filter(
@@ -722,6 +739,7 @@ def declaration_detail_public(request, pk):
 # ---------------------------
 # Gestion des signalements
 # ---------------------------
+@cache_anonyme('signalements_list', lambda request: ['signalements'])
 def signalements_list(request):
     # Récupérer les paramètres de recherche
     query = request.GET.get('q')
@@ -730,30 +748,26 @@ def signalements_list(request):
     
     # On filtre les signalements qui sont soit créés, soit validés, soit publiés
     base_queryset = Declaration.objects.filter(
-        statut__in=['cree', 'valide', 'publie']
+        statut_parmi(['cree', 'valide', 'publie'])
     ).select_related('declarant', 'prefecture', 'structure_locale', 'region').order_by('-date_declaration')
 
-    if query:
-        base_queryset = base_queryset.filter(
-            Q(nom_objet__icontains=query) |
-            Q(description__icontains=query) |
-            Q(lieu_precis__icontains=query) |
-            Q(prefecture__nom__icontains=query) |
-            Q(region__nom__icontains=query)
-        )
-    
     if type_filter in ['perdu', 'trouve']:
         base_queryset = base_queryset.filter(type_declaration=type_filter)
         
     if date_perte:
         base_queryset = base_queryset.filter(date_incident=date_perte)
     
+    # Recherche plein texte, résultats classés par pertinence
+    base_queryset = search_declarations(base_queryset, query=query, ranked=True)
+    # Liste non paginée : une seule évaluation sert à l'affichage et au total
+    signalements = list(base_queryset)
+    
     context = {
-        'signalements': base_queryset,
+        'signalements': signalements,
         'query': query,
         'type_filter': type_filter,
         'date_perte': date_perte,
-        'total_count': base_queryset.count(),
+        'total_count': len(signalements),
     }
     return render(request, 'signalements_list_final.html', context)
 
@@ -973,16 +987,9 @@ def objets_list(request):
         )
     ).select_related('declarant', 'prefecture', 'structure_locale', 'region').order_by('-date_declaration')
 
-    if nom:
-        base_queryset = base_queryset.filter(nom_objet__icontains=nom)
-    if lieu:
-        base_queryset = base_queryset.filter(
-            Q(lieu_precis__icontains=lieu) |
-            Q(prefecture__nom__icontains=lieu) |
-            Q(region__nom__icontains=lieu)
-        )
     if date_perte:
         base_queryset = base_queryset.filter(date_incident=date_perte)
+    base_queryset = search_declarations(base_queryset, nom=nom, lieu=lieu)
     
     context = {
         'objets_trouves': base_queryset,
@@ -1004,16 +1011,9 @@ def objets_perdus_list(request):
         statut__in=['cree', 'en_validation', 'valide']  # Exclure 'publie' (retrouvé) et 'restitue'
     ).select_related('declarant', 'prefecture', 'structure_locale', 'region').order_by('-date_declaration')
 
-    if nom:
-        base_queryset = base_queryset.filter(nom_objet__icontains=nom)
-    if lieu:
-        base_queryset = base_queryset.filter(
-            Q(lieu_precis__icontains=lieu) |
-            Q(prefecture__nom__icontains=lieu) |
-            Q(region__nom__icontains=lieu)
-        )
     if date_perte:
         base_queryset = base_queryset.filter(date_incident=date_perte)
+    base_queryset = search_declarations(base_queryset, nom=nom, lieu=lieu)
     
     context = {
         'objets_perdus': base_queryset,
@@ -1331,7 +1331,13 @@ def api_structures(request):
 
 
 def signalements_map_data(request):
-    """API pour récupérer les données de géolocalisation des signalements"""
+    """
+    API pour récupérer les données de géolocalisation des signalements
+
+    Avec ``bbox=ouest,sud,est,nord`` et ``zoom``, renvoie des groupes agrégés
+    par cellule geohash (zoom faible) ou les points de la zone (zoom fort),
+    encodés par colonnes. Sans ``bbox``, renvoie la liste complète (ancien format).
+    """
     try:
         # Récupérer les paramètres de recherche
         query = request.GET.get('q')
@@ -1348,14 +1354,7 @@ def signalements_map_data(request):
         ).select_related('declarant', 'region', 'prefecture')
 
         # Appliquer les filtres
-        if query:
-            signalements = signalements.filter(
-                Q(nom_objet__icontains=query) |
-                Q(description__icontains=query) |
-                Q(lieu_precis__icontains=query) |
-                Q(prefecture__nom__icontains=query) |
-                Q(region__nom__icontains=query)
-            )
+        signalements = search_declarations(signalements, query=query)
         
         if type_filter in ['perdu', 'trouve']:
             signalements = signalements.filter(type_declaration=type_filter)
@@ -1363,6 +1362,16 @@ def signalements_map_data(request):
         if date_perte:
             signalements = signalements.filter(date_incident=date_perte)
         
+        bbox = request.GET.get('bbox')
+        if bbox:
+            try:
+                bbox = geo.parse_bbox(bbox)
+                zoom = int(request.GET.get('zoom', 0))
+            except ValueError:
+                return JsonResponse({'error': 'Paramètres bbox/zoom invalides'}, status=400)
+            filtres_cle = geo.cle_filtres(q=query, type=type_filter, date_perte=date_perte)
+            return JsonResponse(geo.donnees_carte(signalements.select_related(None), bbox, zoom, filtres_cle))
+        
         data = [{
             'id': s.id,
             'nom_objet': s.nom_objet,
@@ -1413,10 +1422,6 @@ def api_envoyer_message(request):
                 is_read=False
             )
             
-            # Mettre à jour la conversation
-            conversation.updated_at = message.created_at
-            conversation.save()
-            
             return JsonResponse({
                 'success': True,
                 'message': {
@@ -1447,22 +1452,32 @@ def api_messages_conversation(request, conversation_id):
     if request.method == 'GET':
         try:
             # Vérifier que la conversation appartient à l'utilisateur
-            conversation = Conversation.objects.get(
+            conversation = Conversation.objects.select_related('agent').get(
                 id=conversation_id,
                 declarant=request.user
             )
             
-            # Récupérer les messages
-            messages = conversation.messages.select_related(
-                'sender', 'receiver'
-            ).order_by('created_at')
+            # Polling incrémental : 304 sans écriture si rien n'a changé
+            avant = request.GET.get('before')
+            since_id = None
+            if avant is None:
+                non_modifie, since_id = synchronisation(request, conversation)
+                if non_modifie:
+                    return non_modifie
             
-            # Marquer les messages reçus comme lus
-            Message.objects.filter(
-                conversation=conversation,
-                receiver=request.user,
-                is_read=False
-            ).update(is_read=True)
+            # Marquer les messages reçus comme lus (seulement s'il y en a)
+            if conversation.a_lire(request.user):
+                marquer_lus(conversation, request.user)
+            
+            # Nouveaux messages avec since_id, sinon une fenêtre de l'historique
+            # (la plus récente, ou celle qui précède le curseur ``before``)
+            plus_anciens = None
+            if since_id is not None:
+                messages = conversation.messages.select_related(
+                    'sender', 'receiver'
+                ).filter(pk__gt=since_id).order_by('created_at')
+            else:
+                messages, plus_anciens = fenetre_historique(conversation, avant)
             
             # Préparer les données
             messages_data = []
@@ -1485,15 +1500,20 @@ def api_messages_conversation(request, conversation_id):
                     
                 messages_data.append(msg_data)
             
-            return JsonResponse({
+            response = JsonResponse({
                 'success': True,
                 'messages': messages_data,
                 'conversation': {
                     'id': conversation.id,
                     'agent_name': conversation.agent.get_full_name() or conversation.agent.username if conversation.agent else 'Support',
                     'status': 'active'  # Par défaut
-                }
+                },
+                'last_message_id': conversation.last_message_id,
+                'last_read_message_id': conversation.lu_jusqua_agent,
+                'older_cursor': plus_anciens,
             })
+            response['ETag'] = version_conversation(conversation)
+            return response
             
         except Conversation.DoesNotExist:
             return JsonResponse({'error': 'Conversation introuvable'}, status=404)
@@ -1571,10 +1591,6 @@ def api_upload_file(request):
                 is_read=False
             )
             
-            # Mettre à jour la conversation
-            conversation.updated_at = message.created_at
-            conversation.save()
-            
             # URL du fichier
             file_url = settings.MEDIA_URL + saved_path
             
@@ -1607,15 +1623,15 @@ def api_upload_file(request):
 def messagerie(request):
     """Vue pour l'interface de messagerie citoyenne"""
     try:
-        # Récupérer toutes les conversations du citoyen connecté
-        conversations = Conversation.objects.filter(
+        # Récupérer toutes les conversations du citoyen connecté (une requête :
+        # le résumé du dernier message est stocké sur la conversation)
+        conversations_qs = Conversation.objects.filter(
             declarant=request.user
-        ).select_related('agent', 'signalement').prefetch_related(
-            'messages__sender', 'messages__receiver'
-        ).order_by('-updated_at')
+        ).select_related('agent', 'signalement', 'last_message_sender').order_by('-updated_at')
+        conversations = list(conversations_qs)
         
         # Si aucune conversation n'existe, créer une conversation par défaut avec un agent
-        if not conversations.exists():
+        if not conversations:
             # Trouver un agent disponible (staff ou superuser)
             agent = Utilisateur.objects.filter(
                 is_staff=True
@@ -1652,33 +1668,26 @@ def messagerie(request):
             )
             
             # Recharger les conversations
-            conversations = Conversation.objects.filter(
-                declarant=request.user
-            ).select_related('agent', 'signalement').prefetch_related(
-                'messages__sender', 'messages__receiver'
-            ).order_by('-updated_at')
+            conversations = list(conversations_qs.all())
         
         # Conversation active (la première par défaut)
-        conversation_active = conversations.first() if conversations.exists() else None
+        conversation_active = conversations[0] if conversations else None
         messages = []
+        curseur_historique = None
         
         if conversation_active:
-            # Récupérer tous les messages de la conversation active
-            messages = conversation_active.messages.select_related(
-                'sender', 'receiver'
-            ).order_by('created_at')
-            
             # Marquer les messages reçus comme lus
-            Message.objects.filter(
-                conversation=conversation_active,
-                receiver=request.user,
-                is_read=False
-            ).update(is_read=True)
+            marquer_lus(conversation_active, request.user)
+            
+            # Fenêtre la plus récente de la conversation active (les plus
+            # anciens sont chargés au défilement)
+            messages, curseur_historique = fenetre_historique(conversation_active)
         
         context = {
             'conversations': conversations,
             'conversation_active': conversation_active,
             'messages': messages,
+            'curseur_historique': curseur_historique,
         }
         
     except Exception as e:
@@ -1941,8 +1950,7 @@ def marquer_message_lu(request, message_id):
         )
         
         # Marquer comme lu
-        message.is_read = True
-        message.save()
+        message.mark_as_read()
         
         return JsonResponse({
             'success': True,
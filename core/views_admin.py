@@ -4,8 +4,9 @@ from django.contrib import messages
 from django.db.models import Q, Count, Avg, F
 from django.db.models.functions import TruncMonth, TruncDate
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse
 from django.core.paginator import Paginator
+from django.urls import reverse
 from django.contrib.auth.decorators import user_passes_test
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -21,8 +22,23 @@ from .models import (
 from .forms import AdminForm, AgentForm
 from django.contrib.auth.hashers import make_password
 from .decorators import admin_required
+from .search import search_declarations
+from .pagination import PaginateurCurseur, agregats_en_cache
+from .statistiques import compteurs_nationaux, faits_journaliers, somme
+from .notifications import creer_notifications
+from .exports import ouvrir as ouvrir_export
+from .taches import planifier
+from .cache_pages import PAGES_CACHE_TIMEOUT, statistiques_cache
 from .utils import create_notification, log_action, update_region_statistics, get_user_ip, get_user_agent
 
+# Tris autorisés pour les listes paginées par curseur (champs non nuls)
+ORDRES_UTILISATEURS = ['username', '-username', 'role', '-role', 'date_joined', '-date_joined']
+ORDRES_DECLARATIONS = [
+    '-date_declaration', 'date_declaration', '-date_incident', 'date_incident',
+    'nom_objet', '-nom_objet', 'numero_declaration', '-numero_declaration',
+    'statut', '-statut', '-priorite', 'priorite',
+]
+
 
 # ============ VUES ADMIN ============
 
@@ -51,17 +67,20 @@ def admin_dashboard(request):
     
     # === MÉTRIQUES CLÉS - BASÉES SUR LES DÉCLARATIONS ===
     
+    # Compteurs maintenus par incréments (core/statistiques.py) : une seule lecture
+    compteurs = compteurs_nationaux()
+    
     # Déclarations totales et par type
-    total_declarations = Declaration.objects.count()
-    declarations_periode = Declaration.objects.filter(date_declaration__gte=date_debut).count()
-    objets_perdus = Declaration.objects.filter(type_declaration='perdu').count()
-    objets_trouves = Declaration.objects.filter(type_declaration='trouve').count()
+    total_declarations = compteurs['total_declarations']
+    declarations_periode = faits_journaliers(timezone.localtime(date_debut).date()).aggregate(total=somme())['total']
+    objets_perdus = compteurs['declarations_perdues']
+    objets_trouves = compteurs['declarations_trouvees']
     
     # Déclarations en attente (statut créé ou en validation)
-    declarations_en_attente = Declaration.objects.filter(statut__in=['cree', 'en_validation']).count()
+    declarations_en_attente = compteurs['declarations_en_attente']
     
     # Déclarations validées (validé, publié, restitué)
-    declarations_validees = Declaration.objects.filter(statut__in=['valide', 'publie', 'restitue']).count()
+    declarations_validees = compteurs['declarations_validees']
     
     # Utilisateurs (citoyens uniquement, sans agents)
     total_citoyens = Utilisateur.objects.filter(role='citoyen').count()
@@ -73,20 +92,21 @@ def admin_dashboard(request):
     nouveaux_agents = Utilisateur.objects.filter(role='agent', date_joined__gte=date_debut).count()
     
     # Objets restitués (métrique de succès)
-    objets_restitues = Declaration.objects.filter(statut='restitue').count()
+    objets_restitues = compteurs['objets_restitues']
     taux_restitution = round((objets_restitues / max(total_declarations, 1)) * 100, 1)
     
     # === ÉVOLUTION MENSUELLE ===
+    # Une seule requête sur les agrégats journaliers, regroupés par tranches de 30 jours
+    aujourd_hui = timezone.localdate()
+    par_jour = dict(
+        faits_journaliers(aujourd_hui - timedelta(days=179)).values_list('jour').annotate(total=somme())
+    )
     evolution_labels = []
     evolution_values = []
     
     for i in range(6, 0, -1):
-        date_fin = timezone.now() - timedelta(days=30*(i-1))
-        date_debut_mois = date_fin - timedelta(days=30)
-        count = Declaration.objects.filter(
-            date_declaration__gte=date_debut_mois,
-            date_declaration__lt=date_fin
-        ).count()
+        date_fin = aujourd_hui - timedelta(days=30*(i-1))
+        count = sum(par_jour.get(date_fin - timedelta(days=j), 0) for j in range(30))
         evolution_labels.append(date_fin.strftime('%b'))
         evolution_values.append(count)
     
@@ -116,7 +136,7 @@ def admin_dashboard(request):
     # === MÉTRIQUES DE PERFORMANCE ===
     
     # Répartition par statut des déclarations
-    repartition_statuts = Declaration.objects.values('statut').annotate(count=Count('id'))
+    repartition_statuts = faits_journaliers().values('statut').annotate(count=somme())
     statuts_data = {}
     for item in repartition_statuts:
         statuts_data[item['statut']] = item['count']
@@ -157,7 +177,7 @@ def admin_dashboard(request):
     dernieres_restitutions = Declaration.objects.filter(statut='restitue').order_by('-date_restitution')[:5]
     
     # Répartition par catégorie avec pourcentages
-    categories_raw = Declaration.objects.values('categorie__nom').annotate(count=Count('id')).order_by('-count')[:5]
+    categories_raw = faits_journaliers().values('categorie__nom').annotate(count=somme()).order_by('-count')[:5]
     top_categories = []
     max_cat_count = max([c['count'] for c in categories_raw], default=1)
     for cat in categories_raw:
@@ -168,7 +188,7 @@ def admin_dashboard(request):
         })
     
     # Répartition par région avec pourcentages
-    regions_raw = Declaration.objects.values('region__nom').annotate(count=Count('id')).order_by('-count')[:5]
+    regions_raw = faits_journaliers().values('region__nom').annotate(count=somme()).order_by('-count')[:5]
     top_regions = []
     max_reg_count = max([r['count'] for r in regions_raw], default=1)
     for reg in regions_raw:
@@ -249,10 +269,10 @@ def conversations_monitoring(request):
     """Suivi des conversations (métadonnées uniquement, pas de contenu)"""
     from datetime import timedelta
     from django.utils import timezone
-    from django.db.models import Count, Q, Max
+    from django.db.models import Q
     
     try:
-        from .models import Conversation, Message
+        from .models import Conversation
         
         # Statistiques globales
         total_conversations = Conversation.objects.count()
@@ -264,11 +284,9 @@ def conversations_monitoring(request):
         statut_filter = request.GET.get('statut', 'all')
         search_query = request.GET.get('search', '')
         
+        # Nombre de messages et dernière activité sont stockés sur la conversation
         conversations = Conversation.objects.select_related(
             'agent', 'declarant', 'signalement'
-        ).annotate(
-            message_count=Count('messages'),
-            last_message_date=Max('messages__created_at')
         ).order_by('-updated_at')
         
         # Filtres
@@ -309,37 +327,48 @@ def conversations_monitoring(request):
     return render(request, 'admin/conversations_monitoring.html', context)
 
 
+@admin_required
+def cache_pages_stats(request):
+    """Compteurs du cache des pages publiques (supervision)"""
+    return JsonResponse({
+        'timeout': PAGES_CACHE_TIMEOUT,
+        'vues': statistiques_cache(),
+    })
+
+
 @admin_required
 def statistics(request):
     """Page des statistiques détaillées"""
     user = request.user
     
-    # Filtrer par région de l'admin
-    region_filter = Q()
-    if user.region:
-        region_filter = Q(region=user.region)
+    # Filtrer par région de l'admin (agrégats journaliers)
+    faits = faits_journaliers(region=user.region)
     
-    # KPI principaux
+    # KPI principaux et statistiques par statut (une requête)
+    totaux = faits.aggregate(
+        total=somme(),
+        pending=somme(statut='cree'),
+        validated=somme(statut='valide'),
+        published=somme(statut='publie'),
+        returned=somme(statut='restitue'),
+    )
     kpi = {
-        'total_declarations': Declaration.objects.filter(region_filter).count(),
+        'total_declarations': totaux.pop('total'),
         'resolution_rate': 75.5,  # Calculer le taux réel
         'avg_response_time': 24,  # Temps moyen en heures
         'user_satisfaction': 4.2,
     }
+    status_stats = totaux
     
-    # Données pour les graphiques
+    # Données pour les graphiques : 6 derniers mois
+    debut = (timezone.localdate().replace(day=1) - timedelta(days=150)).replace(day=1)
+    mois = faits.filter(jour__gte=debut).annotate(mois=TruncMonth('jour')).values('mois').annotate(
+        declarations=somme(), resolutions=somme(statut='restitue')
+    ).order_by('mois')
     evolution_data = {
-        'labels': json.dumps(['Jan', 'Feb', 'Mar', 'Apr', 'Mai', 'Jun']),
-        'declarations': json.dumps([10, 15, 12, 20, 18, 25]),
-        'resolutions': json.dumps([8, 12, 10, 16, 15, 20])
-    }
-    
-    # Statistiques par statut
-    status_stats = {
-        'pending': Declaration.objects.filter(region_filter & Q(statut='cree')).count(),
-        'validated': Declaration.objects.filter(region_filter & Q(statut='valide')).count(),
-        'published': Declaration.objects.filter(region_filter & Q(statut='publie')).count(),
-        'returned': Declaration.objects.filter(region_filter & Q(statut='restitue')).count(),
+        'labels': json.dumps([m['mois'].strftime('%b') for m in mois]),
+        'declarations': json.dumps([m['declarations'] for m in mois]),
+        'resolutions': json.dumps([m['resolutions'] for m in mois])
     }
     
     context = {
@@ -460,7 +489,11 @@ def agents_list(request):
     agents = Utilisateur.objects.filter(role='agent').select_related(
         'region', 'prefecture', 'structure_locale'
     ).annotate(
-        nb_validations=Count('declarations_validees', distinct=True)
+        nb_validations=Count('declarations_validees', distinct=True),
+        validations_count=Count(
+            'declarations_validees', distinct=True,
+            filter=Q(declarations_validees__statut__in=['valide', 'publie', 'restitue'])
+        ),
     )
     
     # Filtres
@@ -484,27 +517,26 @@ def agents_list(request):
     # Tri
     agents = agents.order_by('-date_joined')
     
-    # Pagination
-    paginator = Paginator(agents, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur
+    page_obj = PaginateurCurseur(agents, 20, total='cache').page(request.GET.get('cursor'))
     
-    # Statistiques
-    total_agents = Utilisateur.objects.filter(role='agent').count()
-    agents_actifs = Utilisateur.objects.filter(role='agent', actif=True).count()
-    agents_inactifs = Utilisateur.objects.filter(role='agent', actif=False).count()
-    nouveaux_agents = Utilisateur.objects.filter(
-        role='agent',
-        date_joined__gte=timezone.now() - timedelta(days=7)
-    ).count()
+    # Statistiques (une seule requête)
+    stats_agents = Utilisateur.objects.filter(role='agent').aggregate(
+        total=Count('id'),
+        actifs=Count('id', filter=Q(actif=True)),
+        inactifs=Count('id', filter=Q(actif=False)),
+        nouveaux=Count('id', filter=Q(date_joined__gte=timezone.now() - timedelta(days=7))),
+    )
+    total_agents = stats_agents['total']
+    agents_actifs = stats_agents['actifs']
+    agents_inactifs = stats_agents['inactifs']
+    nouveaux_agents = stats_agents['nouveaux']
     
     # Régions disponibles
     regions = Region.objects.all().order_by('nom')
     
-    # Annoter les agents avec leurs statistiques
     for agent in page_obj:
-        agent.declarations_count = Declaration.objects.filter(agent_validateur=agent).count()
-        agent.validations_count = Declaration.objects.filter(agent_validateur=agent, statut__in=['valide', 'publie', 'restitue']).count()
+        agent.declarations_count = agent.nb_validations
     
     context = {
         'agents': page_obj,
@@ -722,14 +754,14 @@ def admin_users(request):
         nb_declarations_validees=Count('declarations_validees')
     )
     
-    # Tri
+    # Tri (champs non nuls uniquement : pagination par curseur)
     ordre = request.GET.get('ordre', '-date_joined')
+    if ordre not in ORDRES_UTILISATEURS:
+        ordre = '-date_joined'
     utilisateurs = utilisateurs.order_by(ordre)
     
-    # Pagination
-    paginator = Paginator(utilisateurs, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur
+    page_obj = PaginateurCurseur(utilisateurs, 20, total='cache').page(request.GET.get('cursor'))
     
     # Statistiques détaillées
     if user.role == 'admin':
@@ -868,13 +900,13 @@ def admin_rapports(request):
     
     # === STATISTIQUES OPTIMISÉES EN UNE SEULE REQUÊTE ===
     
-    # Signalements avec toutes les stats en une requête
-    signalement_stats = Signalement.objects.aggregate(
-        total=Count('id'),
-        periode=Count('id', filter=Q(date_signalement__gte=date_debut)),
-        en_attente=Count('id', filter=Q(statut='en_attente')),
-        valides=Count('id', filter=Q(statut__in=['valide', 'publie'])),
-        restitues=Count('id', filter=Q(statut='restitue'))
+    # Déclarations : toutes les stats en une requête sur les agrégats journaliers
+    signalement_stats = faits_journaliers().aggregate(
+        total=somme(),
+        periode=somme(jour__gte=timezone.localtime(date_debut).date()),
+        en_attente=somme(statut__in=['cree', 'en_validation']),
+        valides=somme(statut__in=['valide', 'publie']),
+        restitues=somme(statut='restitue')
     )
     
     # Utilisateurs avec stats en une requête
@@ -892,14 +924,21 @@ def admin_rapports(request):
     taux_restitution = round((signalement_stats['restitues'] / total_signalements) * 100, 1) if total_signalements > 0 else 0
     
     # === ÉVOLUTION SIMPLIFIÉE (6 mois au lieu de 12) ===
+    aujourd_hui = timezone.localdate()
+    par_jour = {
+        ligne['jour']: ligne
+        for ligne in faits_journaliers(aujourd_hui - timezone.timedelta(days=179)).values('jour').annotate(
+            total=somme(), valides=somme(statut__in=['valide', 'publie'])
+        )
+    }
+    
     evolution_mensuelle = []
     for i in range(6, 0, -1):  # Réduit de 12 à 6 mois
-        date_fin = timezone.now() - timezone.timedelta(days=30*(i-1))
-        date_debut_mois = date_fin - timezone.timedelta(days=30)
-        count = Signalement.objects.filter(
-            date_signalement__gte=date_debut_mois,
-            date_signalement__lt=date_fin
-        ).count()
+        date_fin = aujourd_hui - timezone.timedelta(days=30*(i-1))
+        count = sum(
+            par_jour[jour]['total'] for jour in (date_fin - timezone.timedelta(days=j) for j in range(30))
+            if jour in par_jour
+        )
         evolution_mensuelle.append({
             'mois': date_fin.strftime('%Y-%m'),
             'label': date_fin.strftime('%b %Y'),
@@ -915,18 +954,15 @@ def admin_rapports(request):
         {'statut': 'restitue', 'count': signalement_stats['restitues']}
     ]
     
-    # Évolution quotidienne simplifiée (7 derniers jours)
+    # Évolution quotidienne simplifiée (7 derniers jours, mêmes agrégats)
     evolution_quotidienne = []
     for i in range(7):
-        jour = timezone.now().date() - timezone.timedelta(days=i)
-        count = Signalement.objects.filter(date_signalement__date=jour).count()
+        jour = aujourd_hui - timezone.timedelta(days=i)
+        ligne = par_jour.get(jour, {})
         evolution_quotidienne.append({
             'jour': jour.isoformat(),
-            'nouveaux': count,
-            'valides': Signalement.objects.filter(
-                date_signalement__date=jour, 
-                statut__in=['valide', 'publie']
-            ).count()
+            'nouveaux': ligne.get('total', 0),
+            'valides': ligne.get('valides', 0)
         })
     
     evolution_quotidienne.reverse()  # Ordre chronologique
@@ -942,8 +978,8 @@ def admin_rapports(request):
     ).filter(signalements_traites__gt=0).order_by('-signalements_traites')[:5]
     
     # === RÉPARTITION GÉOGRAPHIQUE SIMPLIFIÉE ===
-    repartition_regions = Signalement.objects.values('region__nom').annotate(
-        count=Count('id')
+    repartition_regions = faits_journaliers().values('region__nom').annotate(
+        count=somme()
     ).order_by('-count')[:5]  # Top 5 seulement
     
     # === DONNÉES POUR EXPORT JSON ===
@@ -1182,73 +1218,26 @@ def export_rapport_pdf(request):
 
 
 def export_rapport_csv(request):
-    """Export des données de rapport en CSV"""
-    from django.http import HttpResponse
-    import csv
-    from io import StringIO
-    
-    # Période sélectionnée
+    """Export des données de rapport en CSV (généré en arrière-plan, voir core/exports.py)"""
     periode = request.GET.get('periode', '30')
     try:
         jours = int(periode)
     except:
         jours = 30
     
-    date_debut = timezone.now() - timezone.timedelta(days=jours)
-    
-    # Créer la réponse HTTP avec le type CSV
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="rapport_togoretrouve_{timezone.now().strftime("%Y%m%d_%H%M")}.csv"'
-    
-    # Ajouter le BOM pour Excel
-    response.write('\ufeff')
-    
-    writer = csv.writer(response)
-    
-    # En-tête du rapport
-    writer.writerow(['RAPPORT TOGORETROUVE'])
-    writer.writerow(['Période', f'{jours} derniers jours'])
-    writer.writerow(['Date de génération', timezone.now().strftime('%d/%m/%Y %H:%M')])
-    writer.writerow([])
-    
-    # Statistiques globales
-    writer.writerow(['=== STATISTIQUES GLOBALES ==='])
-    writer.writerow(['Métrique', 'Valeur'])
-    writer.writerow(['Total signalements', Signalement.objects.count()])
-    writer.writerow(['Signalements période', Signalement.objects.filter(date_signalement__gte=date_debut).count()])
-    writer.writerow(['En attente', Signalement.objects.filter(statut='en_attente').count()])
-    writer.writerow(['Validés', Signalement.objects.filter(statut__in=['valide', 'publie']).count()])
-    writer.writerow(['Restitués', Signalement.objects.filter(statut='restitue').count()])
-    writer.writerow(['Total utilisateurs', Utilisateur.objects.count()])
-    writer.writerow(['Utilisateurs actifs', Utilisateur.objects.filter(last_login__gte=date_debut).count()])
-    writer.writerow(['Nouveaux utilisateurs', Utilisateur.objects.filter(date_joined__gte=date_debut).count()])
-    writer.writerow(['Total agents', Utilisateur.objects.filter(role='agent').count()])
-    writer.writerow(['Agents actifs', Utilisateur.objects.filter(role='agent', actif=True).count()])
-    writer.writerow([])
-    
-    # Répartition par statut
-    writer.writerow(['=== RÉPARTITION PAR STATUT ==='])
-    writer.writerow(['Statut', 'Nombre'])
-    for item in Signalement.objects.values('statut').annotate(count=Count('id')):
-        writer.writerow([item['statut'], item['count']])
-    writer.writerow([])
-    
-    # Signalements détaillés de la période
-    writer.writerow(['=== SIGNALEMENTS DE LA PÉRIODE ==='])
-    writer.writerow(['Date', 'Utilisateur', 'Titre', 'Statut', 'Région'])
-    
-    for signalement in Signalement.objects.filter(
-        date_signalement__gte=date_debut
-    ).select_related('utilisateur', 'region').order_by('-date_signalement'):
-        writer.writerow([
-            signalement.date_signalement.strftime('%d/%m/%Y %H:%M'),
-            signalement.utilisateur.username if signalement.utilisateur else 'N/A',
-            getattr(signalement, 'titre', 'N/A')[:50],
-            signalement.statut,
-            signalement.region.nom if signalement.region else 'N/A'
-        ])
-    
-    return response
+    planifier('export_rapport_csv', jours, request.user.id)
+    messages.info(request, "L'export CSV est en préparation : une notification vous donnera le lien de téléchargement.")
+    return redirect(f"{reverse('togo_admin:reports')}?periode={jours}")
+
+
+@admin_required
+def telecharger_export(request, nom):
+    """Télécharger un export généré par la file de tâches"""
+    try:
+        fichier = ouvrir_export(nom)
+    except FileNotFoundError:
+        raise Http404("Export introuvable")
+    return FileResponse(fichier, as_attachment=True, filename=nom, content_type='text/csv; charset=utf-8')
 
 
 # ============ NOUVELLES VUES POUR GESTION AVANCÉE ============
@@ -2387,21 +2376,20 @@ def signalements_list(request):
     # Ordonner par date de création (plus récents en premier)
     signalements = signalements_query.order_by('-date_signalement')
     
-    # Pagination
-    paginator = Paginator(signalements, 20)
-    page_number = request.GET.get('page')
-    signalements_page = paginator.get_page(page_number)
+    # Pagination par curseur
+    signalements_page = PaginateurCurseur(signalements, 20).page(request.GET.get('cursor'))
     
-    # Statistiques
+    # Statistiques (une requête, mise en cache selon les filtres)
     today = timezone.now().date()
-    stats = {
-        'total_count': signalements_query.count(),
-        'perdu_count': signalements_query.filter(statut='perdu').count(),
-        'trouve_count': signalements_query.filter(statut='trouve').count(),
-        'retourne_count': signalements_query.filter(statut='retourne').count(),
-        'today_count': signalements_query.filter(date_signalement__date=today).count(),
-        'unique_users': signalements_query.values('utilisateur').distinct().count(),
-    }
+    stats = agregats_en_cache(
+        signalements_query,
+        total_count=Count('id'),
+        perdu_count=Count('id', filter=Q(statut='perdu')),
+        trouve_count=Count('id', filter=Q(statut='trouve')),
+        retourne_count=Count('id', filter=Q(statut='retourne')),
+        today_count=Count('id', filter=Q(date_signalement__date=today)),
+        unique_users=Count('utilisateur', distinct=True),
+    )
     
     context = {
         'signalements': signalements_page,
@@ -2786,35 +2774,36 @@ def objets_supervision(request):
             pass
     
     if search:
-        declarations = declarations.filter(
-            Q(nom_objet__icontains=search) |
-            Q(description__icontains=search) |
-            Q(numero_declaration__icontains=search) |
-            Q(declarant__username__icontains=search) |
-            Q(declarant__email__icontains=search)
+        # Index plein texte + déclarants correspondants (sous-requête sur la table des utilisateurs)
+        declarants = Utilisateur.objects.filter(
+            Q(username__icontains=search) | Q(email__icontains=search)
+        ).values('id')
+        declarations = search_declarations(
+            declarations, query=search, extra=Q(declarant__in=declarants)
         )
     
-    # Statistiques globales
-    stats = {
-        'total': declarations.count(),
-        'perdus': declarations.filter(type_declaration='perdu').count(),
-        'trouves': declarations.filter(type_declaration='trouve').count(),
-        'valides': declarations.filter(statut='valide').count(),
-        'publies': declarations.filter(statut='publie').count(),
-        'restitues': declarations.filter(statut='restitue').count(),
-        'en_attente': declarations.filter(statut='cree').count(),
-    }
+    # Statistiques globales (une requête, mise en cache selon les filtres)
+    stats = agregats_en_cache(
+        declarations,
+        total=Count('id'),
+        perdus=Count('id', filter=Q(type_declaration='perdu')),
+        trouves=Count('id', filter=Q(type_declaration='trouve')),
+        valides=Count('id', filter=Q(statut='valide')),
+        publies=Count('id', filter=Q(statut='publie')),
+        restitues=Count('id', filter=Q(statut='restitue')),
+        en_attente=Count('id', filter=Q(statut='cree')),
+    )
     
-    # Tri
+    # Tri (champs non nuls uniquement : pagination par curseur)
     ordre = request.GET.get('ordre', '-date_declaration')
+    if ordre not in ORDRES_DECLARATIONS:
+        ordre = '-date_declaration'
     declarations = declarations.select_related(
         'declarant', 'region', 'prefecture', 'categorie', 'agent_validateur'
     ).order_by(ordre)
     
-    # Pagination
-    paginator = Paginator(declarations, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur (le total est celui des statistiques)
+    page_obj = PaginateurCurseur(declarations, 50).page(request.GET.get('cursor'))
     
     # Données pour les filtres
     from core.models import CategorieObjet
@@ -2870,31 +2859,21 @@ def statistiques_page(request):
         date_debut_obj = timezone.now().date() - timezone.timedelta(days=30)
         date_fin_obj = timezone.now().date()
     
-    # Base query
-    if user.region:
-        declarations = Declaration.objects.filter(region=user.region)
-    else:
-        declarations = Declaration.objects.all()
-    
+    # Agrégats journaliers de la période (bornes incluses)
+    faits = faits_journaliers(date_debut_obj, date_fin_obj, region=user.region)
     if region_filter and user.role == 'admin':
-        declarations = declarations.filter(region_id=region_filter)
-    
-    # Filtrer par période
-    declarations_periode = declarations.filter(
-        date_declaration__gte=date_debut_obj,
-        date_declaration__lte=date_fin_obj
+        faits = faits.filter(region_id=region_filter)
+    
+    # Statistiques générales (une requête)
+    stats_generales = faits.aggregate(
+        total_declarations=somme(),
+        objets_perdus=somme(type_declaration='perdu'),
+        objets_trouves=somme(type_declaration='trouve'),
+        declarations_validees=somme(statut__in=['valide', 'publie']),
+        objets_restitues=somme(statut='restitue'),
+        en_attente_validation=somme(statut='cree'),
     )
-    
-    # Statistiques générales
-    stats_generales = {
-        'total_declarations': declarations_periode.count(),
-        'objets_perdus': declarations_periode.filter(type_declaration='perdu').count(),
-        'objets_trouves': declarations_periode.filter(type_declaration='trouve').count(),
-        'declarations_validees': declarations_periode.filter(statut__in=['valide', 'publie']).count(),
-        'objets_restitues': declarations_periode.filter(statut='restitue').count(),
-        'en_attente_validation': declarations_periode.filter(statut='cree').count(),
-        'taux_restitution': 0,
-    }
+    stats_generales['taux_restitution'] = 0
     
     if stats_generales['total_declarations'] > 0:
         stats_generales['taux_restitution'] = round(
@@ -2902,20 +2881,19 @@ def statistiques_page(request):
         )
     
     # Statistiques par catégorie
-    from core.models import CategorieObjet
-    stats_categories = declarations_periode.values('categorie__nom').annotate(
-        total=Count('id')
+    stats_categories = faits.values('categorie__nom').annotate(
+        total=somme()
     ).order_by('-total')[:10]
     
     # Statistiques par région
-    stats_regions = declarations_periode.values('region__nom').annotate(
-        total=Count('id'),
-        restitues=Count('id', filter=Q(statut='restitue'))
+    stats_regions = faits.values('region__nom').annotate(
+        total=somme(),
+        restitues=somme(statut='restitue')
     ).order_by('-total')[:10]
     
     # Statistiques par statut
-    stats_statuts = declarations_periode.values('statut').annotate(
-        total=Count('id')
+    stats_statuts = faits.values('statut').annotate(
+        total=somme()
     ).order_by('-total')
     
     # Performance des agents
@@ -2924,28 +2902,24 @@ def statistiques_page(request):
         is_active=True
     ).annotate(
         validations=Count(
-            'validations',
+            'declarations_validees',
             filter=Q(
-                validations__date_validation__gte=date_debut_obj,
-                validations__date_validation__lte=date_fin_obj
+                declarations_validees__date_declaration__date__gte=date_debut_obj,
+                declarations_validees__date_declaration__date__lte=date_fin_obj
             )
         ),
         restitutions=Count(
-            'restitutions_effectuees',
+            'declarations_validees',
             filter=Q(
-                restitutions_effectuees__date_restitution__gte=date_debut_obj,
-                restitutions_effectuees__date_restitution__lte=date_fin_obj
+                declarations_validees__statut='restitue',
+                declarations_validees__date_restitution__date__gte=date_debut_obj,
+                declarations_validees__date_restitution__date__lte=date_fin_obj
             )
         )
     ).filter(Q(validations__gt=0) | Q(restitutions__gt=0)).order_by('-validations')[:10]
     
     # Évolution temporelle (par jour)
-    from django.db.models.functions import TruncDate
-    evolution = declarations_periode.annotate(
-        jour=TruncDate('date_declaration')
-    ).values('jour').annotate(
-        total=Count('id')
-    ).order_by('jour')
+    evolution = faits.values('jour').annotate(total=somme()).order_by('jour')
     
     # Préparer pour Chart.js
     evolution_data = {
@@ -3198,17 +3172,16 @@ def notify_users(request):
         else:
             users = Utilisateur.objects.filter(id__in=user_selection, is_active=True)
         
-        sent_count = 0
-        for user in users:
-            create_notification(
-                destinataire=user,
-                type_notification='notification_generale',
-                titre='Notification générale',
-                message=message,
-                importante=True,
-                envoyer_email=False
-            )
-            sent_count += 1
+        # Insertion par lots en une transaction, publication après validation
+        resultat = creer_notifications(
+            users,
+            type_notification='notification_generale',
+            titre='Notification générale',
+            message=message,
+            importante=True,
+            envoyer_email=False
+        )
+        sent_count = resultat['crees']
         
         log_action(
             user=request.user,
@@ -3216,12 +3189,17 @@ def notify_users(request):
             description=f'Notification envoyée à {sent_count} utilisateurs',
             ip_address=get_user_ip(request),
             user_agent=get_user_agent(request),
-            donnees_supplementaires={'message': message, 'sent_count': sent_count}
+            donnees_supplementaires={
+                'message': message,
+                'sent_count': sent_count,
+                'lignes_par_seconde': round(resultat['lignes_par_seconde']),
+            }
         )
         
         return JsonResponse({
             'success': True, 
             'sent': sent_count,
+            'rows_per_second': round(resultat['lignes_par_seconde']),
             'message': f'Notifications envoyées à {sent_count} utilisateurs'
         })
         
@@ -1,10 +1,9 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count, Max
+from django.db.models import F
 from django.utils import timezone
 from django.http import JsonResponse
-from django.core.paginator import Paginator
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.urls import reverse
@@ -15,6 +14,12 @@ from .models import (
     Notification, ActionLog, CommentaireAnonyme, Utilisateur
 )
 from .decorators import role_required
+from .search import search_declarations
+from .matching import correspondances_pour
+from .pagination import PaginateurCurseur
+from .statistiques import statistiques_structure
+from .messagerie import fenetre_historique, marquer_lus, synchronisation, version_conversation
+from .notifications import publier_compteur as publier_compteur_notifications
 # Les formulaires spécifiques aux agents seront ajoutés plus tard si nécessaire
 
 @login_required
@@ -45,6 +50,24 @@ def archiver_signalement(request, signalement_id):
     return redirect('togo_agent:signalement_detail', signalement_id=signalement_id)
 
 
+def _stats_dashboard(agent):
+    """
+    Statistiques du dashboard d'un agent : les compteurs de sa structure
+    (maintenus par incréments) plus ses propres objets retrouvés
+    """
+    compteurs = statistiques_structure(agent.structure_locale)
+    return {
+        'total_signalements': compteurs.total_declarations,
+        'objets_retrouves': Declaration.objects.filter(
+            structure_locale=agent.structure_locale,
+            type_declaration='trouve',
+            agent_validateur=agent
+        ).count(),
+        'objets_restitues': compteurs.objets_restitues,
+        'demandes_attente': compteurs.reclamations_soumises,
+    }
+
+
 @login_required
 @role_required(['agent'])
 def agent_dashboard(request):
@@ -62,22 +85,7 @@ def agent_dashboard(request):
     base_filter = {'structure_locale': user.structure_locale}
     
     # Statistiques principales
-    stats = {
-        'total_signalements': Declaration.objects.filter(**base_filter).count(),
-        'objets_retrouves': Declaration.objects.filter(
-            **base_filter, 
-            type_declaration='trouve', 
-            agent_validateur=user
-        ).count(),
-        'objets_restitues': Declaration.objects.filter(
-            **base_filter, 
-            statut='restitue'
-        ).count(),
-        'demandes_attente': Reclamation.objects.filter(
-            declaration__in=Declaration.objects.filter(**base_filter),
-            statut='soumise'
-        ).count(),
-    }
+    stats = _stats_dashboard(user)
     
     # Signalements récents nécessitant une action
     signalements_en_attente = Declaration.objects.filter(
@@ -95,7 +103,7 @@ def agent_dashboard(request):
     conversations_actives = Conversation.objects.filter(
         agent=user
     ).annotate(
-        messages_non_lus=Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=user))
+        messages_non_lus=F('non_lus_agent')
     ).order_by('-updated_at')[:5]
     
     # Activité récente
@@ -158,7 +166,7 @@ def agent_chat_dashboard(request):
     conversations_actives = Conversation.objects.filter(
         agent=user
     ).annotate(
-        messages_non_lus=Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=user))
+        messages_non_lus=F('non_lus_agent')
     ).order_by('-updated_at')[:5]
     
     # Conversation sélectionnée
@@ -243,20 +251,14 @@ def mes_signalements(request):
         signalements = signalements.filter(type_declaration=type_filter)
 
     if search_query:
-        signalements = signalements.filter(
-            Q(nom_objet__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(numero_declaration__icontains=search_query)
-        )
+        signalements = search_declarations(signalements, query=search_query)
     
     signalements = signalements.select_related(
         'declarant', 'categorie', 'region', 'prefecture', 'structure_locale'
     ).order_by('-date_declaration')
     
-    # Pagination
-    paginator = Paginator(signalements, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur
+    page_obj = PaginateurCurseur(signalements, 20, total='cache').page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -301,9 +303,13 @@ def signalement_detail(request, signalement_id):
         declaration=signalement
     ).select_related('utilisateur').order_by('-date_action')
     
+    # Correspondances perdu/trouvé proposées automatiquement
+    correspondances = correspondances_pour(signalement)
+    
     context = {
         'signalement': signalement,
         'reclamations': reclamations,
+        'correspondances': correspondances,
         'commentaires': commentaires,
         'conversations': conversations,
         'historique': historique,
@@ -1186,13 +1192,13 @@ def messagerie(request):
         messages.error(request, "Aucune structure locale assignée. Contactez votre administrateur.")
         return redirect('togo_agent:dashboard')
     
-    # Récupérer toutes les conversations de l'agent
-    conversations = Conversation.objects.filter(
+    # Récupérer toutes les conversations de l'agent (une requête : résumé et
+    # compteur de non lus sont stockés sur la conversation)
+    conversations = list(Conversation.objects.filter(
         agent=user
-    ).select_related('signalement', 'declarant', 'agent').annotate(
-        messages_non_lus=Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=user)),
-        dernier_message_date=Max('messages__created_at')
-    ).order_by('-updated_at')
+    ).select_related(
+        'signalement__declarant', 'declarant', 'agent', 'last_message_sender'
+    ).order_by('-updated_at'))
     
     # Conversation sélectionnée (première par défaut ou spécifiée)
     conversation_id = request.GET.get('conversation_id')
@@ -1200,26 +1206,24 @@ def messagerie(request):
     messages_conv = []
     
     if conversation_id:
-        try:
-            selected_conversation = conversations.get(id=conversation_id)
-        except Conversation.DoesNotExist:
-            pass
-    elif conversations.exists():
-        selected_conversation = conversations.first()
+        selected_conversation = next((c for c in conversations if str(c.id) == conversation_id), None)
+    elif conversations:
+        selected_conversation = conversations[0]
     
+    curseur_historique = None
     if selected_conversation:
-        # Messages de la conversation sélectionnée
-        messages_conv = selected_conversation.messages.select_related('sender').order_by('created_at')
+        # Fenêtre la plus récente de la conversation sélectionnée (les plus
+        # anciens sont chargés au défilement)
+        messages_conv, curseur_historique = fenetre_historique(selected_conversation)
         
         # Marquer les messages comme lus
-        messages_conv.filter(is_read=False).exclude(sender=user).update(
-            is_read=True
-        )
+        marquer_lus(selected_conversation, user)
     
     context = {
         'conversations': conversations,
         'selected_conversation': selected_conversation,
         'messages_conv': messages_conv,
+        'curseur_historique': curseur_historique,
         'agent': user,
     }
     
@@ -1265,10 +1269,6 @@ def send_message(request, conversation_id):
             type_message=type_message
         )
         
-        # Mettre à jour la conversation
-        conversation.updated_at = timezone.now()
-        conversation.save(update_fields=['updated_at'])
-        
         # Créer une notification pour le déclarant
         Notification.objects.create(
             destinataire=conversation.declarant,
@@ -1332,15 +1332,33 @@ def conversation_detail(request, conversation_id):
 @role_required(['agent'])
 def get_conversation_messages(request, conversation_id):
     """
-    API pour récupérer les messages d'une conversation (pour le polling)
+    API pour récupérer les messages d'une conversation (pour le polling).
+    
+    Incrémentale : ``since_id`` ou ``If-None-Match`` ne renvoient que les
+    nouveaux messages, ou 304 (une seule requête, aucune écriture). Sans
+    eux, seule la fenêtre la plus récente est renvoyée ; ``before`` (curseur
+    ``older_cursor``) charge la fenêtre précédente.
     """
     try:
         user = request.user
-        conversation = get_object_or_404(Conversation, id=conversation_id, agent=user)
+        conversation = get_object_or_404(
+            Conversation.objects.select_related('declarant', 'signalement'), id=conversation_id, agent=user
+        )
+        avant = request.GET.get('before')
+        since_id = None
+        if avant is None:
+            non_modifie, since_id = synchronisation(request, conversation)
+            if non_modifie:
+                return non_modifie
         
-        # Récupérer les messages
+        # Nouveaux messages avec since_id, sinon une fenêtre de l'historique
+        plus_anciens = None
+        if since_id is not None:
+            nouveaux = conversation.messages.select_related('sender').filter(pk__gt=since_id).order_by('created_at')
+        else:
+            nouveaux, plus_anciens = fenetre_historique(conversation, avant)
         messages_list = []
-        for msg in conversation.messages.all().select_related('sender').order_by('created_at'):
+        for msg in nouveaux:
             message_data = {
                 'id': msg.id,
                 'contenu': msg.contenu,
@@ -1360,11 +1378,9 @@ def get_conversation_messages(request, conversation_id):
             
             messages_list.append(message_data)
         
-        # Marquer les messages non lus comme lus
-        conversation.messages.filter(is_read=False).exclude(sender=user).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
+        # Marquer les messages non lus comme lus (seulement s'il y en a)
+        if conversation.a_lire(user):
+            marquer_lus(conversation, user)
         
         # Préparer les infos de la conversation
         declarant = conversation.declarant
@@ -1374,11 +1390,16 @@ def get_conversation_messages(request, conversation_id):
             'sujet': conversation.signalement.nom_objet if conversation.signalement else 'Conversation générale'
         }
         
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
             'messages': messages_list,
-            'conversation': conversation_data
+            'conversation': conversation_data,
+            'last_message_id': conversation.last_message_id,
+            'last_read_message_id': conversation.lu_jusqua_declarant,
+            'older_cursor': plus_anciens,
         })
+        response['ETag'] = version_conversation(conversation)
+        return response
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
@@ -1505,25 +1526,8 @@ def ajax_statistiques_dashboard(request):
     if not user.structure_locale:
         return JsonResponse({'error': 'Structure locale non assignée'})
     
-    base_filter = {'structure_locale': user.structure_locale}
-    
     # Statistiques en temps réel
-    stats = {
-        'total_signalements': Declaration.objects.filter(**base_filter).count(),
-        'objets_retrouves': Declaration.objects.filter(
-            **base_filter, 
-            type_declaration='trouve', 
-            agent_validateur=user
-        ).count(),
-        'objets_restitues': Declaration.objects.filter(
-            **base_filter, 
-            statut='restitue'
-        ).count(),
-        'demandes_attente': Reclamation.objects.filter(
-            declaration__in=Declaration.objects.filter(**base_filter),
-            statut='soumise'
-        ).count(),
-    }
+    stats = _stats_dashboard(user)
     
     return JsonResponse({'stats': stats})
 
@@ -1536,7 +1540,8 @@ def ajax_marquer_notification_lue(request, notification_id):
     """
     if request.method == 'POST':
         notification = get_object_or_404(Notification, id=notification_id, destinataire=request.user)
-        notification.marquer_comme_lue()
+        if notification.marquer_comme_lue():
+            publier_compteur_notifications(request.user.pk)
         return JsonResponse({'success': True})
     
     return JsonResponse({'success': False})
@@ -197,7 +197,15 @@ CACHES = {
             'MAX_ENTRIES': 2000,
             'CULL_FREQUENCY': 4,
         }
-    }
+    },
+    # Commun à tous les processus de la machine (gunicorn, travailleurs de la file) :
+    # versions des clés de substitution des pages et génération de la carte. Les pages
+    # et cellules restent dans le cache de chaque processus, validées par ces versions.
+    'partage': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'var', 'cache'),
+        'TIMEOUT': None,
+    },
 }
 
 # Session configuration for better performance
@@ -0,0 +1,21 @@
+#!/bin/bash
+# Démarrage du conteneur : serveur web (Gunicorn) et travailleur de la file de tâches.
+# Les deux tournent dans le même conteneur : ils partagent la base SQLite du volume
+# /app/data, qu'un second conteneur ne pourrait pas ouvrir.
+# Les arguments sont transmis à Gunicorn (ex: bash start.sh --log-level debug).
+
+python manage.py run_worker &
+travailleur=$!
+
+gunicorn lostfound.wsgi:application --bind "0.0.0.0:${PORT:-8000}" "$@" &
+web=$!
+
+# SIGTERM/SIGINT (arrêt du conteneur) : transmis aux deux processus
+trap 'kill -TERM "$web" "$travailleur" 2>/dev/null' TERM INT
+
+# Le premier qui s'arrête arrête l'autre : la plateforme redémarre le conteneur
+wait -n "$web" "$travailleur"
+statut=$?
+kill -TERM "$web" "$travailleur" 2>/dev/null
+wait "$web" "$travailleur"
+exit $statut
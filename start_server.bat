@@ -28,6 +28,9 @@ echo    • Statistiques: /togoretrouve-admin/statistics/
 echo    • Régions: /togoretrouve-admin/regions/
 echo    • Paramètres: /togoretrouve-admin/settings/
 echo.
+echo ⚙️ Démarrage du travailleur de tâches (emails, exports, statistiques)...
+start "TogoRetrouve - travailleur" python manage.py run_worker
+echo.
 echo 🚀 Serveur en cours de démarrage...
 
 python manage.py runserver
\ No newline at end of file